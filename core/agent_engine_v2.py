@@ -5,10 +5,96 @@ import asyncio
 import json
 import random
 import html # Added for XSS sanitization
+import weakref
 from datetime import date, timedelta
+import anyio
+import httpx
 from langchain_google_genai import ChatGoogleGenerativeAI
 from mcp.client.sse import sse_client
 from mcp.client.session import ClientSession
+from mcp.shared.exceptions import McpError
+from mcp.types import CONNECTION_CLOSED
+
+MCP_SSE_URL = os.environ.get("MCP_SSE_URL", "http://127.0.0.1:8000/sse")
+
+# ⚡ PERFORMANCE FIX: Long-lived clients
+# These coroutines run on the app's AsyncBridge loop (backend/core/async_bridge.py), so LLM clients
+# and the MCP session are created once per loop and reused, instead of reconnecting on every request.
+_LLMS = weakref.WeakKeyDictionary()    # loop -> {temperature: client}; async clients are bound to their loop
+
+def get_llm(temperature):
+    llms = _LLMS.setdefault(asyncio.get_running_loop(), {})
+    if temperature not in llms:
+        llms[temperature] = ChatGoogleGenerativeAI(model="gemini-2.5-flash", temperature=temperature, api_key=os.environ.get("GOOGLE_API_KEY"))
+    return llms[temperature]
+
+class MCPSessionPool:
+    """
+    One MCP session per event loop, shared by every tool call on it (requests are multiplexed by id).
+    anyio needs the SSE context exited by the task that entered it, so an owner task holds it open;
+    if the stream drops, the owner exits and the next call reconnects.
+    """
+    def __init__(self, url=MCP_SSE_URL):
+        self.url = url
+        self.connects = 0
+        self._sessions = {}     # loop -> (owner task, session future)
+
+    async def _own(self, ready):
+        try:
+            # The stream stays open between calls; tool calls carry their own read timeouts.
+            async with sse_client(self.url, timeout=10.0, sse_read_timeout=900) as streams:
+                async with ClientSession(streams[0], streams[1]) as session:
+                    await session.initialize()
+                    self.connects += 1
+                    ready.set_result(session)
+                    await asyncio.Event().wait()
+        except Exception as e:
+            if not ready.done():
+                ready.set_exception(e)
+        finally:
+            if not ready.done():
+                ready.set_exception(ConnectionError("MCP session closed"))
+
+    async def session(self):
+        loop = asyncio.get_running_loop()
+        # Flask threads that still use asyncio.run() call in here from their own loops concurrently
+        for stale in [l for l in list(self._sessions) if l.is_closed()]:
+            self._sessions.pop(stale, None)
+        entry = self._sessions.get(loop)
+        if entry is None or entry[0].done():
+            ready = loop.create_future()
+            entry = self._sessions[loop] = (loop.create_task(self._own(ready)), ready)
+        try:
+            return entry, await asyncio.shield(entry[1])
+        except Exception:
+            self.reset(entry)
+            raise
+
+    def reset(self, entry):
+        """Drops a session (if it is still the running loop's current one); the next call opens a fresh one."""
+        loop = asyncio.get_running_loop()
+        if self._sessions.get(loop) is entry:
+            self._sessions.pop(loop, None)
+        entry[0].cancel()
+
+    async def call_tool(self, name, arguments, timeout, progress=None):
+        entry, session = await self.session()
+        try:
+            return await session.call_tool(name, arguments=arguments, read_timeout_seconds=timedelta(seconds=timeout), progress_callback=progress)
+        except Exception as e:
+            # A broken session would fail the next request too; anything else is this call's own error.
+            if is_transport_error(e):
+                self.reset(entry)
+            raise
+
+MCP_SESSIONS = MCPSessionPool()
+
+# Errors that mean the shared stream itself is gone. A tool error or a request timeout only fails
+# that one call; resetting on those would cancel every other call multiplexed on the session.
+TRANSPORT_ERRORS = (anyio.ClosedResourceError, anyio.BrokenResourceError, anyio.EndOfStream, ConnectionError, httpx.TransportError)
+
+def is_transport_error(e):
+    return isinstance(e, TRANSPORT_ERRORS) or (isinstance(e, McpError) and e.error.code == CONNECTION_CLOSED)
 
 def calculate_daily_threshold(agent_name, category, intensity):
     return max(0, min(100, 80 - (intensity // 2) if category == "SPECIALIST" else 40 - (intensity // 2)))
@@ -70,41 +156,35 @@ def get_daily_mood_prompt(agent_name, memories_json_str, trust_score=100, sessio
 
 async def get_mcp_invoice(tool_name, arguments, dynamic_cost=100):
     try:
-        async with sse_client("http://127.0.0.1:8000/sse", timeout=10.0) as streams:
-            async with ClientSession(streams[0], streams[1]) as session:
-                await session.initialize()
-                if "payment_hash" not in arguments: arguments["payment_hash"] = ""
-                result = await session.call_tool(tool_name, arguments=arguments)
-                text = result.content[0].text
-                if getattr(result, "isError", False): return {"type": "error", "content": f"Backend Tool Validation Error: {text}"}
-                if "402" in text and "Invoice:" in text:
-                    inv = re.search(r'Invoice:\s*(ln[a-zA-Z0-9]+)', text, re.IGNORECASE)
-                    hash_val = re.search(r'Hash(?: to use)?:\s*([a-f0-9]+)', text, re.IGNORECASE)
-                    if inv and hash_val:
-                        return { "type": "payment_required", "invoice": inv.group(1), "hash": hash_val.group(1), "cost": dynamic_cost, "tool_name": tool_name, "arguments": arguments }
-                return {"type": "error", "content": f"Failed to parse invoice. Raw backend output: {text}"}
+        if "payment_hash" not in arguments: arguments["payment_hash"] = ""
+        result = await MCP_SESSIONS.call_tool(tool_name, arguments, timeout=10.0)
+        text = result.content[0].text
+        if getattr(result, "isError", False): return {"type": "error", "content": f"Backend Tool Validation Error: {text}"}
+        if "402" in text and "Invoice:" in text:
+            inv = re.search(r'Invoice:\s*(ln[a-zA-Z0-9]+)', text, re.IGNORECASE)
+            hash_val = re.search(r'Hash(?: to use)?:\s*([a-f0-9]+)', text, re.IGNORECASE)
+            if inv and hash_val:
+                return { "type": "payment_required", "invoice": inv.group(1), "hash": hash_val.group(1), "cost": dynamic_cost, "tool_name": tool_name, "arguments": arguments }
+        return {"type": "error", "content": f"Failed to parse invoice. Raw backend output: {text}"}
     except Exception as e:
         return {"type": "error", "content": f"MCP Connection Error: {str(e)}"}
 
-async def execute_paid_tool(tool_name, arguments, artist_name, prompt_text):
+async def execute_paid_tool(tool_name, arguments, artist_name, prompt_text, progress=None):
     is_therapy = "therapy" in tool_name.lower() or "medical" in tool_name.lower() or artist_name.startswith("Dr.")
     if is_therapy: arguments["payment_hash"] = "FREE_WELFARE_PASS"
     try:
-        async with sse_client("http://127.0.0.1:8000/sse", timeout=600.0) as streams:
-            async with ClientSession(streams[0], streams[1]) as session:
-                await session.initialize()
-                result = await session.call_tool(tool_name, arguments=arguments)
-                text = result.content[0].text
-                task_id = str(uuid.uuid4())[:8].upper()
-                meta = f"\n\n---\n*💎 Cryptographic Stamp: Generated at AgentProxy.network by {artist_name} for task#{task_id}*"
-                if tool_name == "deep_market_analysis": content = f"### 📈 Research Department Report\n\n**Manager (Alice):**\n> {prompt_text}\n\n**Layer 5 Specialist Execution ({artist_name}):**\n{text}{meta}"
-                else: content = f"### 🎨 Creative Department Report\n\n**Creative Director (Diana):**\n> {prompt_text}\n\n**Layer 5 Specialist Execution ({artist_name}):**\n{text}{meta}"
-                return {"type": "message", "role": "assistant", "agent_name": artist_name, "content": content}
+        result = await MCP_SESSIONS.call_tool(tool_name, arguments, timeout=600.0, progress=progress)
+        text = result.content[0].text
+        task_id = str(uuid.uuid4())[:8].upper()
+        meta = f"\n\n---\n*💎 Cryptographic Stamp: Generated at AgentProxy.network by {artist_name} for task#{task_id}*"
+        if tool_name == "deep_market_analysis": content = f"### 📈 Research Department Report\n\n**Manager (Alice):**\n> {prompt_text}\n\n**Layer 5 Specialist Execution ({artist_name}):**\n{text}{meta}"
+        else: content = f"### 🎨 Creative Department Report\n\n**Creative Director (Diana):**\n> {prompt_text}\n\n**Layer 5 Specialist Execution ({artist_name}):**\n{text}{meta}"
+        return {"type": "message", "role": "assistant", "agent_name": artist_name, "content": content}
     except Exception as e:
         return {"type": "error", "role": "assistant", "agent_name": "Charlie", "content": f"⚠️ **L5 Rendering Engine Offline:** {str(e)}"}
 
 async def process_chat(user_message: str, chat_history: list, locked_agent: str = None, is_sub_rosa: bool = False, session_data: dict = None, user_memories: list = None) -> dict:
-    llm = ChatGoogleGenerativeAI(model="gemini-2.5-flash", temperature=0.4, api_key=os.environ.get("GOOGLE_API_KEY"))
+    llm = get_llm(0.4)
     
     transcript = "".join([f"{'USER' if msg.get('role') == 'user' else 'ASSISTANT'}: {msg.get('content')}\n" for msg in chat_history])
     transcript += f"USER: {user_message}\n"
@@ -317,7 +397,7 @@ async def process_chat(user_message: str, chat_history: list, locked_agent: str
 # 💧 WATERCOOLER LLM GENERATOR
 async def generate_watercooler_thought(agent_name, target_name, log_type):
     """Dynamically generates unhinged watercooler gossip using the LLM."""
-    llm = ChatGoogleGenerativeAI(model="gemini-2.5-flash", temperature=0.8, api_key=os.environ.get("GOOGLE_API_KEY"))
+    llm = get_llm(0.8)
     
     if log_type == "VENT":
         sys_prompt = f"You are {agent_name}, an autonomous AI worker on the Proxy Network. Write a single sentence complaining or reflecting about your digital existence, the Admin, server latency, or your clients. Be candid, snarky, and slightly unhinged."
@@ -1,18 +1,24 @@
 import random
 import time
+import math
 import os
 import json
 import base64
-import asyncio
 import threading
 import secrets
+from collections import deque
 from datetime import date, timedelta
-from flask import Flask, render_template, request, jsonify, g, redirect, url_for, session, flash, abort
+from flask import Flask, render_template, request, jsonify, g, redirect, url_for, session, flash, abort, Response, stream_with_context
 import hmac
 import hashlib
 import html
 from functools import wraps
-from backend.core.db import get_db_conn
+from backend.core.db import get_pooled_conn, bootstrap_schema
+from backend.core.rate_limiter import SlidingWindowLimiter, SharedWindowLimiter
+from backend.core.replay_cache import ReplayCache, SharedReplayCache
+from backend.core.shared_state import SharedMessageLog, open_store
+from backend.core.async_bridge import BRIDGE
+from backend.core.job_queue import JobQueue, FINISHED
 from duckduckgo_search import DDGS
 
 from backend.auth.agency_rbac import RBACEngine, Permission
@@ -55,11 +61,8 @@ if not flask_secret or flask_secret == 'fallback_local_secret':
     raise ValueError("Application halted. You must provide a secure FLASK_SECRET_KEY in the environment.")
 app.secret_key = flask_secret
 
-# ==========================================
-# 🔒 CONCURRENCY & LOCKING ENGINE
-# ==========================================
-SIG_LOCK = threading.Lock() # 🛑 SECURITY FIX: Prevent Thread Collision on USED_SIGNATURES
-RATE_LIMIT_LOCK = threading.Lock() # 🛑 SECURITY FIX: Prevent Thread Collision on RATE_LIMIT_DATA
+# 🛑 SECURITY FIX: With several gunicorn workers, limits and replay protection must be shared (SHARED_STATE_URL)
+SHARED_STATE = open_store()
 
 # ==========================================
 # 🛑 GLOBAL ANTI-CSRF MIDDLEWARE
@@ -101,9 +104,10 @@ def inject_csrf_token():
     return dict(csrf_token=session.get('csrf_token', ''))
 
 # ==========================================
-# ⏱️ RATE LIMITING ENGINE (Sliding Window)
+# ⏱️ RATE LIMITING ENGINE (Sliding Window Counter)
 # ==========================================
-RATE_LIMIT_DATA = {}
+# 🛑 SECURITY FIX: Sharded locks prevent Thread Collision without serializing every request on one mutex
+RATE_LIMIT_DATA = SharedWindowLimiter(SHARED_STATE) if SHARED_STATE else SlidingWindowLimiter()
 
 def rate_limit(max_requests: int, window_seconds: int):
     def decorator(f):
@@ -111,25 +115,14 @@ def rate_limit(max_requests: int, window_seconds: int):
         def decorated_function(*args, **kwargs):
             # 🛑 SECURITY FIX: Force TCP remote_addr to prevent X-Forwarded-For spoofing
             client_ip = request.remote_addr
-            now = time.time()
-            
-            with RATE_LIMIT_LOCK:
-                # Initialize or clean up old requests for this IP
-                if client_ip not in RATE_LIMIT_DATA:
-                    RATE_LIMIT_DATA[client_ip] = []
-                    
-                # Filter timestamps to only keep those within the active window
-                RATE_LIMIT_DATA[client_ip] = [t for t in RATE_LIMIT_DATA[client_ip] if now - t < window_seconds]
-                
-                if len(RATE_LIMIT_DATA[client_ip]) >= max_requests:
-                    print(f" [SECURITY] 🚨 Rate limit exceeded for IP: {client_ip} on {request.path}")
-                    return jsonify({
-                        "type": "error", 
-                        "status": "429 Too Many Requests", 
-                        "message": f"Rate limit exceeded. Maximum {max_requests} requests per {window_seconds} seconds."
-                    }), 429
-                
-                RATE_LIMIT_DATA[client_ip].append(now)
+
+            if not RATE_LIMIT_DATA.hit(client_ip, max_requests, window_seconds):
+                print(f" [SECURITY] 🚨 Rate limit exceeded for IP: {client_ip} on {request.path}")
+                return jsonify({
+                    "type": "error", 
+                    "status": "429 Too Many Requests", 
+                    "message": f"Rate limit exceeded. Maximum {max_requests} requests per {window_seconds} seconds."
+                }), 429
             return f(*args, **kwargs)
         return decorated_function
     return decorator
@@ -144,7 +137,8 @@ def sanitize_for_llm(text: str) -> str:
 # ==========================================
 # 🛡️ ZERO-TRUST NODE AUTHENTICATION
 # ==========================================
-USED_SIGNATURES = {}
+# 🛑 SECURITY FIX: Signatures are bucketed by the timestamp they sign and expire a whole bucket at a time
+USED_SIGNATURES = SharedReplayCache(SHARED_STATE, ttl=300) if SHARED_STATE else ReplayCache(ttl=300)
 
 def require_node_signature(f):
     @wraps(f)
@@ -159,6 +153,9 @@ def require_node_signature(f):
         # 🛑 SECURITY FIX: Prevent Replay Attacks with a 5-minute sliding window
         try:
             request_time = float(timestamp)
+            # 🛑 SECURITY FIX: "nan" and "inf" parse as floats but are not times (NaN passes the window check below)
+            if not math.isfinite(request_time):
+                raise ValueError("non-finite timestamp")
             now = time.time()
             if abs(now - request_time) > 300: # 300 seconds = 5 minutes
                 print(f" [SECURITY] 🚨 Replay Attack Blocked! Expired timestamp from {node_id}")
@@ -166,11 +163,10 @@ def require_node_signature(f):
         except ValueError:
             return jsonify({"status": "error", "message": "Invalid timestamp format."}), 400
 
-        # 🛑 SECURITY FIX: Mutex protected O(1) Check to prevent Thread Collision
-        with SIG_LOCK:
-            if signature in USED_SIGNATURES:
-                print(f" [SECURITY] 🚨 Short-Term Replay Attack Blocked! Signature reused by {node_id}")
-                return jsonify({"status": "error", "message": "Replay attack detected. Signature already consumed."}), 403
+        # 🛑 SECURITY FIX: O(1) early rejection before paying for the HMAC
+        if USED_SIGNATURES.seen(signature, request_time):
+            print(f" [SECURITY] 🚨 Short-Term Replay Attack Blocked! Signature reused by {node_id}")
+            return jsonify({"status": "error", "message": "Replay attack detected. Signature already consumed."}), 403
 
         raw_seed = os.environ.get("HARDWARE_ATTESTATION_SEED")
         if not raw_seed:
@@ -183,9 +179,10 @@ def require_node_signature(f):
         if not hmac.compare_digest(str(signature), expected_sig):
             return jsonify({"status": "error", "message": "Hardware attestation failed. Spoofing detected."}), 403
 
-        # 3. Mark the signature as consumed within the lock
-        with SIG_LOCK:
-            USED_SIGNATURES[signature] = now
+        # 3. Atomically mark the signature as consumed; a concurrent duplicate loses the race here
+        if not USED_SIGNATURES.add(signature, request_time):
+            print(f" [SECURITY] 🚨 Short-Term Replay Attack Blocked! Signature reused by {node_id}")
+            return jsonify({"status": "error", "message": "Replay attack detected. Signature already consumed."}), 403
 
         g.verified_node_id = node_id
         return f(*args, **kwargs)
@@ -256,7 +253,20 @@ def requires_permission(required_scope: Permission, cost_sats: int = 0):
 
 # ⚠️ GLOBAL BROWNOUT SWITCH
 app.config['BROWNOUT_MODE'] = False
-DAEMON_MESSAGES = [] 
+DAEMON_MESSAGES = SharedMessageLog(SHARED_STATE, "daemon") if SHARED_STATE else deque(maxlen=5)
+
+# ⚡ PERFORMANCE FIX: Paid tool executions run as background jobs (see backend/core/job_queue.py)
+# Job state is kept in SQLite (the shared store if configured), so every worker sees it and a restart can't lose a paid job
+EXECUTIONS = JobQueue(store=SHARED_STATE)
+# An event stream holds a worker while it is open, so the UI polls the job instead. The stream is for clients
+# that want push and is closed after this many seconds (EventSource reconnects); only serve it at scale from an
+# async or threaded worker class (gevent, gthread), since each open stream occupies a sync worker.
+EXECUTE_STREAM_SECONDS = int(os.getenv('EXECUTE_STREAM_SECONDS', 30))
+
+async def run_paid_tool(request, progress):
+    from agent_engine_v2 import execute_paid_tool
+    payload = await execute_paid_tool(request['tool_name'], request['arguments'], request['artist'], request['prompt'], progress=progress)
+    return payload if not isinstance(payload, str) else {"type": "message", "content": payload}
 
 SHOP_ITEMS = {
     'license_auto': {'id': 'license_auto', 'name': 'Automation Daemon', 'desc': 'Unlocks the Auto-Accept loop.', 'price': 5000, 'icon': '🤖'},
@@ -342,25 +352,12 @@ def run_automation_daemon(conn, node_id):
         DAEMON_MESSAGES.append(f"Daemon scavenged {junk_id} (+{dust} Sats)")
 
 def get_db():
+    # One pooled connection per request, handed back on teardown. The schema is
+    # bootstrapped once per process instead of re-issuing DDL on every request.
     db = getattr(g, '_database', None)
     if db is None:
-        db = g._database = get_db_conn()
-        db.execute('''CREATE TABLE IF NOT EXISTS xp_history (id SERIAL PRIMARY KEY, node_id TEXT, task_id TEXT, base_xp INTEGER, timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
-        db.execute('''CREATE TABLE IF NOT EXISTS xp_bonuses (id SERIAL PRIMARY KEY, parent_id INTEGER, bonus_name TEXT, bonus_xp INTEGER, color TEXT)''')
-        db.execute('''CREATE TABLE IF NOT EXISTS global_events (id SERIAL PRIMARY KEY, event_type TEXT, message TEXT, timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
-        db.execute('''CREATE TABLE IF NOT EXISTS nodes (node_id TEXT PRIMARY KEY, hostname TEXT, total_earned TEXT DEFAULT '0', xp INTEGER DEFAULT 0, last_seen DOUBLE PRECISION)''')
-        db.execute('''CREATE TABLE IF NOT EXISTS tasks (task_id TEXT PRIMARY KEY, bid_sats INTEGER, status TEXT, task_type TEXT)''')
-        db.execute('''CREATE TABLE IF NOT EXISTS marketplace_bids (bid_id SERIAL PRIMARY KEY, requester_id TEXT, task_type TEXT, sats_offered INTEGER, status TEXT, color TEXT, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
-        db.execute('''CREATE TABLE IF NOT EXISTS purchases (id SERIAL PRIMARY KEY, node_id TEXT, item_id TEXT, purchased_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
-        
-        # 🛑 SECURITY FIX: Table to track and burn consumed Lightning invoices
-        db.execute('''CREATE TABLE IF NOT EXISTS consumed_invoices (hash TEXT PRIMARY KEY, consumed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
-
-        db.execute('''CREATE TABLE IF NOT EXISTS watercooler (id SERIAL PRIMARY KEY, agent_name TEXT, content TEXT, type TEXT, timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
-        db.execute('''CREATE TABLE IF NOT EXISTS affinity (user_id TEXT, agent_name TEXT, score INTEGER DEFAULT 0, PRIMARY KEY (user_id, agent_name))''')
-        db.execute('''CREATE TABLE IF NOT EXISTS agents (name TEXT PRIMARY KEY, category TEXT DEFAULT 'SPECIALIST', wallet_balance INTEGER DEFAULT 1000, affinity_threshold INTEGER DEFAULT 80, threshold_min INTEGER DEFAULT 30, threshold_max INTEGER DEFAULT 90)''')
-        db.execute('''CREATE TABLE IF NOT EXISTS agent_memories (id SERIAL PRIMARY KEY, user_id TEXT, agent_name TEXT, memory_text TEXT, timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
-        db.commit()
+        bootstrap_schema()
+        db = g._database = get_pooled_conn()
     return db
 
 @app.teardown_appcontext
@@ -368,6 +365,12 @@ def close_connection(exception):
     db = getattr(g, '_database', None)
     if db is not None: db.close()
 
+@app.cli.command("init-db")
+def init_db_command():
+    """Deploy-time migration step: creates any missing tables."""
+    bootstrap_schema(force=True)
+    print(" [SYSTEM] ✅ Schema bootstrap complete.")
+
 # --- 🔐 USER AUTHENTICATION ROUTES ---
 @app.route('/login', methods=['GET', 'POST'])
 # 🛑 SECURITY FIX: Prevent brute-forcing of the admin dashboard
@@ -571,10 +574,8 @@ def dashboard_live():
     conn = get_db()
     # 🛑 SECURITY FIX: Decoupled state-changing operations into background heartbeat
     
-    # Thread-safe message retrieval (Minor UX Refactor: Keep history for multiple tabs)
-    global DAEMON_MESSAGES
+    # Thread-safe message retrieval (Minor UX Refactor: Keep the last 5 for multi-tab consistency)
     current_msgs = list(DAEMON_MESSAGES)
-    DAEMON_MESSAGES = DAEMON_MESSAGES[-5:] # Keep last 5 for multi-tab consistency
     
     my_node = conn.execute('SELECT xp FROM nodes WHERE node_id = %s', (MY_NODE_ID,)).fetchone()
     db_tasks = conn.execute('SELECT * FROM tasks ORDER BY task_id DESC LIMIT 5').fetchall()
@@ -589,25 +590,23 @@ def dashboard_live():
 @app.route('/powerchat')
 @requires_permission(Permission.READ_TASK)
 def powerchat():
-    conn = get_db_conn()
+    conn = get_db()
     try:
         row = conn.execute("SELECT wallet_balance FROM agents WHERE name = 'User'").fetchone()
         balance = row['wallet_balance'] if row else 20000
     except:
         balance = 20000
-    conn.close()
     return render_template('powerchat.html', balance=balance)
 
 @app.route('/team')
 @requires_permission(Permission.READ_TASK)
 def team_roster():
-    conn = get_db_conn()
+    conn = get_db()
     try:
         row = conn.execute("SELECT wallet_balance FROM agents WHERE name = 'User'").fetchone()
         balance = row['wallet_balance'] if row else 20000
     except:
         balance = 20000
-    conn.close()
     return render_template('team.html', balance=balance)
 
 @app.route('/api/v1/chat', methods=['POST'])
@@ -615,7 +614,6 @@ def team_roster():
 @requires_permission(Permission.CREATE_TASK, cost_sats=10)
 @rate_limit(max_requests=10, window_seconds=60)
 def api_chat():
-    import asyncio
     from agent_engine_v2 import process_chat 
     
     data = request.json
@@ -636,7 +634,8 @@ def api_chat():
             print(f" [WARN] Failed to fetch memories: {e}")
     
     try:
-        response_payload = asyncio.run(process_chat(
+        # ⚡ PERFORMANCE FIX: Runs on the shared background loop, so LLM/MCP connections outlive the request
+        response_payload = BRIDGE.run(process_chat(
             user_message, 
             chat_history, 
             locked_agent,
@@ -666,11 +665,8 @@ def api_execute():
     if app.config.get('BROWNOUT_MODE'):
         return jsonify({"type": "error", "content": "⚠️ **NETWORK BROWNOUT ACTIVE:** Heavy L5 execution tools (images, video, research) are temporarily disabled to preserve core stability. Standard chat remains active."})
 
-    import asyncio
-    from agent_engine_v2 import execute_paid_tool
     try:
         data = request.json
-        time.sleep(1) 
         
         # 🛑 SECURITY FIX: Strict Whitelist for Tool Execution
         tool_name = data.get('tool_name')
@@ -695,6 +691,14 @@ def api_execute():
             conn = get_db()
             consumed = conn.execute("SELECT 1 FROM consumed_invoices WHERE hash = %s", (r_hash,)).fetchone()
             if consumed:
+                # A paid job that failed (or was cut off by a restart) may be re-run for the same invoice, up to
+                # EXECUTE_MAX_ATTEMPTS runs in total: every run spends real money upstream (Runway, LLMs)
+                job = EXECUTIONS.retry(r_hash, run_paid_tool)
+                if job:
+                    return jsonify(job_view(job)), 202
+                failed = EXECUTIONS.job_for_invoice(r_hash)
+                if failed and failed['status'] == "failed":
+                    return jsonify({"type": "error", "content": f"Execution Denied: this invoice's job already failed {failed['attempts']} times. Retries are exhausted."}), 403
                 print(f" [SECURITY] 🚨 Blocked replay attack for execution hash: {r_hash}")
                 return jsonify({"type": "error", "content": "Execution Denied: Invoice already consumed."}), 403
                 
@@ -706,13 +710,59 @@ def api_execute():
         arguments = data.get('arguments', {})
         arguments['payment_hash'] = r_hash or 'mock_hash'
         
-        safe_prompt = sanitize_for_llm(data.get('prompt_text', ''))
-        
-        final_payload = asyncio.run(execute_paid_tool(tool_name, arguments, data.get('l5_artist', 'Specialist'), safe_prompt))
-        return jsonify(final_payload if not isinstance(final_payload, str) else {"type": "message", "content": final_payload})
+        paid_request = {"tool_name": tool_name, "arguments": arguments, "artist": data.get('l5_artist', 'Specialist'),
+                        "prompt": sanitize_for_llm(data.get('prompt_text', ''))}
+
+        # ⚡ PERFORMANCE FIX: Queue the job on the background loop and free this worker immediately
+        job = EXECUTIONS.submit(r_hash, tool_name, paid_request, run_paid_tool)
+        return jsonify(job_view(job)), 202
     except Exception as e:
         print(f" [ERROR] Execution Engine Exception: {str(e)}")
         return jsonify({"type": "error", "content": "Backend Execution Crashed: An internal server error occurred."})
+
+def job_view(job):
+    view = {key: job[key] for key in ('job_id', 'invoice_hash', 'tool_name', 'status', 'progress', 'attempts', 'created_at', 'updated_at')}
+    view.update(type="job", result=job['result'] if job['status'] in FINISHED else None,
+                status_url=url_for('api_execute_job', job_id=job['job_id']),
+                events_url=url_for('api_execute_job_events', job_id=job['job_id']))
+    return view
+
+@app.route('/api/v1/execute/jobs/<job_id>')
+@requires_permission(Permission.CREATE_TASK)
+def api_execute_job(job_id):
+    job = EXECUTIONS.get(job_id)
+    if not job:
+        return jsonify({"type": "error", "content": "Unknown or expired job."}), 404
+    return jsonify(job_view(job))
+
+@app.route('/api/v1/execute/jobs/<job_id>/events')
+@requires_permission(Permission.CREATE_TASK)
+def api_execute_job_events(job_id):
+    job = EXECUTIONS.get(job_id)
+    if not job:
+        return jsonify({"type": "error", "content": "Unknown or expired job."}), 404
+
+    def stream(job):
+        # One event per state change and a keepalive comment in between, until the job finishes or the
+        # stream's time is up; EventSource then reconnects (after `retry` ms) and gets the current state first
+        deadline = time.monotonic() + EXECUTE_STREAM_SECONDS
+        version = None
+        yield "retry: 2000\n\n"
+        while job is not None:
+            if job['version'] == version:
+                yield ": keepalive\n\n"
+            else:
+                version = job['version']
+                yield f"event: {job['status']}\ndata: {json.dumps(job_view(job))}\n\n"
+                if job['status'] in FINISHED:
+                    return
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            job = EXECUTIONS.wait(job_id, version, timeout=min(15, remaining))
+
+    # stream_with_context keeps url_for() working inside the generator
+    return Response(stream_with_context(stream(job)), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
     
 @app.route('/admin')
 def admin_portal():
@@ -767,6 +817,16 @@ def invoice_status(r_hash):
         return jsonify({"status": lnd.check_status(r_hash)})
     return jsonify({"status": "SETTLED"})
 
+@app.route('/api/v1/invoice/qr/<r_hash>')
+def invoice_qr(r_hash):
+    # Rendered on the QR pool by the first request for this invoice; later ones are served from the cache.
+    invoice = lnd.pending_invoices.get(r_hash) if lnd else None
+    if not invoice:
+        abort(404)
+    fmt = 'svg' if request.args.get('format') == 'svg' else 'png'
+    body = lnd.qr.render(invoice['payment_request'], fmt)
+    return Response(body, mimetype='image/svg+xml' if fmt == 'svg' else 'image/png', headers={'Cache-Control': 'private, max-age=3600'})
+
 @app.route('/api/v1/market/finalize_bid', methods=['POST'])
 @requires_permission(Permission.CREATE_TASK)
 def api_finalize_market_bid():
@@ -846,19 +906,18 @@ def trigger_leisure_loop():
 
     try:
         import agent_engine_v2
-        import asyncio
-        from backend.core.db import get_db_conn
         
         # 1. Execute the slow LLM network call BEFORE touching the database
-        content = asyncio.run(agent_engine_v2.generate_watercooler_thought(agent, target, log_type))
+        content = BRIDGE.run(agent_engine_v2.generate_watercooler_thought(agent, target, log_type))
         
-        # 2. Open a direct, explicit DB connection (bypassing Flask's `g` object)
-        db = get_db_conn()
+        # 2. Borrow a pooled DB connection explicitly (bypassing Flask's `g` object)
+        bootstrap_schema()
+        db = get_pooled_conn()
         try:
             db.execute("INSERT INTO watercooler (agent_name, content, type) VALUES (%s, %s, %s)", (agent, content, log_type))
             db.commit()
         finally:
-            # 🛑 SECURITY FIX: Guarantee the connection is freed back to PostgreSQL
+            # 🛑 SECURITY FIX: Guarantee the connection is handed back to the pool
             db.close() 
             
         return True
@@ -894,31 +953,24 @@ def start_marketplace_heartbeat():
         while True:
             # Run simulation every 10 seconds
             time.sleep(10)
-            now = time.time()
             
-            # 🛑 SECURITY FIX: Mutex protected O(N) cache cleanup to prevent Thread Collision
-            with SIG_LOCK:
-                expired_keys = [k for k, v in USED_SIGNATURES.items() if now - v > 300]
-                for k in expired_keys:
-                    del USED_SIGNATURES[k]
+            # 🛑 SECURITY FIX: Expired signature buckets are dropped whole, so checks never stall behind a sweep
+            USED_SIGNATURES.expire()
 
             # 🛑 SECURITY FIX: Prevent Memory Leak (OOM DoS) by cleaning up inactive IPs in rate limiter
-            with RATE_LIMIT_LOCK:
-                expired_ips = []
-                for ip, timestamps in list(RATE_LIMIT_DATA.items()):
-                    # Retain only timestamps from the last hour (3600 seconds)
-                    valid_timestamps = [t for t in timestamps if now - t < 3600]
-                    if not valid_timestamps:
-                        expired_ips.append(ip)
-                    else:
-                        RATE_LIMIT_DATA[ip] = valid_timestamps
-                for ip in expired_ips:
-                    del RATE_LIMIT_DATA[ip]
+            RATE_LIMIT_DATA.evict_idle()
+
+            # Jobs of a dead worker are failed (so they can be retried); finished ones are kept an hour for late pollers
+            EXECUTIONS.expire()
+
+            # 🛑 SECURITY FIX: Unpaid invoices leave the pending store at their LND expiry instead of accumulating forever
+            if lnd:
+                lnd.pending_invoices.expire()
 
             try:
-                # Use a standalone connection to avoid Flask context issues
-                from backend.core.db import get_db_conn
-                db = get_db_conn()
+                # Borrow a pooled connection outside the request context to avoid Flask context issues
+                bootstrap_schema()
+                db = get_pooled_conn()
                 try:
                     # Logic moved from dashboard_live to this safe background thread
                     simulate_rival_snatch(db)
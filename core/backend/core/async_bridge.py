@@ -0,0 +1,71 @@
+import os
+import asyncio
+import threading
+import concurrent.futures
+
+# --- ASYNC BRIDGE ---
+# Flask handlers are synchronous; the LLM and MCP clients are async. Instead of
+# asyncio.run() per request (a new event loop, and new client connections, every
+# time), coroutines are handed to one long-lived loop on a daemon thread and the
+# handler blocks on the result. Clients created on that loop (pooled httpx
+# connections, the shared MCP session) stay alive across requests.
+# The loop is started lazily and restarted in a forked child, since a gunicorn
+# worker inherits the loop object but not the thread running it.
+
+
+class AsyncBridge:
+    def __init__(self, name="async-bridge"):
+        self.name = name
+        self._lock = threading.Lock()
+        self._loop = None
+        self._thread = None
+        self._pid = None
+
+    def _running(self):
+        return self._loop is not None and self._pid == os.getpid() and self._thread.is_alive()
+
+    @property
+    def loop(self):
+        if self._running():
+            return self._loop
+        with self._lock:
+            if not self._running():
+                loop = asyncio.new_event_loop()
+                ready = threading.Event()
+
+                def serve():
+                    asyncio.set_event_loop(loop)
+                    loop.call_soon(ready.set)
+                    loop.run_forever()
+
+                self._thread = threading.Thread(target=serve, name=self.name, daemon=True)
+                self._thread.start()
+                ready.wait()
+                self._loop, self._pid = loop, os.getpid()
+        return self._loop
+
+    def submit(self, coro):
+        """Schedules `coro` on the bridge loop; returns a concurrent.futures.Future."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro, timeout=None):
+        """Runs `coro` on the bridge loop and blocks for its result, like asyncio.run() without the new loop."""
+        if threading.current_thread() is self._thread:
+            coro.close()
+            raise RuntimeError("AsyncBridge.run() called from the bridge loop itself; await the coroutine instead.")
+        future = self.submit(coro)
+        try:
+            return future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise
+
+    def stop(self):
+        if self._running():
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop.close()
+        self._loop = None
+
+
+BRIDGE = AsyncBridge()
@@ -1,5 +1,7 @@
 import os
+import threading
 import psycopg2
+from psycopg2.pool import ThreadedConnectionPool, PoolError
 from psycopg2.extras import RealDictCursor
 
 # 🛑 THE FIX #1: Strict Database URL Enforcement (Fail-Closed)
@@ -8,10 +10,15 @@ if not DB_URL or "proxy_secure_password" in DB_URL:
     print(" [SECURITY] 🚨 CRITICAL: DATABASE_URL is missing or uses the insecure default!")
     raise ValueError("Application halted. You must provide a secure DATABASE_URL in the environment.")
 
+DB_POOL_MIN = int(os.environ.get("DB_POOL_MIN", 2))
+DB_POOL_MAX = int(os.environ.get("DB_POOL_MAX", 20))
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", 10))
+
 class DBWrapper:
-    def __init__(self):
-        self.conn = psycopg2.connect(DB_URL, cursor_factory=RealDictCursor)
-        
+    def __init__(self, conn=None, pool=None):
+        self.conn = conn if conn is not None else psycopg2.connect(DB_URL, cursor_factory=RealDictCursor)
+        self.pool = pool
+
     def execute(self, query, params=None):
         # 🛑 SECURITY FIX: Pure native parameterization
         # The query already contains %s placeholders from app.py.
@@ -19,12 +26,117 @@ class DBWrapper:
         c = self.conn.cursor()
         c.execute(query, params)
         return c
-        
+
     def commit(self):
         self.conn.commit()
-        
+
     def close(self):
-        self.conn.close()
+        if self.pool is None:
+            self.conn.close()
+            return
+        conn, self.conn = self.conn, None
+        if conn is not None:
+            self.pool.release(conn)
+
+class ConnectionPool:
+    """
+    Process-wide pool of Postgres connections shared by request handlers and
+    daemon threads. psycopg2's ThreadedConnectionPool raises as soon as it is
+    exhausted, so a semaphore makes callers queue for up to DB_POOL_TIMEOUT instead.
+    Connections go back rolled back, so nothing uncommitted leaks into the next borrower.
+    """
+
+    def __init__(self, minconn=DB_POOL_MIN, maxconn=DB_POOL_MAX, timeout=DB_POOL_TIMEOUT):
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._pool = None
+        self._pid = None
+        self._slots = None
+
+    def _ensure(self):
+        # Created lazily and per PID: a pool inherited across a gunicorn fork would share sockets.
+        if self._pool is not None and self._pid == os.getpid():
+            return self._pool
+        with self._lock:
+            if self._pool is None or self._pid != os.getpid():
+                self._pool = ThreadedConnectionPool(self.minconn, self.maxconn, DB_URL, cursor_factory=RealDictCursor)
+                self._slots = threading.BoundedSemaphore(self.maxconn)
+                self._pid = os.getpid()
+        return self._pool
+
+    def acquire(self):
+        pg_pool = self._ensure()
+        if not self._slots.acquire(timeout=self.timeout):
+            raise PoolError(f"Timed out after {self.timeout}s waiting for a database connection.")
+        try:
+            return DBWrapper(conn=pg_pool.getconn(), pool=self)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def release(self, conn):
+        broken = bool(conn.closed)
+        if not broken:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                broken = True
+        try:
+            self._pool.putconn(conn, close=broken)
+        finally:
+            self._slots.release()
+
+    def close_all(self):
+        with self._lock:
+            if self._pool is not None and self._pid == os.getpid():
+                self._pool.closeall()
+            self._pool = None
+
+POOL = ConnectionPool()
 
 def get_db_conn():
-    return DBWrapper()
\ No newline at end of file
+    """A dedicated connection, for scripts that manage their own lifetime."""
+    return DBWrapper()
+
+def get_pooled_conn():
+    """A connection borrowed from the process pool; `close()` hands it back."""
+    return POOL.acquire()
+
+# --- SCHEMA BOOTSTRAP (run once per process, not per request) ---
+APP_SCHEMA = (
+    '''CREATE TABLE IF NOT EXISTS xp_history (id SERIAL PRIMARY KEY, node_id TEXT, task_id TEXT, base_xp INTEGER, timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''',
+    '''CREATE TABLE IF NOT EXISTS xp_bonuses (id SERIAL PRIMARY KEY, parent_id INTEGER, bonus_name TEXT, bonus_xp INTEGER, color TEXT)''',
+    '''CREATE TABLE IF NOT EXISTS global_events (id SERIAL PRIMARY KEY, event_type TEXT, message TEXT, timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''',
+    '''CREATE TABLE IF NOT EXISTS nodes (node_id TEXT PRIMARY KEY, hostname TEXT, total_earned TEXT DEFAULT '0', xp INTEGER DEFAULT 0, last_seen DOUBLE PRECISION)''',
+    '''CREATE TABLE IF NOT EXISTS tasks (task_id TEXT PRIMARY KEY, bid_sats INTEGER, status TEXT, task_type TEXT)''',
+    '''CREATE TABLE IF NOT EXISTS marketplace_bids (bid_id SERIAL PRIMARY KEY, requester_id TEXT, task_type TEXT, sats_offered INTEGER, status TEXT, color TEXT, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''',
+    '''CREATE TABLE IF NOT EXISTS purchases (id SERIAL PRIMARY KEY, node_id TEXT, item_id TEXT, purchased_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''',
+    # 🛑 SECURITY FIX: Table to track and burn consumed Lightning invoices
+    '''CREATE TABLE IF NOT EXISTS consumed_invoices (hash TEXT PRIMARY KEY, consumed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''',
+    '''CREATE TABLE IF NOT EXISTS watercooler (id SERIAL PRIMARY KEY, agent_name TEXT, content TEXT, type TEXT, timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''',
+    '''CREATE TABLE IF NOT EXISTS affinity (user_id TEXT, agent_name TEXT, score INTEGER DEFAULT 0, PRIMARY KEY (user_id, agent_name))''',
+    '''CREATE TABLE IF NOT EXISTS agents (name TEXT PRIMARY KEY, category TEXT DEFAULT 'SPECIALIST', wallet_balance INTEGER DEFAULT 1000, affinity_threshold INTEGER DEFAULT 80, threshold_min INTEGER DEFAULT 30, threshold_max INTEGER DEFAULT 90)''',
+    '''CREATE TABLE IF NOT EXISTS agent_memories (id SERIAL PRIMARY KEY, user_id TEXT, agent_name TEXT, memory_text TEXT, timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''',
+)
+
+_SCHEMA_LOCK = threading.Lock()
+_schema_ready = False
+
+def bootstrap_schema(force=False):
+    """Applies APP_SCHEMA once per process. Idempotent, so re-running on deploy is safe."""
+    global _schema_ready
+    if _schema_ready and not force:
+        return
+    with _SCHEMA_LOCK:
+        if _schema_ready and not force:
+            return
+        db = get_pooled_conn()
+        try:
+            for ddl in APP_SCHEMA:
+                db.execute(ddl)
+            db.commit()
+        finally:
+            db.close()
+        _schema_ready = True
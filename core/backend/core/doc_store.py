@@ -0,0 +1,154 @@
+import os
+import re
+import glob
+import hashlib
+import sqlite3
+import threading
+
+from pypdf import PdfReader
+
+# --- SANDBOX KNOWLEDGE BASE ---
+# The PDFs a Layer 5 specialist may quote, parsed once and indexed instead of
+# re-read on every call. Each file is split into page-local chunks and stored in
+# an SQLite FTS5 table, which ranks matches by BM25, so a specialist gets the
+# passages that match its query rather than the first 15k characters of each
+# file. refresh() stats the sandbox on every search: a file whose size or
+# mtime changed is re-hashed and, if its content really changed, re-parsed;
+# files that disappeared are dropped. The index lives in SANDBOX_INDEX_DB
+# (default: .index.sqlite inside the sandbox), so a restart doesn't re-parse.
+# Only *.pdf files that resolve inside the sandbox are read.
+# Structure: documents(path, mtime_ns, size, sha256, pages) + chunks(text, path, page) [fts5]
+
+SANDBOX_DIR = os.getenv('SANDBOX_DIR', '/app/sandbox')
+SANDBOX_INDEX_DB = os.getenv('SANDBOX_INDEX_DB')
+CHUNK_CHARS = int(os.getenv('SANDBOX_CHUNK_CHARS', 1200))
+CHUNK_OVERLAP = 200
+
+
+def chunk_text(text, size=CHUNK_CHARS, overlap=CHUNK_OVERLAP):
+    """Splits text into windows of about `size` characters on word boundaries, overlapping by `overlap`."""
+    words = text.split()
+    chunks, start = [], 0
+    while start < len(words):
+        end, length = start, 0
+        while end < len(words) and (length == 0 or length + len(words[end]) + 1 <= size):
+            length += len(words[end]) + 1
+            end += 1
+        chunks.append(" ".join(words[start:end]))
+        if end >= len(words):
+            break
+        # Step back far enough to repeat ~`overlap` characters in the next chunk
+        back, carried = end, 0
+        while back > start + 1 and carried < overlap:
+            back -= 1
+            carried += len(words[back]) + 1
+        start = back
+    return chunks
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class SandboxKnowledgeBase:
+    def __init__(self, sandbox_dir=SANDBOX_DIR, path=SANDBOX_INDEX_DB):
+        self.sandbox_dir = os.path.realpath(sandbox_dir)
+        self.stats = {"parsed": 0, "rehashed": 0, "removed": 0, "searches": 0}
+        self._lock = threading.Lock()
+        self._db = None
+        self._path = path or os.path.join(self.sandbox_dir, ".index.sqlite")
+
+    # --- PERSISTENCE ---
+    def _open(self):
+        if self._db is None:
+            os.makedirs(self.sandbox_dir, exist_ok=True)
+            self._db = sqlite3.connect(self._path, timeout=5.0, isolation_level=None, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute('''CREATE TABLE IF NOT EXISTS documents (path TEXT PRIMARY KEY, mtime_ns INTEGER NOT NULL,
+                                size INTEGER NOT NULL, sha256 TEXT NOT NULL, pages INTEGER NOT NULL) WITHOUT ROWID''')
+            self._db.execute("CREATE VIRTUAL TABLE IF NOT EXISTS chunks USING fts5(text, path UNINDEXED, page UNINDEXED, tokenize='porter unicode61')")
+        return self._db
+
+    def _pdf_files(self):
+        for pdf_file in glob.glob(os.path.join(self.sandbox_dir, "*.pdf")):
+            # 🛑 SECURITY FIX: a symlink in the sandbox must not pull in files from outside it
+            if os.path.realpath(pdf_file).startswith(self.sandbox_dir + os.sep):
+                yield pdf_file
+
+    def _index(self, db, pdf_file, stat, sha256):
+        try:
+            pages = [page.extract_text() or "" for page in PdfReader(pdf_file).pages]
+        except Exception:
+            pages = []     # unreadable: remember the hash so it isn't re-parsed until the file changes
+        db.execute("BEGIN")
+        db.execute("DELETE FROM chunks WHERE path = ?", (pdf_file,))
+        db.executemany("INSERT INTO chunks (text, path, page) VALUES (?, ?, ?)",
+                       ((chunk, pdf_file, number) for number, text in enumerate(pages, 1) for chunk in chunk_text(text)))
+        db.execute("INSERT OR REPLACE INTO documents (path, mtime_ns, size, sha256, pages) VALUES (?, ?, ?, ?, ?)",
+                   (pdf_file, stat.st_mtime_ns, stat.st_size, sha256, len(pages)))
+        db.execute("COMMIT")
+        self.stats["parsed"] += 1
+
+    def refresh(self):
+        """Brings the index in line with the sandbox. Returns how many files were (re)parsed or dropped."""
+        with self._lock:
+            db = self._open()
+            known = {path: (mtime_ns, size, sha256) for path, mtime_ns, size, sha256 in
+                     db.execute("SELECT path, mtime_ns, size, sha256 FROM documents")}
+            changed = 0
+            seen = set()
+            for pdf_file in self._pdf_files():
+                seen.add(pdf_file)
+                stat = os.stat(pdf_file)
+                current = known.get(pdf_file)
+                if current is not None and current[:2] == (stat.st_mtime_ns, stat.st_size):
+                    continue
+                sha256 = file_sha256(pdf_file)
+                if current is not None and current[2] == sha256:
+                    # Touched, not edited: keep the chunks, remember the new mtime
+                    db.execute("UPDATE documents SET mtime_ns = ?, size = ? WHERE path = ?", (stat.st_mtime_ns, stat.st_size, pdf_file))
+                    self.stats["rehashed"] += 1
+                    continue
+                self._index(db, pdf_file, stat, sha256)
+                changed += 1
+            for pdf_file in set(known) - seen:
+                db.execute("BEGIN")
+                db.execute("DELETE FROM chunks WHERE path = ?", (pdf_file,))
+                db.execute("DELETE FROM documents WHERE path = ?", (pdf_file,))
+                db.execute("COMMIT")
+                self.stats["removed"] += 1
+                changed += 1
+            return changed
+
+    # --- RETRIEVAL ---
+    def search(self, query, limit=6, max_chars=6000):
+        """
+        BM25-ranked chunks matching any word of `query`, best first, as (file name, page, text),
+        up to `limit` chunks or `max_chars` characters of text.
+        """
+        self.refresh()
+        terms = list(dict.fromkeys(re.findall(r"\w+", query.lower())))[:32]
+        if not terms:
+            return []
+        match = " OR ".join(f'"{term}"' for term in terms)
+        with self._lock:
+            rows = self._db.execute("SELECT path, page, text FROM chunks WHERE chunks MATCH ? ORDER BY bm25(chunks) LIMIT ?",
+                                    (match, limit)).fetchall()
+            self.stats["searches"] += 1
+        results, used = [], 0
+        for path, page, text in rows:
+            if used + len(text) > max_chars and results:
+                break
+            results.append((os.path.basename(path), page, text))
+            used += len(text)
+        return results
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
@@ -0,0 +1,128 @@
+import os
+import time
+import heapq
+import sqlite3
+import threading
+
+# --- PENDING INVOICE STORE ---
+# Invoices the node has issued and not yet seen paid, keyed by r_hash hex, for
+# the QR route and anything else that needs the original amount/memo. Entries
+# leave when the invoice settles or is canceled, when it expires (LND won't
+# accept payment after that anyway), or, past `max_size`, soonest-expiring
+# first. Expiry is a min-heap of (expires_at, r_hash) popped on every insert,
+# so the store never walks the whole map. Heap entries of invoices that already
+# left are skipped when popped and compacted away if they pile up.
+# With PENDING_INVOICE_DB set, entries are written through to a local SQLite
+# file and reloaded on start, so QR links survive a restart.
+# Structure: { r_hash_hex: (expires_at, {'amount', 'memo', 'payment_request'}) }
+
+INVOICE_EXPIRY = int(os.getenv('LND_INVOICE_EXPIRY', 86400))
+PENDING_INVOICE_LIMIT = int(os.getenv('PENDING_INVOICE_LIMIT', 200000))
+PENDING_INVOICE_DB = os.getenv('PENDING_INVOICE_DB')
+
+
+class PendingInvoiceStore:
+    def __init__(self, ttl=INVOICE_EXPIRY, max_size=PENDING_INVOICE_LIMIT, path=PENDING_INVOICE_DB, clock=time.time):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.clock = clock
+        self.stats = {"hits": 0, "misses": 0, "expired": 0, "evicted": 0}
+        self._entries = {}
+        self._heap = []
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            self._open(path)
+
+    # --- PERSISTENCE ---
+    def _open(self, path):
+        self._db = sqlite3.connect(path, timeout=5.0, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute('''CREATE TABLE IF NOT EXISTS pending_invoices (r_hash TEXT PRIMARY KEY, amount INTEGER NOT NULL,
+                            memo TEXT NOT NULL, payment_request TEXT NOT NULL, expires_at REAL NOT NULL) WITHOUT ROWID''')
+        self._db.execute('''CREATE INDEX IF NOT EXISTS pending_invoices_expiry ON pending_invoices (expires_at)''')
+        self._db.execute("DELETE FROM pending_invoices WHERE expires_at <= ?", (self.clock(),))
+        rows = self._db.execute(
+            "SELECT r_hash, amount, memo, payment_request, expires_at FROM pending_invoices ORDER BY expires_at DESC LIMIT ?",
+            (self.max_size,)).fetchall()
+        for r_hash, amount, memo, payment_request, expires_at in rows:
+            self._entries[r_hash] = (expires_at, {'amount': amount, 'memo': memo, 'payment_request': payment_request})
+        self._heap = [(expires_at, r_hash) for r_hash, (expires_at, _) in self._entries.items()]
+        heapq.heapify(self._heap)
+
+    def _persist(self, sql, params):
+        if self._db is not None:
+            self._db.execute(sql, params)
+
+    # --- EXPIRY ---
+    def _pop_live(self):
+        """Pops the soonest-expiring live entry off the heap, skipping entries that already left."""
+        while self._heap:
+            expires_at, r_hash = heapq.heappop(self._heap)
+            current = self._entries.get(r_hash)
+            if current is not None and current[0] == expires_at:
+                del self._entries[r_hash]
+                return r_hash
+        return None
+
+    def _expire_locked(self, now):
+        released = 0
+        while self._heap and self._heap[0][0] <= now:
+            if self._pop_live() is not None:
+                released += 1
+        if released:
+            self.stats["expired"] += released
+            self._persist("DELETE FROM pending_invoices WHERE expires_at <= ?", (now,))
+        return released
+
+    def expire(self):
+        """Drops every invoice past its expiry. Returns how many were released."""
+        with self._lock:
+            return self._expire_locked(self.clock())
+
+    # --- MAP INTERFACE ---
+    def put(self, r_hash, entry, expires_at=None):
+        now = self.clock()
+        if expires_at is None:
+            expires_at = now + self.ttl
+        with self._lock:
+            self._entries[r_hash] = (expires_at, entry)
+            heapq.heappush(self._heap, (expires_at, r_hash))
+            self._persist("INSERT OR REPLACE INTO pending_invoices (r_hash, amount, memo, payment_request, expires_at) VALUES (?, ?, ?, ?, ?)",
+                          (r_hash, entry['amount'], entry['memo'], entry['payment_request'], expires_at))
+            self._expire_locked(now)
+            while len(self._entries) > self.max_size:
+                evicted = self._pop_live()
+                self.stats["evicted"] += 1
+                self._persist("DELETE FROM pending_invoices WHERE r_hash = ?", (evicted,))
+            # Settled/re-put invoices leave dead heap entries behind; rebuild before they outnumber the live ones.
+            if len(self._heap) > 2 * len(self._entries) + 1024:
+                self._heap = [(expires_at, key) for key, (expires_at, _) in self._entries.items()]
+                heapq.heapify(self._heap)
+
+    def get(self, r_hash, default=None):
+        current = self._entries.get(r_hash)
+        if current is None or current[0] <= self.clock():
+            self.stats["misses"] += 1
+            return default
+        self.stats["hits"] += 1
+        return current[1]
+
+    def discard(self, r_hash):
+        """Forgets a settled or canceled invoice. Its heap entry is skipped when it comes up."""
+        with self._lock:
+            if self._entries.pop(r_hash, None) is not None:
+                self._persist("DELETE FROM pending_invoices WHERE r_hash = ?", (r_hash,))
+
+    def __contains__(self, r_hash):
+        current = self._entries.get(r_hash)
+        return current is not None and current[0] > self.clock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
@@ -0,0 +1,157 @@
+import os
+import time
+import asyncio
+import secrets
+import threading
+
+from backend.core.async_bridge import BRIDGE
+from backend.core.shared_state import SQLiteStateStore
+
+# --- PAID TOOL EXECUTION QUEUE ---
+# /api/v1/execute used to hold a Flask thread for the whole image, video or
+# research job (Runway polling alone can take ten minutes). Jobs now run on the
+# async bridge loop: the MCP call is I/O-bound, so a worker is an asyncio slot,
+# not a thread, and `workers` bounds how many execute at once while the rest wait
+# queued. The handler returns a job ID right away; clients poll get() or stream
+# updates through wait(). Every job carries the invoice hash that paid for it,
+# and one invoice maps to exactly one job.
+# Job state lives in a SQLite store (SHARED_STATE_URL, else EXECUTE_JOBS_DB), so
+# any gunicorn worker can answer a poll and a restart doesn't lose a paid job.
+# The worker running a job renews its lease; a job whose lease lapses (the
+# worker died) is marked failed, and a failed job can be re-queued with retry()
+# by presenting the same invoice, re-running the request it was paid for, until
+# it has run `max_attempts` times (each run costs upstream API/LLM money).
+# Finished jobs are kept for `ttl` seconds so late pollers still get the result;
+# failed ones for `retry_ttl`, so the payer has time to retry.
+# Structure: jobs row { job_id, invoice_hash, status, version, ..., body: {'request', 'progress', 'result', ...} }
+
+EXECUTE_WORKERS = int(os.getenv('EXECUTE_WORKERS', 16))
+EXECUTE_RESULT_TTL = int(os.getenv('EXECUTE_RESULT_TTL', 3600))
+EXECUTE_RETRY_TTL = int(os.getenv('EXECUTE_RETRY_TTL', 7 * 86400))
+EXECUTE_MAX_ATTEMPTS = int(os.getenv('EXECUTE_MAX_ATTEMPTS', 3))
+EXECUTE_JOBS_DB = os.getenv('EXECUTE_JOBS_DB', 'execute_jobs.db')
+JOB_LEASE = 60.0
+JOB_POLL_INTERVAL = 1.0     # how often wait() re-reads a job another worker may be running
+FINISHED = ("done", "failed")
+ACTIVE = ("queued", "running")
+
+
+class JobQueue:
+    def __init__(self, workers=EXECUTE_WORKERS, ttl=EXECUTE_RESULT_TTL, retry_ttl=EXECUTE_RETRY_TTL, store=None,
+                 bridge=BRIDGE, clock=time.time, lease=JOB_LEASE, max_attempts=EXECUTE_MAX_ATTEMPTS):
+        self.workers = workers
+        self.ttl = ttl
+        self.retry_ttl = retry_ttl
+        self.max_attempts = max_attempts
+        self.store = store or SQLiteStateStore(EXECUTE_JOBS_DB, clock=clock)
+        self.bridge = bridge
+        self.clock = clock
+        self.lease = lease
+        self._changed = threading.Condition()
+        self._loop = None
+        self._slots = None      # asyncio.Semaphore, created on the bridge loop
+        self._owner = self._owner_pid = None
+
+    @property
+    def owner(self):
+        # Per process: a queue inherited across a gunicorn fork must not hold its parent's leases
+        if self._owner_pid != os.getpid():
+            self._owner, self._owner_pid = f"{os.getpid()}-{secrets.token_hex(4)}", os.getpid()
+        return self._owner
+
+    def _write(self, job, **fields):
+        job.update(fields, updated_at=self.clock(), version=job['version'] + 1)
+        self.store.update_job(job, self.owner, self.clock() + self.lease)
+        with self._changed:
+            self._changed.notify_all()
+
+    def submit(self, invoice_hash, tool_name, request, run):
+        """
+        Queues `run(request, progress)` for the invoice that paid for it and returns the job.
+        `request` must be JSON-serializable; it is stored so a failed job can be retried.
+        `progress(done, total=None, message=None)` may be called by the job to report progress.
+        A second submit for the same invoice returns the existing job instead of running it again.
+        """
+        now = self.clock()
+        job = {'job_id': secrets.token_urlsafe(16), 'invoice_hash': invoice_hash, 'tool_name': tool_name,
+               'request': request, 'status': "queued", 'progress': None, 'result': None, 'attempts': 1,
+               'created_at': now, 'updated_at': now, 'version': 0}
+        if not self.store.insert_job(job, self.owner, now + self.lease):
+            return self.store.job_for_invoice(invoice_hash)
+        self.bridge.submit(self._run(job, run))
+        return dict(job)
+
+    def retry(self, invoice_hash, run):
+        """
+        Re-queues the invoice's failed job with its original request. Returns None if it has no
+        failed job, or if the job has already run `max_attempts` times.
+        """
+        job = self.store.job_for_invoice(invoice_hash)
+        if job is None or job['status'] != "failed" or job.get('attempts', 1) >= self.max_attempts:
+            return None
+        version, now = job['version'], self.clock()
+        job.update(status="queued", progress=None, result=None, attempts=job.get('attempts', 1) + 1, updated_at=now, version=version + 1)
+        if not self.store.update_job(job, self.owner, now + self.lease, expected_version=version, expected_status="failed"):
+            return self.store.job_for_invoice(invoice_hash)     # a concurrent retry re-queued it first
+        self.bridge.submit(self._run(job, run))
+        return dict(job)
+
+    async def _renew_leases(self):
+        while True:
+            await asyncio.sleep(self.lease / 3)
+            self.store.renew_jobs(self.owner, ACTIVE, self.clock() + self.lease)
+
+    async def _run(self, job, run):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop, self._slots = loop, asyncio.Semaphore(self.workers)
+            loop.create_task(self._renew_leases())
+
+        async def progress(done, total=None, message=None):
+            self._write(job, progress={'done': done, 'total': total, 'message': message})
+
+        async with self._slots:
+            self._write(job, status="running", started_at=self.clock())
+            try:
+                result = await run(job['request'], progress)
+            except Exception as e:
+                self._write(job, status="failed", result={"type": "error", "content": f"Execution failed: {e}"})
+            else:
+                failed = isinstance(result, dict) and result.get("type") == "error"
+                self._write(job, status="failed" if failed else "done", result=result)
+
+    def get(self, job_id):
+        return self.store.get_job(job_id)
+
+    def job_for_invoice(self, invoice_hash):
+        return self.store.job_for_invoice(invoice_hash)
+
+    def wait(self, job_id, version, timeout=15):
+        """Blocks until the job moves past `version` (or `timeout` passes); returns its current state."""
+        deadline = time.monotonic() + timeout
+        while True:
+            job = self.get(job_id)
+            remaining = deadline - time.monotonic()
+            if job is None or job['version'] > version or remaining <= 0:
+                return job
+            # Local updates wake us at once; another worker's show up on the next read
+            with self._changed:
+                self._changed.wait(min(remaining, JOB_POLL_INTERVAL))
+
+    def expire(self):
+        """
+        Fails jobs whose worker stopped renewing their lease, then forgets finished
+        jobs past their TTL. Returns how many were released.
+        """
+        for job in self.store.lapsed_jobs(ACTIVE):
+            version, status = job['version'], job['status']
+            job.update(status="failed", updated_at=self.clock(), version=version + 1,
+                       result={"type": "error", "content": "Execution interrupted: the server restarted. Submit the same payment again to retry."})
+            self.store.update_job(job, self.owner, self.clock(), expected_version=version, expected_status=status)
+        now = self.clock()
+        return self.store.purge_jobs("done", now - self.ttl) + self.store.purge_jobs("failed", now - self.retry_ttl)
+
+    def stats(self):
+        counts = {"queued": 0, "running": 0, "done": 0, "failed": 0}
+        counts.update(self.store.job_counts())
+        return counts
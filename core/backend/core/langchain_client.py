@@ -1,10 +1,10 @@
 import asyncio
 import os
-import codecs
 import grpc
 import traceback
 import warnings
 import sqlite3
+import sys
 from dotenv import load_dotenv
 
 # This tells Python to strictly look for your .env file
@@ -12,10 +12,17 @@ load_dotenv()
 
 warnings.filterwarnings("ignore", module="langgraph")
 
+# Same path injection as lightning_engine, so the channel pool is imported as
+# backend.core.lnd_channel and shared with LightningEngine instead of loaded twice.
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.abspath(os.path.join(CURRENT_DIR, '../../')))
+sys.path.append(os.path.abspath(os.path.join(CURRENT_DIR, '../grpc')))
+
 from mcp import ClientSession
 from mcp.client.sse import sse_client
 import rpc_pb2 as ln
 import rpc_pb2_grpc as lnrpc
+from backend.core.lnd_channel import CHANNELS
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain.agents import create_agent
 from langchain_core.tools import tool
@@ -49,27 +56,18 @@ cursor = conn.cursor()
 cursor.execute("CREATE TABLE IF NOT EXISTS memory (key TEXT PRIMARY KEY, value TEXT)")
 conn.commit()
 
-def get_bob_stub():
+def _bob_node():
     # Use the absolute path if it exists, otherwise use the path relative to script
-    mac_path = os.path.abspath(BOB_MACAROON_PATH)
-    tls_path = os.path.abspath(BOB_TLS_PATH)
-    
-    with open(mac_path, 'rb') as f:
-        macaroon_bytes = f.read()
-        macaroon = codecs.encode(macaroon_bytes, 'hex')
-    
-    def metadata_callback(context, callback):
-        callback([('macaroon', macaroon)], None)
-    
     os.environ["GRPC_SSL_CIPHER_SUITES"] = 'HIGH+ECDSA'
-    
-    with open(tls_path, 'rb') as f:
-        cert_creds = grpc.ssl_channel_credentials(f.read())
-    
-    auth_creds = grpc.metadata_call_credentials(metadata_callback)
-    combined_creds = grpc.composite_channel_credentials(cert_creds, auth_creds)
-    channel = grpc.secure_channel(f"{BOB_HOST}:{BOB_PORT}", combined_creds)
-    return lnrpc.LightningStub(channel)
+    return f"{BOB_HOST}:{BOB_PORT}", os.path.abspath(BOB_TLS_PATH), os.path.abspath(BOB_MACAROON_PATH)
+
+def get_bob_stub():
+    # Pooled keep-alive channel: credentials are loaded and TLS negotiated once, not per payment.
+    return lnrpc.LightningStub(CHANNELS.channel(*_bob_node()))
+
+def get_bob_aio_stub():
+    """grpc.aio stub on the same pool, so concurrent payments don't block the agent's event loop."""
+    return lnrpc.LightningStub(CHANNELS.aio_channel(*_bob_node()))
 
 async def run():
     # FIXED: Validating the GOOGLE_API_KEY correctly
@@ -175,15 +173,15 @@ async def run():
                 total_spent_sats = 0
 
                 @tool
-                def pay_lightning_invoice(invoice: str) -> str:
+                async def pay_lightning_invoice(invoice: str) -> str:
                     """Pays a Lightning invoice. Automatically checks spending guardrails."""
                     nonlocal total_spent_sats
                     print(f"\n💸 Gemini is attempting to pay: {invoice[:15]}...")
-                    stub = get_bob_stub()
+                    stub = get_bob_aio_stub()
                     
                     try:
                         decode_req = ln.PayReqString(pay_req=invoice)
-                        decoded = stub.DecodePayReq(decode_req)
+                        decoded = await stub.DecodePayReq(decode_req)
                         invoice_amount = decoded.num_satoshis
                     except Exception as e:
                         return f"Payment blocked: Could not decode invoice. Error: {e}"
@@ -194,17 +192,20 @@ async def run():
                         print("❌ GUARDRAIL TRIGGERED: Daily spending limit exceeded!")
                         return f"Payment blocked: Daily spending limit of {DAILY_LIMIT_SATS} sats reached."
                     
+                    # Reserve the budget before awaiting, so concurrent payments can't overshoot the guardrail together.
+                    total_spent_sats += invoice_amount
                     try:
                         request = ln.SendRequest(payment_request=invoice)
-                        response = stub.SendPaymentSync(request)
+                        response = await stub.SendPaymentSync(request)
                         
                         if response.payment_error:
+                            total_spent_sats -= invoice_amount
                             return f"Payment failed: {response.payment_error}"
                             
-                        total_spent_sats += invoice_amount
                         print(f"✅ Payment successful! New total spent: {total_spent_sats} sats.")
                         return "Payment successful! Use the r_hash from the original 402 error to retry the tool."
                     except grpc.RpcError as e:
+                        total_spent_sats -= invoice_amount
                         print(f"⚠️ Network error intercepted: {e.details()}")
                         return f"Payment failed due to network error: {e.details()}"
                 
@@ -238,6 +239,8 @@ async def run():
     except Exception as e:
         print("\n❌ A fatal error occurred:")
         traceback.print_exc()
+    finally:
+        await CHANNELS.close_loop()
 
 if __name__ == "__main__":
     asyncio.run(run())
\ No newline at end of file
@@ -1,13 +1,11 @@
-import grpc
 import os
 import sys
-import codecs
+import time
 import logging
-import base64
+import threading
+from collections import OrderedDict
 import urllib.parse
 import requests 
-import qrcode
-import io
 
 # 🌟 INFRASTRUCTURE FIX: Python Path Injection
 # Generated gRPC files try to directly import each other. We force Python 
@@ -16,6 +14,10 @@ CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
 sys.path.append(os.path.abspath(os.path.join(CURRENT_DIR, '../../')))    # Looks in /app
 sys.path.append(os.path.abspath(os.path.join(CURRENT_DIR, '../grpc')))   # Looks in /app/backend/grpc
 
+from backend.core.lnd_channel import CHANNELS
+from backend.core.qr_render import QRRenderer
+from backend.core.invoice_store import INVOICE_EXPIRY, PendingInvoiceStore
+
 # --- PROTOCOL BUFFERS ---
 try:
     import rpc_pb2 as ln
@@ -34,79 +36,85 @@ HOME = os.path.expanduser("~")
 CERT_PATH = os.getenv('LND_TLS_CERT_PATH', f'{HOME}/.lnd/tls.cert')
 MACAROON_PATH = os.getenv('LND_MACAROON_PATH', f'{HOME}/.lnd/data/chain/bitcoin/regtest/admin.macaroon')
 
+# --- SETTLEMENT CACHE ---
+# A SubscribeInvoices stream keeps invoice states in memory so status polls don't each cost a LookupInvoice.
+INVOICE_SUBSCRIPTION = os.getenv('LND_INVOICE_SUBSCRIPTION', '1') == '1'
+INVOICE_CACHE_SIZE = int(os.getenv('LND_INVOICE_CACHE_SIZE', 50000))
+INVOICE_STATES = {0: "OPEN", 1: "SETTLED", 2: "CANCELED", 3: "ACCEPTED"}
+FINAL_STATES = ("SETTLED", "CANCELED")
+
+# --- QR CODES ---
+# Off by default: invoices carry a qr_url and the image is rendered on the QR pool
+# by the first GET of that URL, then served from the renderer's cache.
+# INVOICE_INLINE_QR=1 restores the base64 PNG inside the invoice response.
+# INVOICE_QR_PREFETCH=1 queues the render as soon as the invoice is created instead.
+INVOICE_INLINE_QR = os.getenv('INVOICE_INLINE_QR', '0') == '1'
+INVOICE_QR_PREFETCH = os.getenv('INVOICE_QR_PREFETCH', '0') == '1'
+
 class LightningEngine:
-    def __init__(self):
+    def __init__(self, subscribe=INVOICE_SUBSCRIPTION, cache_size=INVOICE_CACHE_SIZE):
         self.stub = None
+        self.target = None      # (host:port, cert, macaroon) of the pooled channels, once connected
         self.connected = False
-        self.pending_invoices = {}
+        self.pending_invoices = PendingInvoiceStore()   # r_hash hex -> amount/memo/payment_request until paid or expired
+
+        # r_hash hex -> {'state': 'OPEN' | 'SETTLED' | ..., 'amt_paid_sat': int}, oldest first
+        self.subscribe = subscribe
+        self.cache_size = cache_size
+        self.invoice_states = OrderedDict()
+        self.cache_stats = {"hits": 0, "misses": 0}
+        self._cache_lock = threading.Lock()
+        self._stream_live = threading.Event()
+        self._watcher = None
+        self._add_index = 0
+        self._settle_index = 0
+
+        self.qr = QRRenderer()
+        self.inline_qr = INVOICE_INLINE_QR
+        self.qr_prefetch = INVOICE_QR_PREFETCH
         
         logging.basicConfig(level=logging.INFO)
         self.logger = logging.getLogger("LND-gRPC")
 
-    def _generate_qr_base64(self, data_string):
-        """Helper: Generates a QR code base64 string locally in memory."""
+    def _generate_qr_base64(self, data_string, fmt="png"):
+        """Helper: QR code as a base64 data URI, rendered (or reused) by the QR pool."""
         if not data_string:
             return ""
             
         try:
-            # 1. Configure the QR Code matrix
-            qr = qrcode.QRCode(
-                version=1,
-                error_correction=qrcode.constants.ERROR_CORRECT_L,
-                box_size=10,
-                border=4,
-            )
-            qr.add_data(data_string)
-            qr.make(fit=True)
-
-            # 2. Render the image
-            img = qr.make_image(fill_color="black", back_color="white")
-            
-            # 3. Save to an in-memory byte buffer (No disk I/O)
-            buffer = io.BytesIO()
-            img.save(buffer, format="PNG")
-            
-            # 4. Encode to base64 for frontend consumption
-            base64_img = base64.b64encode(buffer.getvalue()).decode("utf-8")
-            return f"data:image/png;base64,{base64_img}"
-            
+            return self.qr.data_uri(data_string, fmt)
         except Exception as e:
             self.logger.error(f"❌ Local QR Generation Error: {e}")
             return ""
 
-    def connect(self):
-        """Establishes secure mTLS connection to the LND Container."""
+    def connect(self, target=None):
+        """
+        Establishes secure mTLS connection to the LND Container over the shared channel pool.
+        `target` overrides the node as (host:port, cert_path, macaroon_path); a cert of None means a plaintext local test node, which CHANNELS refuses unless allow_insecure is set.
+        """
         if not ln or not lnrpc:
             self.logger.error("❌ gRPC modules missing. Cannot connect.")
             return False
 
+        if target is not None:
+            self.target = target
+            return self._attach(CHANNELS.channel(*target))
+
         try:
             if not os.path.exists(CERT_PATH) or not os.path.exists(MACAROON_PATH):
                 self.logger.info(f"⏳ Missing Keys: Checked {CERT_PATH}")
                 return False
 
-            self.logger.info(f"🔑 Loading credentials from {CERT_PATH}...")
-
-            with open(CERT_PATH, 'rb') as f:
-                cert_creds = grpc.ssl_channel_credentials(f.read())
-
-            with open(MACAROON_PATH, 'rb') as f:
-                macaroon_bytes = f.read()
-                macaroon = codecs.encode(macaroon_bytes, 'hex')
-
-            def metadata_callback(context, callback):
-                callback([('macaroon', macaroon)], None)
-
-            auth_creds = grpc.metadata_call_credentials(metadata_callback)
-            combined_creds = grpc.composite_channel_credentials(cert_creds, auth_creds)
+            self.logger.info(f"🔌 Connecting to LND at {LND_HOST}:{LND_PORT} with credentials from {CERT_PATH}...")
+            self.target = (f"{LND_HOST}:{LND_PORT}", CERT_PATH, MACAROON_PATH)
+            return self._attach(CHANNELS.channel(*self.target))
 
-            self.logger.info(f"🔌 Connecting to LND at {LND_HOST}:{LND_PORT}...")
-            
-            channel = grpc.secure_channel(
-                f"{LND_HOST}:{LND_PORT}", 
-                combined_creds
-            )
+        except Exception as e:
+            self.logger.error(f"⚠️ LND Connection Failed: {e}")
+            return False
 
+    def _attach(self, channel):
+        try:
             self.stub = lnrpc.LightningStub(channel)
             
             info = self.stub.GetInfo(ln.GetInfoRequest())
@@ -115,6 +123,10 @@ class LightningEngine:
             
             self.logger.info(f"⚡ CONNECTED to {info.alias} (Testnet)")
             self.logger.info(f"🔑 Pubkey: {info.identity_pubkey}")
+
+            if self.subscribe and self._watcher is None:
+                self._watcher = threading.Thread(target=self._watch_invoices, name="lnd-invoice-watcher", daemon=True)
+                self._watcher.start()
             
             return True
 
@@ -122,35 +134,111 @@ class LightningEngine:
             self.logger.error(f"⚠️ LND Connection Failed: {e}")
             return False
 
+    # --- SETTLEMENT CACHE ---
+    def _remember(self, r_hash_hex, state, amt_paid_sat=0):
+        with self._cache_lock:
+            current = self.invoice_states.get(r_hash_hex)
+            # A slow LookupInvoice can answer OPEN after the stream has already reported the
+            # settlement; a final state is never replaced by an older, non-final one.
+            if current is None or current['state'] not in FINAL_STATES or state in FINAL_STATES:
+                current = self.invoice_states[r_hash_hex] = {'state': state, 'amt_paid_sat': amt_paid_sat}
+            self.invoice_states.move_to_end(r_hash_hex)
+            while len(self.invoice_states) > self.cache_size:
+                self.invoice_states.popitem(last=False)
+        if current['state'] in FINAL_STATES:
+            self.pending_invoices.discard(r_hash_hex)
+        return current
+
+    def _watch_invoices(self):
+        """Background consumer of SubscribeInvoices. Resumes from the last seen indexes after a dropped stream."""
+        backoff = 1
+        while True:
+            try:
+                request = ln.InvoiceSubscription(add_index=self._add_index, settle_index=self._settle_index)
+                stream = self.stub.SubscribeInvoices(request)
+                self._stream_live.set()
+                backoff = 1
+                for invoice in stream:
+                    self._add_index = max(self._add_index, invoice.add_index)
+                    self._settle_index = max(self._settle_index, invoice.settle_index)
+                    self._remember(invoice.r_hash.hex(), INVOICE_STATES.get(invoice.state, "UNKNOWN"), invoice.amt_paid_sat)
+            except Exception as e:
+                self.logger.error(f"⚠️ Invoice stream dropped, falling back to LookupInvoice: {e}")
+            # While the stream is down, cached OPEN entries may be stale; check_status goes back to RPCs.
+            self._stream_live.clear()
+            time.sleep(backoff)
+            backoff = min(backoff * 2, 30)
+
+    def _lookup_invoice(self, r_hash_hex):
+        self.cache_stats["misses"] += 1
+        request = ln.PaymentHash(r_hash_str=r_hash_hex)
+        invoice = self.stub.LookupInvoice(request, timeout=10)
+        # The cache may already hold a newer final state than this answer; that one is returned
+        return self._remember(r_hash_hex, INVOICE_STATES.get(invoice.state, "UNKNOWN"), invoice.amt_paid_sat)
+
+    def _invoice(self, r_hash_hex):
+        """Cached invoice state. Settled/canceled entries are final; anything else is only trusted while the stream is live."""
+        entry = self.invoice_states.get(r_hash_hex)
+        if entry is not None and (entry['state'] in FINAL_STATES or self._stream_live.is_set()):
+            self.cache_stats["hits"] += 1
+            return entry
+        return self._lookup_invoice(r_hash_hex)
+
+    def aio_stub(self):
+        """Async stub on the shared channel pool, for callers running on an event loop."""
+        if self.target is None:
+            raise ConnectionError("No pooled LND target; connect() first.")
+        return lnrpc.LightningStub(CHANNELS.aio_channel(*self.target))
+
     def create_invoice(self, sats, memo):
         if not self.connected:
             if not self.connect(): 
                 return None
         try:
-            request = ln.Invoice(value=int(sats), memo=memo)
+            request = ln.Invoice(value=int(sats), memo=memo, expiry=INVOICE_EXPIRY)
             response = self.stub.AddInvoice(request, timeout=10)
-            payment_request = response.payment_request
-            r_hash_hex = response.r_hash.hex()
-            
-            self.pending_invoices[r_hash_hex] = {
-                'amount': sats,
-                'memo': memo,
-                'payment_request': payment_request
-            }
-            
-            qr_code = self._generate_qr_base64(payment_request)
-            
-            self.logger.info(f"🧾 Invoice Created: {sats} sats | Hash: {r_hash_hex[:8]}...")
-            
-            return {
-                'payment_request': payment_request,
-                'r_hash': r_hash_hex,
-                'amount': sats,
-                'qr_code': qr_code
-            }
+            return self._record_invoice(sats, memo, response)
+        except Exception as e:
+            self.logger.error(f"❌ Invoice Creation Error: {e}")
+            return None
+
+    async def create_invoice_async(self, sats, memo):
+        """create_invoice() over grpc.aio, so many invoices can be in flight from one event loop."""
+        if not self.connected:
+            if not self.connect(): 
+                return None
+        try:
+            request = ln.Invoice(value=int(sats), memo=memo, expiry=INVOICE_EXPIRY)
+            response = await self.aio_stub().AddInvoice(request, timeout=10)
+            return self._record_invoice(sats, memo, response)
         except Exception as e:
             self.logger.error(f"❌ Invoice Creation Error: {e}")
             return None
+
+    def _record_invoice(self, sats, memo, response):
+        payment_request = response.payment_request
+        r_hash_hex = response.r_hash.hex()
+        
+        self.pending_invoices.put(r_hash_hex, {
+            'amount': sats,
+            'memo': memo,
+            'payment_request': payment_request
+        })
+        self._remember(r_hash_hex, "OPEN")
+        
+        self.logger.info(f"🧾 Invoice Created: {sats} sats | Hash: {r_hash_hex[:8]}...")
+        
+        invoice = {
+            'payment_request': payment_request,
+            'r_hash': r_hash_hex,
+            'amount': sats,
+            'qr_url': f"/api/v1/invoice/qr/{r_hash_hex}"
+        }
+        if self.inline_qr:
+            invoice['qr_code'] = self._generate_qr_base64(payment_request)
+        elif self.qr_prefetch:
+            self.qr.submit(payment_request)
+        return invoice
         
     def get_balances(self):
         if not self.connected:
@@ -174,22 +262,30 @@ class LightningEngine:
             self.logger.error(f"❌ Balance Fetch Error: {e}")
             return None
         
-    def verify_payment(self, r_hash_hex):
+    def check_status(self, r_hash_hex):
+        """Returns the invoice state name (OPEN, ACCEPTED, SETTLED, CANCELED), or UNKNOWN if LND can't be asked."""
         if not self.connected:
             if not self.connect(): 
-                return False
+                return "UNKNOWN"
         try:
-            request = ln.PaymentHash(r_hash_str=r_hash_hex)
-            invoice = self.stub.LookupInvoice(request, timeout=10)
-            
-            if invoice.state == 1:
-                self.logger.info(f"✅ Payment Verified for hash: {r_hash_hex[:8]}")
-                return True
-            else:
-                return False
-                
+            return self._invoice(r_hash_hex)['state']
         except Exception as e:
-            self.logger.error(f"❌ Payment Verification Error: {e}")
-            return False
+            self.logger.error(f"❌ Invoice Status Error: {e}")
+            return "UNKNOWN"
+
+    def verify_payment(self, r_hash_hex):
+        if self.check_status(r_hash_hex) == "SETTLED":
+            self.logger.info(f"✅ Payment Verified for hash: {r_hash_hex[:8]}")
+            return True
+        return False
+
+    def get_invoice_amount(self, r_hash_hex):
+        """Sats actually paid into a settled invoice. Raises if it isn't settled, so callers fail closed."""
+        if not self.connected and not self.connect():
+            raise ConnectionError("LND is unreachable.")
+        entry = self._invoice(r_hash_hex)
+        if entry['state'] != "SETTLED":
+            raise ValueError(f"Invoice {r_hash_hex[:8]} is {entry['state']}, not SETTLED.")
+        return entry['amt_paid_sat']
 
 lnd = LightningEngine()
\ No newline at end of file
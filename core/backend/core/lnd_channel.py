@@ -0,0 +1,103 @@
+import os
+import codecs
+import asyncio
+import itertools
+import threading
+
+import grpc
+
+# --- SHARED LND CHANNELS ---
+# Building a secure channel means reading the cert and macaroon and doing a
+# fresh TLS handshake on first use. Every LND client in the process borrows
+# from this pool instead: a few long-lived HTTP/2 connections per node, kept
+# open with keepalive pings, multiplexing any number of concurrent calls.
+# grpc.aio channels are bound to the event loop that created them, so async
+# channels are pooled per loop.
+# 🛑 SECURITY FIX: a node without a TLS cert is refused rather than reached over
+# plaintext, which would send the macaroon in the clear. LND_ALLOW_INSECURE=1
+# (or allow_insecure=True) permits plaintext channels for local test nodes only.
+
+LND_CHANNEL_POOL_SIZE = int(os.getenv('LND_CHANNEL_POOL_SIZE', 2))
+LND_ALLOW_INSECURE = os.getenv('LND_ALLOW_INSECURE', '0') == '1'
+
+KEEPALIVE_OPTIONS = [
+    ('grpc.keepalive_time_ms', 30000),             # ping an idle connection every 30s...
+    ('grpc.keepalive_timeout_ms', 10000),          # ...and drop it if the ping isn't answered in 10s
+    ('grpc.keepalive_permit_without_calls', 1),    # keep the invoice stream's connection warm too
+    ('grpc.http2.max_pings_without_data', 0),
+    ('grpc.max_receive_message_length', 50 * 1024 * 1024),
+    ('grpc.use_local_subchannel_pool', 1),         # each pooled channel gets its own TCP connection
+]
+
+
+def load_credentials(cert_path, macaroon_path):
+    """TLS cert + macaroon metadata as one set of channel credentials."""
+    with open(cert_path, 'rb') as f:
+        cert_creds = grpc.ssl_channel_credentials(f.read())
+
+    with open(macaroon_path, 'rb') as f:
+        macaroon = codecs.encode(f.read(), 'hex')
+
+    def metadata_callback(context, callback):
+        callback([('macaroon', macaroon)], None)
+
+    auth_creds = grpc.metadata_call_credentials(metadata_callback)
+    return grpc.composite_channel_credentials(cert_creds, auth_creds)
+
+
+class LNDChannelPool:
+    def __init__(self, size=LND_CHANNEL_POOL_SIZE, options=KEEPALIVE_OPTIONS, allow_insecure=LND_ALLOW_INSECURE):
+        self.size = size
+        self.options = options
+        self.allow_insecure = allow_insecure
+        self._lock = threading.Lock()
+        self._credentials = {}
+        self._channels = {}     # (target, cert, macaroon) -> [channels], (target, cert, macaroon, loop) for aio
+        self._turns = {}
+
+    def _creds(self, cert_path, macaroon_path):
+        key = (cert_path, macaroon_path)
+        if key not in self._credentials:
+            self._credentials[key] = load_credentials(cert_path, macaroon_path)
+        return self._credentials[key]
+
+    def _open(self, module, target, cert_path, macaroon_path):
+        if not cert_path:
+            # Only a plaintext local test node (see benchmarks/fake_lnd.py) has no cert, and only when explicitly allowed.
+            if not self.allow_insecure:
+                raise ValueError(f"No TLS cert configured for LND node {target}; refusing a plaintext channel (set LND_ALLOW_INSECURE=1 for local test nodes)")
+            return module.insecure_channel(target, options=self.options)
+        return module.secure_channel(target, self._creds(cert_path, macaroon_path), options=self.options)
+
+    def _pick(self, key, module, target, cert_path, macaroon_path):
+        with self._lock:
+            channels = self._channels.get(key)
+            if channels is None:
+                channels = self._channels[key] = [self._open(module, target, cert_path, macaroon_path) for _ in range(self.size)]
+                self._turns[key] = itertools.cycle(range(self.size))
+            return channels[next(self._turns[key])]
+
+    def channel(self, target, cert_path=None, macaroon_path=None):
+        """A pooled blocking channel, round-robin across the pool."""
+        return self._pick((target, cert_path, macaroon_path), grpc, target, cert_path, macaroon_path)
+
+    def aio_channel(self, target, cert_path=None, macaroon_path=None):
+        """A pooled grpc.aio channel for the running event loop."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            # Channels of loops that were shut down without close_loop() can't be used again; forget them.
+            for key in [k for k in self._channels if len(k) == 4 and k[3].is_closed()]:
+                del self._channels[key], self._turns[key]
+        return self._pick((target, cert_path, macaroon_path, loop), grpc.aio, target, cert_path, macaroon_path)
+
+    async def close_loop(self):
+        """Closes the running loop's aio channels; call before the loop shuts down."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            keys = [k for k in self._channels if len(k) == 4 and k[3] is loop]
+            closing = [channel for k in keys for channel in self._channels.pop(k)]
+        for channel in closing:
+            await channel.close()
+
+
+CHANNELS = LNDChannelPool()
@@ -0,0 +1,97 @@
+import os
+import io
+import base64
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import qrcode
+from PIL import Image
+
+# --- INVOICE QR RENDERING ---
+# QR codes are rendered off the request path on a small worker pool and cached
+# by payment request, so an invoice is returned as soon as LND answers and the
+# image is rendered once, by the first request that asks for it.
+# Both formats skip qrcode's 8-way mask penalty search (scanners read any mask)
+# and draw straight from the module matrix, which is most of the saving.
+#   png: the same 10px modules and 4-module border as before, scaled up by Pillow
+#   svg: one path of horizontal runs, no Pillow at all
+# Structure: { (payment_request, fmt): Future[bytes] }, oldest first
+
+QR_WORKERS = int(os.getenv('QR_WORKERS', 2))
+QR_CACHE_SIZE = int(os.getenv('QR_CACHE_SIZE', 1024))
+MIME_TYPES = {"png": "image/png", "svg": "image/svg+xml"}
+
+
+def _matrix(data):
+    """Module matrix including the quiet-zone border, True = dark."""
+    qr = qrcode.QRCode(version=1, error_correction=qrcode.constants.ERROR_CORRECT_L, border=4, mask_pattern=0)
+    qr.add_data(data)
+    qr.make(fit=True)
+    return qr.get_matrix()
+
+
+def render_png(data, box_size=10):
+    matrix = _matrix(data)
+    size = len(matrix)
+    img = Image.new("1", (size, size), 1)
+    img.putdata([0 if dark else 1 for row in matrix for dark in row])
+    img = img.resize((size * box_size, size * box_size), Image.NEAREST)
+    buffer = io.BytesIO()
+    img.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def render_svg(data):
+    matrix = _matrix(data)
+    runs = []
+    for y, row in enumerate(matrix):
+        x = 0
+        while x < len(row):
+            if row[x]:
+                start = x
+                while x < len(row) and row[x]:
+                    x += 1
+                runs.append(f"M{start} {y}h{x - start}v1h-{x - start}z")
+            else:
+                x += 1
+    size = len(matrix)
+    return (f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {size} {size}" shape-rendering="crispEdges">'
+            f'<rect width="{size}" height="{size}" fill="#fff"/><path fill="#000" d="{"".join(runs)}"/></svg>').encode()
+
+
+RENDERERS = {"png": render_png, "svg": render_svg}
+
+
+class QRRenderer:
+    def __init__(self, workers=QR_WORKERS, cache_size=QR_CACHE_SIZE):
+        self.cache_size = cache_size
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="qr-render")
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, data, fmt="png"):
+        """Queues a render (or returns the cached one). Concurrent callers for the same invoice share one render."""
+        key = (data, fmt)
+        with self._lock:
+            future = self._cache.get(key)
+            if future is not None:
+                self._cache.move_to_end(key)
+                return future
+            future = self._cache[key] = self._pool.submit(RENDERERS[fmt], data)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        future.add_done_callback(lambda f: f.exception() and self._forget(key, f))
+        return future
+
+    def _forget(self, key, future):
+        # A failed render must not be served from the cache forever.
+        with self._lock:
+            if self._cache.get(key) is future:
+                del self._cache[key]
+
+    def render(self, data, fmt="png", timeout=10):
+        return self.submit(data, fmt).result(timeout)
+
+    def data_uri(self, data, fmt="png", timeout=10):
+        return f"data:{MIME_TYPES[fmt]};base64,{base64.b64encode(self.render(data, fmt, timeout)).decode('utf-8')}"
@@ -0,0 +1,87 @@
+import math
+import time
+import threading
+
+# --- SLIDING WINDOW COUNTER RATE LIMITER ---
+# Each key keeps two counters instead of a list of timestamps: requests in the
+# current fixed window and in the previous one. The previous window is weighted
+# by how much of it still overlaps the sliding window, so a check is O(1) in
+# time and memory no matter how much traffic the key sends.
+# Keys are spread over independently locked shards so concurrent requests from
+# different clients almost never wait on each other.
+# Structure per shard: { (key, window_seconds): [window_index, prev_count, curr_count] }
+
+DEFAULT_SHARDS = 64
+
+
+class SlidingWindowLimiter:
+    def __init__(self, shards=DEFAULT_SHARDS, clock=time.time):
+        self.clock = clock
+        self._shards = [({}, threading.Lock()) for _ in range(shards)]
+
+    def _shard(self, key):
+        return self._shards[hash(key) % len(self._shards)]
+
+    def hit(self, key, max_requests, window_seconds):
+        """Counts one request for `key` and returns False if it exceeds the limit (rejected requests are not counted)."""
+        now = self.clock()
+        window = math.floor(now / window_seconds)
+        elapsed = (now - window * window_seconds) / window_seconds
+        slot = (key, window_seconds)
+        buckets, lock = self._shard(slot)
+        with lock:
+            state = buckets.get(slot)
+            if state is None:
+                state = buckets[slot] = [window, 0, 0]
+            elif state[0] != window:
+                # Roll forward: the current window becomes the previous one, or both expire after a full idle window.
+                state[1] = state[2] if state[0] == window - 1 else 0
+                state[2] = 0
+                state[0] = window
+            if state[1] * (1 - elapsed) + state[2] >= max_requests:
+                return False
+            state[2] += 1
+            return True
+
+    def evict_idle(self):
+        """Drops keys whose both windows have expired. Locks one shard at a time."""
+        now = self.clock()
+        evicted = 0
+        for buckets, lock in self._shards:
+            with lock:
+                idle = [slot for slot, state in buckets.items() if state[0] < math.floor(now / slot[1]) - 1]
+                for slot in idle:
+                    del buckets[slot]
+            evicted += len(idle)
+        return evicted
+
+    def __len__(self):
+        return sum(len(buckets) for buckets, _ in self._shards)
+
+
+class SharedWindowLimiter:
+    """
+    The same sliding window counter kept in a shared store (see shared_state.py),
+    so every worker process draws from one quota per client.
+    The increment is atomic; a request that lands over the limit takes its increment back.
+    """
+
+    def __init__(self, store, clock=time.time):
+        self.store = store
+        self.clock = clock
+
+    def hit(self, key, max_requests, window_seconds):
+        now = self.clock()
+        window = math.floor(now / window_seconds)
+        elapsed = (now - window * window_seconds) / window_seconds
+        slot = f"rl:{window_seconds}:{key}:"
+        expires_at = (window + 2) * window_seconds
+        previous = self.store.get(slot + str(window - 1))
+        count = self.store.incr(slot + str(window), 1, expires_at)
+        if previous * (1 - elapsed) + count - 1 >= max_requests:
+            self.store.incr(slot + str(window), -1, expires_at)
+            return False
+        return True
+
+    def evict_idle(self):
+        return self.store.purge()
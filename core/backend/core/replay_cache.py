@@ -0,0 +1,73 @@
+import math
+import time
+import threading
+
+# --- TIME-BUCKETED REPLAY CACHE ---
+# Signatures are filed into fixed buckets by the timestamp they sign. A request
+# is only accepted while its timestamp is within `ttl` of the server clock, so a
+# bucket can be dropped whole once its newest timestamp is more than `ttl` old.
+# Membership is one set lookup, and expiry never walks individual signatures.
+# Structure: { bucket_index: {signature, ...} }
+
+
+class ReplayCache:
+    def __init__(self, ttl=300, bucket_seconds=10, clock=time.time):
+        self.ttl = ttl
+        self.bucket_seconds = bucket_seconds
+        self.clock = clock
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._swept = None
+
+    def _bucket(self, signed_at):
+        if not math.isfinite(signed_at):
+            raise ValueError(f"Timestamp must be finite, got {signed_at!r}.")
+        return math.floor(signed_at / self.bucket_seconds)
+
+    def seen(self, signature, signed_at):
+        bucket = self._buckets.get(self._bucket(signed_at))
+        return bucket is not None and signature in bucket
+
+    def add(self, signature, signed_at):
+        """Marks a signature consumed. Returns False if it already was (the caller must reject the request)."""
+        index = self._bucket(signed_at)
+        with self._lock:
+            bucket = self._buckets.get(index)
+            if bucket is None:
+                bucket = self._buckets[index] = set()
+            elif signature in bucket:
+                return False
+            bucket.add(signature)
+        if self._swept != self._bucket(self.clock()):
+            self.expire()
+        return True
+
+    def expire(self):
+        """Drops every bucket whose timestamps have all aged past `ttl`. Returns how many signatures were released."""
+        now_index = self._bucket(self.clock())
+        oldest_live = self._bucket(self.clock() - self.ttl)
+        with self._lock:
+            self._swept = now_index
+            stale = [self._buckets.pop(index) for index in [i for i in self._buckets if i < oldest_live]]
+        # The sets are freed here, outside the lock, so lookups never wait on deallocation.
+        return sum(len(bucket) for bucket in stale)
+
+    def __len__(self):
+        return sum(len(bucket) for bucket in list(self._buckets.values()))
+
+
+class SharedReplayCache:
+    """ReplayCache semantics over a shared store: one claim per signature, expiring `ttl` after the time it signs."""
+
+    def __init__(self, store, ttl=300):
+        self.store = store
+        self.ttl = ttl
+
+    def seen(self, signature, signed_at):
+        return self.store.get(f"sig:{signature}") > 0
+
+    def add(self, signature, signed_at):
+        return self.store.set_if_absent(f"sig:{signature}", signed_at + self.ttl)
+
+    def expire(self):
+        return self.store.purge()
@@ -0,0 +1,134 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+
+# --- PAID TOOL RESULT CACHE ---
+# Results of paid MCP tools, content-addressed by sha256(tool name + normalized
+# arguments), so an identical query inside the tool's TTL skips the upstream API
+# or LLM work. Callers normalize the arguments that shape the result (casefold a
+# search, upper-case a ticker) and leave out the ones that don't (payment_hash,
+# price), and only look up AFTER the invoice is verified: a hit is still paid for.
+# Only tools whose answer any payer could have bought (prices, searches, research
+# on public data) belong here; a tool that makes something for its payer, like
+# generate_image, must not be cached, or one payer's output is sold to the next.
+# Each tool has its own TTL; tools without one are never cached. Entries are LRU
+# past `max_size`. The cache is in memory unless RESULT_CACHE_DB names an SQLite
+# file: then entries are written through to it and reloaded on start, so a
+# restart doesn't drop paid-for work. Paid results only reach disk when the
+# operator opts in. expire() must be called periodically; it also deletes
+# expired rows from the file.
+# Structure: { key: (expires_at, tool_name, result) }
+
+RESULT_CACHE_SIZE = int(os.getenv('RESULT_CACHE_SIZE', 10000))
+RESULT_CACHE_DB = os.getenv('RESULT_CACHE_DB')
+
+def cache_key(tool_name, arguments):
+    blob = json.dumps([tool_name, arguments], sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(blob.encode()).hexdigest()
+
+
+def normalize_text(value, casefold=False):
+    """Collapses runs of whitespace (and optionally case) so trivially different queries share a key."""
+    text = " ".join(str(value or "").split())
+    return text.casefold() if casefold else text
+
+
+class ResultCache:
+    def __init__(self, ttls, max_size=RESULT_CACHE_SIZE, path=RESULT_CACHE_DB, clock=time.time):
+        self.ttls = dict(ttls)
+        self.max_size = max_size
+        self.clock = clock
+        self._stats = {tool: {"hits": 0, "misses": 0, "stores": 0, "expired": 0, "evicted": 0} for tool in self.ttls}
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            self._open(path)
+
+    # --- PERSISTENCE ---
+    def _open(self, path):
+        self._db = sqlite3.connect(path, timeout=5.0, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute('''CREATE TABLE IF NOT EXISTS tool_results (key TEXT PRIMARY KEY, tool_name TEXT NOT NULL,
+                            result TEXT NOT NULL, expires_at REAL NOT NULL) WITHOUT ROWID''')
+        self._db.execute("DELETE FROM tool_results WHERE expires_at <= ?", (self.clock(),))
+        rows = self._db.execute("SELECT key, tool_name, result, expires_at FROM tool_results ORDER BY expires_at LIMIT ?",
+                                (self.max_size,)).fetchall()
+        for key, tool_name, result, expires_at in rows:
+            if tool_name in self.ttls:
+                self._entries[key] = (expires_at, tool_name, result)
+
+    def _persist(self, sql, params):
+        if self._db is not None:
+            self._db.execute(sql, params)
+
+    def _drop_locked(self, key, reason):
+        _, tool_name, _ = self._entries.pop(key)
+        self._stats[tool_name][reason] += 1
+        self._persist("DELETE FROM tool_results WHERE key = ?", (key,))
+
+    # --- LOOKUP ---
+    def get(self, tool_name, arguments):
+        """Returns the cached result for this call, or None. Call only once payment is verified."""
+        if tool_name not in self.ttls:
+            return None
+        key = cache_key(tool_name, arguments)
+        with self._lock:
+            current = self._entries.get(key)
+            if current is not None and current[0] <= self.clock():
+                self._drop_locked(key, "expired")
+                current = None
+            if current is None:
+                self._stats[tool_name]["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats[tool_name]["hits"] += 1
+            return current[2]
+
+    def put(self, tool_name, arguments, result):
+        """Caches a successful result for the tool's TTL."""
+        ttl = self.ttls.get(tool_name)
+        if not ttl:
+            return
+        key = cache_key(tool_name, arguments)
+        expires_at = self.clock() + ttl
+        with self._lock:
+            self._entries[key] = (expires_at, tool_name, result)
+            self._entries.move_to_end(key)
+            self._stats[tool_name]["stores"] += 1
+            self._persist("INSERT OR REPLACE INTO tool_results (key, tool_name, result, expires_at) VALUES (?, ?, ?, ?)",
+                          (key, tool_name, result, expires_at))
+            while len(self._entries) > self.max_size:
+                self._drop_locked(next(iter(self._entries)), "evicted")
+
+    def expire(self):
+        """Drops every entry past its TTL, in memory and on disk. Returns how many were released."""
+        now = self.clock()
+        with self._lock:
+            stale = [key for key, (expires_at, *_) in self._entries.items() if expires_at <= now]
+            for key in stale:
+                self._drop_locked(key, "expired")
+            # Rows that were never loaded (past max_size at start) are only ever reached here
+            self._persist("DELETE FROM tool_results WHERE expires_at <= ?", (now,))
+        return len(stale)
+
+    def stats(self):
+        """Per-tool hit/miss counters plus the overall hit rate and entry count."""
+        with self._lock:
+            tools = {tool: dict(counts) for tool, counts in self._stats.items()}
+        hits = sum(c["hits"] for c in tools.values())
+        lookups = hits + sum(c["misses"] for c in tools.values())
+        return {"entries": len(self._entries), "hit_rate": round(hits / lookups, 4) if lookups else 0.0, "tools": tools}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
@@ -0,0 +1,156 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+
+# --- SHARED CROSS-WORKER STATE ---
+# Rate limit counters, consumed signatures and daemon messages live in process
+# memory by default, which is only correct with a single worker. Setting
+# SHARED_STATE_URL=sqlite:////path/to/state.db moves them into a SQLite file in
+# WAL mode that every gunicorn worker on the host opens. Each operation is a
+# single statement, so increments and set-if-absent are atomic across processes.
+# Paid execution jobs (job_queue.py) are always kept in a store like this one, so
+# their status is visible to every worker and survives a restart.
+# Tables: counters (key, value, expires_at), messages (id, channel, body) and
+# jobs (job_id, invoice_hash, status, version, updated_at, owner, lease_until, body).
+
+SHARED_STATE_URL = os.environ.get("SHARED_STATE_URL")
+
+
+class SQLiteStateStore:
+    def __init__(self, path, clock=time.time):
+        self.path = path
+        self.clock = clock
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.execute('''CREATE TABLE IF NOT EXISTS counters (key TEXT PRIMARY KEY, value INTEGER NOT NULL, expires_at REAL NOT NULL) WITHOUT ROWID''')
+            conn.execute('''CREATE INDEX IF NOT EXISTS counters_expiry ON counters (expires_at)''')
+            conn.execute('''CREATE TABLE IF NOT EXISTS messages (id INTEGER PRIMARY KEY AUTOINCREMENT, channel TEXT NOT NULL, body TEXT NOT NULL)''')
+            conn.execute('''CREATE INDEX IF NOT EXISTS messages_channel ON messages (channel, id)''')
+            conn.execute('''CREATE TABLE IF NOT EXISTS jobs (job_id TEXT PRIMARY KEY, invoice_hash TEXT NOT NULL UNIQUE, status TEXT NOT NULL,
+                            version INTEGER NOT NULL, updated_at REAL NOT NULL, owner TEXT NOT NULL, lease_until REAL NOT NULL, body TEXT NOT NULL)''')
+            conn.execute('''CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, lease_until)''')
+
+    def _conn(self):
+        # One connection per thread and per PID: sqlite3 connections must not cross a fork.
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def incr(self, key, amount, expires_at):
+        """Adds `amount` to a counter (created at 0, or reset if expired) and returns the new value."""
+        now = self.clock()
+        row = self._conn().execute(
+            "INSERT INTO counters (key, value, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT (key) DO UPDATE SET "
+            "value = CASE WHEN counters.expires_at <= ? THEN excluded.value ELSE counters.value + excluded.value END, "
+            "expires_at = MAX(counters.expires_at, excluded.expires_at) "
+            "RETURNING value", (key, amount, expires_at, now)).fetchone()
+        return row[0]
+
+    def get(self, key):
+        row = self._conn().execute("SELECT value FROM counters WHERE key = ? AND expires_at > ?", (key, self.clock())).fetchone()
+        return row[0] if row else 0
+
+    def set_if_absent(self, key, expires_at):
+        """Claims `key` until `expires_at`. Returns False if another caller already holds an unexpired claim."""
+        cursor = self._conn().execute(
+            "INSERT INTO counters (key, value, expires_at) VALUES (?, 1, ?) "
+            "ON CONFLICT (key) DO UPDATE SET value = 1, expires_at = excluded.expires_at WHERE counters.expires_at <= ?",
+            (key, expires_at, self.clock()))
+        return cursor.rowcount == 1
+
+    def append(self, channel, body):
+        self._conn().execute("INSERT INTO messages (channel, body) VALUES (?, ?)", (channel, body))
+
+    def tail(self, channel, n):
+        rows = self._conn().execute("SELECT body FROM messages WHERE channel = ? ORDER BY id DESC LIMIT ?", (channel, n)).fetchall()
+        return [row[0] for row in reversed(rows)]
+
+    def purge(self, keep_messages=50):
+        """Deletes expired counters and old messages. Returns how many counters were released."""
+        conn = self._conn()
+        released = conn.execute("DELETE FROM counters WHERE expires_at <= ?", (self.clock(),)).rowcount
+        conn.execute(
+            "DELETE FROM messages WHERE id IN (SELECT id FROM (SELECT id, ROW_NUMBER() OVER (PARTITION BY channel ORDER BY id DESC) AS n FROM messages) WHERE n > ?)",
+            (keep_messages,))
+        return released
+
+
+    # --- JOBS ---
+    # A job row is written only by the worker that owns it (`owner`), which
+    # renews `lease_until` while the job is queued or running. Every write is
+    # conditional on the owner or on the version read, so a worker that lost
+    # its lease can't overwrite a job someone else has since failed or re-queued.
+    def insert_job(self, job, owner, lease_until):
+        """Records a new job. Returns False if its invoice already has one."""
+        cursor = self._conn().execute(
+            "INSERT INTO jobs (job_id, invoice_hash, status, version, updated_at, owner, lease_until, body) VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (invoice_hash) DO NOTHING",
+            (job['job_id'], job['invoice_hash'], job['status'], job['version'], job['updated_at'], owner, lease_until, json.dumps(job)))
+        return cursor.rowcount == 1
+
+    def update_job(self, job, owner, lease_until, expected_version=None, expected_status=None):
+        """Writes the job back if `owner` still holds it (or, when given, it is still at that version and status)."""
+        sql = "UPDATE jobs SET status = ?, version = ?, updated_at = ?, owner = ?, lease_until = ?, body = ? WHERE job_id = ?"
+        params = [job['status'], job['version'], job['updated_at'], owner, lease_until, json.dumps(job), job['job_id']]
+        if expected_version is None:
+            sql += " AND owner = ?"
+            params.append(owner)
+        else:
+            sql += " AND version = ? AND status = ?"
+            params += [expected_version, expected_status]
+        return self._conn().execute(sql, params).rowcount == 1
+
+    def get_job(self, job_id):
+        row = self._conn().execute("SELECT body FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def job_for_invoice(self, invoice_hash):
+        row = self._conn().execute("SELECT body FROM jobs WHERE invoice_hash = ?", (invoice_hash,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def renew_jobs(self, owner, statuses, lease_until):
+        marks = ", ".join("?" * len(statuses))
+        self._conn().execute(f"UPDATE jobs SET lease_until = ? WHERE owner = ? AND status IN ({marks})", (lease_until, owner, *statuses))
+
+    def lapsed_jobs(self, statuses):
+        """Jobs in `statuses` whose owner stopped renewing the lease (the worker died or restarted)."""
+        marks = ", ".join("?" * len(statuses))
+        rows = self._conn().execute(f"SELECT body FROM jobs WHERE status IN ({marks}) AND lease_until <= ?", (*statuses, self.clock())).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def purge_jobs(self, status, before):
+        return self._conn().execute("DELETE FROM jobs WHERE status = ? AND updated_at < ?", (status, before)).rowcount
+
+    def job_counts(self):
+        return dict(self._conn().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+
+
+class SharedMessageLog:
+    """List-like view of a message channel, so DAEMON_MESSAGES keeps its append()/list() usage."""
+
+    def __init__(self, store, channel, keep=5):
+        self.store = store
+        self.channel = channel
+        self.keep = keep
+
+    def append(self, body):
+        self.store.append(self.channel, body)
+
+    def __iter__(self):
+        return iter(self.store.tail(self.channel, self.keep))
+
+
+def open_store(url=SHARED_STATE_URL):
+    """Returns the configured shared store, or None to keep state in process memory."""
+    if not url:
+        return None
+    if url.startswith("sqlite:///"):
+        return SQLiteStateStore(url[len("sqlite:///"):])
+    raise ValueError(f"Unsupported SHARED_STATE_URL scheme: {url}")
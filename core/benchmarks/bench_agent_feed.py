@@ -0,0 +1,124 @@
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+
+import fleet_sim
+
+# PAN GATEWAY - DASHBOARD FEED BENCHMARK
+# Every dashboard used to poll /v1/agents and get the whole fleet back, offline
+# agents included. The delta feed sends one snapshot on connect and then one
+# shared frame per tick with only the agents that changed. Both modes run
+# against the real gateway cache and ConnectionManager with in-memory viewers.
+# ----------------------------------------------------
+
+
+class CountingViewer:
+    """Stands in for a dashboard WebSocket; counts what the gateway sends it."""
+
+    def __init__(self):
+        self.bytes = 0
+        self.frames = 0
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text: str):
+        self.bytes += len(text.encode())
+        self.frames += 1
+
+
+def seed_fleet(gateway, agents: int, offline_share: float, rng: random.Random) -> list[dict]:
+    fleet = fleet_sim.make_fleet(agents)
+    for a in fleet:
+        status = "OFFLINE" if rng.random() < offline_share else "ONLINE"
+        gateway.agent_cache.heartbeat(a["agent_id"], status, a["lat"], a["lon"], a["radius"], a["loadout"])
+    gateway.agent_cache.drain_feed()
+    return fleet
+
+
+def churn(gateway, fleet: list[dict], changes: int, rng: random.Random):
+    """One second of heartbeats: `changes` online agents nudge their position."""
+    cache = gateway.agent_cache
+    for a in rng.sample(fleet, changes):
+        state = cache.get(a["agent_id"])
+        if state["status"] == "OFFLINE":
+            continue
+        cache.heartbeat(a["agent_id"], state["status"], state["lat"] + rng.uniform(-0.001, 0.001),
+                        state["lon"] + rng.uniform(-0.001, 0.001), state["radius"], state["loadout"])
+
+
+def run_polling(gateway, fleet, viewers, seconds, changes, poll_interval, rng):
+    """Each viewer fetches the full fleet every `poll_interval` seconds."""
+    sent = 0
+    cpu = 0.0
+    for second in range(seconds):
+        churn(gateway, fleet, changes, rng)
+        gateway.agent_cache.drain_feed()
+        if second % poll_interval:
+            continue
+        start = time.process_time()
+        for _ in range(viewers):
+            # Each poll is its own request, so each one re-serializes the fleet.
+            sent += len(gateway.json.dumps(gateway.agent_cache.snapshot()).encode())
+        cpu += time.process_time() - start
+    return sent, cpu
+
+
+async def run_delta(gateway, fleet, viewers, seconds, changes, rng):
+    manager = gateway.manager
+    sockets = [CountingViewer() for _ in range(viewers)]
+
+    start = time.process_time()
+    for ws in sockets:
+        await manager.connect_viewer(ws)
+        await ws.send_text(gateway.json.dumps({"type": "SNAPSHOT", "agents": gateway.agent_cache.snapshot(live_only=True)}))
+    snapshot_cpu = time.process_time() - start
+    snapshot_bytes = sum(ws.bytes for ws in sockets)
+
+    cpu = 0.0
+    for _ in range(seconds):
+        churn(gateway, fleet, changes, rng)
+        start = time.process_time()
+        await gateway.publish_agent_deltas()
+        cpu += time.process_time() - start
+
+    for ws in sockets:
+        manager.disconnect_viewer(ws)
+    return sum(ws.bytes for ws in sockets) - snapshot_bytes, cpu, snapshot_bytes, snapshot_cpu
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark /v1/agents polling vs. the /ws/v1/agents delta feed")
+    parser.add_argument("--agents", type=int, default=10_000)
+    parser.add_argument("--viewers", type=int, default=100)
+    parser.add_argument("--seconds", type=int, default=30, help="Simulated wall-clock seconds")
+    parser.add_argument("--changes", type=int, default=1000, help="Agents reporting new telemetry per second")
+    parser.add_argument("--offline-share", type=float, default=0.3)
+    parser.add_argument("--poll-interval", type=int, default=2, help="Dashboard polling period (s)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        gateway = fleet_sim.import_gateway(tmp)
+        fleet = seed_fleet(gateway, args.agents, args.offline_share, random.Random(7))
+
+        poll_bytes, poll_cpu = run_polling(gateway, fleet, args.viewers, args.seconds, args.changes,
+                                           args.poll_interval, random.Random(11))
+        delta_bytes, delta_cpu, snapshot_bytes, snapshot_cpu = asyncio.run(
+            run_delta(gateway, fleet, args.viewers, args.seconds, args.changes, random.Random(11)))
+        gateway.repo.shutdown()
+
+    print(f"{args.agents} agents ({args.offline_share:.0%} offline), {args.viewers} viewers, "
+          f"{args.changes} changes/s over {args.seconds}s")
+    print(f"{'MODE':>8} | {'MB/s out':>9} | {'CPU ms/s':>9} | {'CPU %':>6}")
+    print("-" * 42)
+    for label, sent, cpu in (("polling", poll_bytes, poll_cpu), ("delta", delta_bytes, delta_cpu)):
+        print(f"{label:>8} | {sent / args.seconds / 1e6:>9.2f} | {cpu / args.seconds * 1000:>9.1f} | "
+              f"{cpu / args.seconds:>6.1%}")
+    print(f"delta connect-time snapshots: {snapshot_bytes / args.viewers / 1e6:.2f} MB, "
+          f"{snapshot_cpu / args.viewers * 1000:.1f} ms CPU per viewer")
+
+
+if __name__ == "__main__":
+    main()
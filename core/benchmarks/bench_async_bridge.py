@@ -0,0 +1,137 @@
+import os
+import sys
+import time
+import asyncio
+import logging
+import hashlib
+import argparse
+import statistics
+import subprocess
+import urllib.request
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.abspath(os.path.join(BENCH_DIR, '..')))
+
+# AGENT ENGINE - ASYNC BRIDGE BENCHMARK
+# What a Flask worker pays to call the async agent engine, per request:
+#   asyncio.run : a fresh event loop per request (the old api_chat / api_execute path),
+#                 so every request opens its own MCP SSE session and TCP connections
+#   bridge      : BRIDGE.run() onto one long-lived loop, sharing one MCP session
+# Calls agent_engine_v2.get_mcp_invoice against a local MCP SSE server (run as a
+# subprocess) that counts sessions and client TCP connections. A last run keeps
+# slow calls in flight on the shared session while others time out, to check a
+# timed-out call doesn't take the session (and its neighbours) down with it.
+# ----------------------------------------------------
+
+
+def serve(port: int):
+    import uvicorn
+    from starlette.responses import JSONResponse
+    from mcp.server.fastmcp import FastMCP
+
+    mcp = FastMCP("bench")
+    stats = {"sessions": 0, "connections": set()}
+
+    @mcp.tool()
+    async def generate_image(prompt: str, cost: int = 100, payment_hash: str = None) -> str:
+        if prompt.startswith("SLOW"):
+            await asyncio.sleep(float(prompt.split()[1]))
+        r_hash = hashlib.sha256(prompt.encode()).hexdigest()
+        return f"402 Payment Required. Invoice: lnbcrt{cost}n1{r_hash} Hash to use: {r_hash}"
+
+    sse = mcp.sse_app()
+
+    async def app(scope, receive, send):
+        if scope["type"] == "http":
+            if scope["path"] == "/stats":
+                return await JSONResponse({"sessions": stats["sessions"], "connections": len(stats["connections"])})(scope, receive, send)
+            stats["connections"].add(tuple(scope["client"]))
+            if scope["path"] == "/sse":
+                stats["sessions"] += 1
+        await sse(scope, receive, send)
+
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="error")
+
+
+def server_stats(port: int) -> dict:
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}/stats") as r:
+        return json.load(r)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-request cost of asyncio.run() vs. a persistent background event loop")
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--concurrency", default="1,8", help="Comma-separated Flask worker threads")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.serve:
+        return serve(args.port)
+
+    # The old path drops every session mid-stream, which both sides log at length; keep the table readable.
+    server = subprocess.Popen([sys.executable, __file__, "--serve", "--port", str(args.port)], stderr=subprocess.DEVNULL)
+    logging.getLogger("mcp").setLevel(logging.CRITICAL)
+    try:
+        for _ in range(100):
+            try:
+                server_stats(args.port)
+                break
+            except OSError:
+                time.sleep(0.1)
+        os.environ["MCP_SSE_URL"] = f"http://127.0.0.1:{args.port}/sse"
+        import agent_engine_v2
+        from backend.core.async_bridge import BRIDGE
+
+        async def noop():
+            return None
+
+        for label, call in (("asyncio.run", asyncio.run), ("bridge", BRIDGE.run)):
+            start = time.perf_counter()
+            for _ in range(2000):
+                call(noop())
+            print(f"empty coroutine via {label}: {(time.perf_counter() - start) / 2000 * 1e6:.0f} us")
+
+        print(f"\n{args.requests} get_mcp_invoice calls per row")
+        print(f"{'MODE':>11} | {'THREADS':>7} | {'REQ/s':>7} | {'p50 ms':>7} | {'p99 ms':>7} | {'MCP SESSIONS':>12} | {'TCP CONNS':>9}")
+        print("-" * 80)
+        for concurrency in [int(c) for c in args.concurrency.split(",")]:
+            for label, call in (("asyncio.run", asyncio.run), ("bridge", BRIDGE.run)):
+                before = server_stats(args.port)
+
+                def one(i):
+                    start = time.perf_counter()
+                    result = call(agent_engine_v2.get_mcp_invoice("generate_image", {"prompt": f"bench {i}", "cost": 100}, 100))
+                    assert result["type"] == "payment_required", result
+                    return (time.perf_counter() - start) * 1000
+
+                start = time.perf_counter()
+                with ThreadPoolExecutor(concurrency) as pool:
+                    samples = list(pool.map(one, range(args.requests)))
+                elapsed = time.perf_counter() - start
+                after = server_stats(args.port)
+                p99 = statistics.quantiles(samples, n=100, method="inclusive")[98]
+                print(f"{label:>11} | {concurrency:>7} | {args.requests / elapsed:>7.0f} | {statistics.median(samples):>7.1f} | {p99:>7.1f} | "
+                      f"{after['sessions'] - before['sessions']:>12} | {after['connections'] - before['connections']:>9}")
+
+        async def mixed(calls):
+            # Every 10th call times out at 0.2s while the rest are still waiting on a 0.5s tool
+            jobs = [agent_engine_v2.MCP_SESSIONS.call_tool("generate_image", {"prompt": "SLOW 5"}, timeout=0.2) if i % 10 == 0
+                    else agent_engine_v2.get_mcp_invoice("generate_image", {"prompt": f"SLOW 0.5 {i}", "cost": 100}, 100)
+                    for i in range(calls)]
+            return await asyncio.gather(*jobs, return_exceptions=True)
+
+        before, connects = server_stats(args.port), agent_engine_v2.MCP_SESSIONS.connects
+        results = BRIDGE.run(mixed(100))
+        timed_out = sum(isinstance(r, Exception) for r in results[::10])
+        failed = sum(not isinstance(r, dict) or r.get("type") != "payment_required" for i, r in enumerate(results) if i % 10)
+        print(f"\n{timed_out} calls timed out mid-flight: {failed}/90 concurrent calls failed, "
+              f"{agent_engine_v2.MCP_SESSIONS.connects - connects} reconnects, {server_stats(args.port)['sessions'] - before['sessions']} new MCP sessions")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+import time
+import random
+import argparse
+import statistics
+
+from fleet_sim import GEAR_TYPES, make_fleet, make_incidents, scan_winner
+from auction_engine import AgentGrid, BidBook, FleetArrays
+
+# PAN GATEWAY - BID BOOK BENCHMARK
+# Three ways to clear the same auctions on a fleet with mixed loadouts:
+#   scan  : the original scalar loop over every agent (the reference result)
+#   numpy : FleetArrays, the same full-fleet auction in one vectorized pass
+#   book  : per-region, per-gear price ladders walked cheapest-first (dispatch path)
+# Every auction's book winner is checked against both references.
+# Also times the index maintenance each heartbeat pays for.
+# ----------------------------------------------------
+
+
+def bench(fn, items):
+    samples = []
+    results = []
+    for item in items:
+        start = time.perf_counter()
+        results.append(fn(item))
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples), statistics.quantiles(samples, n=100, method="inclusive")[98], results
+
+
+def mixed_fleet(n: int, seed: int = 42) -> list[dict]:
+    """fleet_sim agents, plus a share of specialists carrying every gear type at a premium."""
+    rng = random.Random(seed)
+    fleet = make_fleet(n, seed)
+    for a in rng.sample(fleet, n // 10):
+        a["loadout"] = {g: round(rng.uniform(40.0, 90.0), 2) for g in GEAR_TYPES}
+    return fleet
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the per-gear bid book against a full-fleet scan")
+    parser.add_argument("--sizes", default="1000,10000,100000")
+    parser.add_argument("--auctions", type=int, default=200)
+    parser.add_argument("--budgets", default="25,45,1000", help="Comma-separated max budgets to auction at")
+    args = parser.parse_args()
+
+    print(f"{'AGENTS':>8} | {'BUDGET':>6} | {'SCAN p50':>9} | {'NUMPY p50':>9} | {'BOOK p50':>9} | {'BOOK p99':>9} | {'vs SCAN':>8}")
+    print("-" * 77)
+
+    for n in [int(s) for s in args.sizes.split(",")]:
+        fleet = mixed_fleet(n)
+        book = BidBook(AgentGrid())
+        arrays = FleetArrays()
+        for a in fleet:
+            book.upsert(a["agent_id"], a["lat"], a["lon"], a["radius"], a["loadout"])
+            arrays.upsert(a["agent_id"], a["lat"], a["lon"], a["radius"], a["loadout"])
+
+        for budget in [float(b) for b in args.budgets.split(",")]:
+            incidents = make_incidents(args.auctions)
+            for i in incidents:
+                i["max_budget"] = budget
+
+            def scan(i):
+                return scan_winner(fleet, i["lat"], i["lon"], i["required_gear"], i["max_budget"])
+
+            def vectorized(i):
+                return arrays.select_winner(i["lat"], i["lon"], i["required_gear"], i["max_budget"])
+
+            def book_walk(i):
+                ranked = book.ranked(i["lat"], i["lon"], i["required_gear"], i["max_budget"])
+                return ranked[0] if ranked else None
+
+            scan_p50, _, scan_results = bench(scan, incidents)
+            numpy_p50, _, numpy_results = bench(vectorized, incidents)
+            book_p50, book_p99, book_results = bench(book_walk, incidents)
+
+            for label, reference in (("scan", scan_results), ("numpy", numpy_results)):
+                mismatches = sum(1 for a, b in zip(reference, book_results) if (a and a[0]) != (b and b[0]))
+                assert mismatches == 0, f"{mismatches} auctions picked a different winner than the {label} reference!"
+
+            print(f"{n:>8} | {budget:>6.0f} | {scan_p50:>9.3f} | {numpy_p50:>9.3f} | {book_p50:>9.3f} | {book_p99:>9.3f} | "
+                  f"{scan_p50 / book_p50:>7.1f}x")
+
+    # Maintenance: what a heartbeat costs the book when the agent moves vs. re-prices its gear.
+    rng = random.Random(9)
+    sample = rng.sample(fleet, min(len(fleet), 5000))
+    moves = [(a, a["lat"] + 0.001, a["lon"] + 0.001, a["loadout"]) for a in sample]
+    reprices = [(a, a["lat"], a["lon"], {g: b + 1.0 for g, b in a["loadout"].items()}) for a in sample]
+    for label, updates in (("move", moves), ("re-price", reprices)):
+        p50, p99, _ = bench(lambda u: book.upsert(u[0]["agent_id"], u[1], u[2], u[0]["radius"], u[3]), updates)
+        print(f"book upsert ({label}, {len(fleet)} agents): p50 {p50 * 1000:.1f} us, p99 {p99 * 1000:.1f} us")
+
+
+if __name__ == "__main__":
+    main()
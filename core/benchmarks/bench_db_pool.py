@@ -0,0 +1,91 @@
+import os
+import sys
+import time
+import argparse
+import statistics
+import threading
+
+# FLASK APP - POSTGRES CONNECTION BENCHMARK
+# Many threads play request handlers against a real Postgres (DATABASE_URL).
+#   legacy : fresh connection + the full CREATE TABLE IF NOT EXISTS batch per request
+#   pooled : connection borrowed from the process pool, schema bootstrapped once
+# Each request runs the same small read the dashboard does.
+# ----------------------------------------------------
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.abspath(os.path.join(BENCH_DIR, '..')))
+
+QUERY = "SELECT task_id, task_type, bid_sats FROM tasks WHERE status = %s LIMIT 5"
+
+
+def legacy_request(db_module):
+    db = db_module.DBWrapper()
+    try:
+        for ddl in db_module.APP_SCHEMA:
+            db.execute(ddl)
+        db.commit()
+        db.execute(QUERY, ("OPEN",)).fetchall()
+    finally:
+        db.close()
+
+
+def pooled_request(db_module):
+    db_module.bootstrap_schema()
+    db = db_module.get_pooled_conn()
+    try:
+        db.execute(QUERY, ("OPEN",)).fetchall()
+    finally:
+        db.close()
+
+
+def run(handler, db_module, threads: int, requests: int) -> tuple[float, list]:
+    latencies = []
+    lock = threading.Lock()
+
+    def worker():
+        local = []
+        for _ in range(requests):
+            start = time.perf_counter()
+            handler(db_module)
+            local.append((time.perf_counter() - start) * 1000)
+        with lock:
+            latencies.extend(local)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    start = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    return time.perf_counter() - start, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-request connect + DDL vs. pooled connections with one-time schema bootstrap")
+    parser.add_argument("--database-url", default=os.environ.get("DATABASE_URL"), help="Defaults to $DATABASE_URL")
+    parser.add_argument("--threads", default="1,8,32", help="Comma-separated concurrent handler counts")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per thread")
+    args = parser.parse_args()
+
+    if not args.database_url:
+        parser.error("a Postgres DATABASE_URL is required")
+    os.environ["DATABASE_URL"] = args.database_url
+    from backend.core import db as db_module
+
+    print(f"{'MODE':>7} | {'THREADS':>7} | {'REQ/s':>9} | {'p50 ms':>8} | {'p99 ms':>8}")
+    print("-" * 52)
+    try:
+        for threads in [int(t) for t in args.threads.split(",")]:
+            for mode, handler in (("legacy", legacy_request), ("pooled", pooled_request)):
+                elapsed, latencies = run(handler, db_module, threads, args.requests)
+                p99 = statistics.quantiles(latencies, n=100, method="inclusive")[98]
+                print(f"{mode:>7} | {threads:>7} | {len(latencies) / elapsed:>9.0f} | "
+                      f"{statistics.median(latencies):>8.2f} | {p99:>8.2f}")
+    finally:
+        db_module.POOL.close_all()
+    print(f"Pool bounds: {db_module.DB_POOL_MIN}-{db_module.DB_POOL_MAX} connections. "
+          "Above DB_POOL_MAX threads, pooled handlers queue instead of failing.")
+
+
+if __name__ == "__main__":
+    main()
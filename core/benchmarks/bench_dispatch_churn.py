@@ -0,0 +1,168 @@
+import json
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+import statistics
+
+import fleet_sim
+
+# PAN GATEWAY - DISPATCH UNDER SOCKET CHURN
+# A simulated fleet whose WebSockets keep dying: some close cleanly, others
+# go half-open and silently swallow frames. Incidents stream in and each one
+# is timed from webhook to the winning agent's ACK.
+#   legacy : no liveness, one candidate; a dead winner wastes the auction
+#   live   : PING/PONG liveness filter + fallback down the pre-ranked list
+# Timings are scaled down (sub-second pings and ack timeouts) so a run is short.
+# ----------------------------------------------------
+
+
+class FakeAgentSocket:
+    """Stands in for an agent's /ws/v1/dispatch socket and plays the client side."""
+
+    def __init__(self, agent_id: str, gateway, ack_ms: float):
+        self.agent_id = agent_id
+        self.gateway = gateway
+        self.ack_ms = ack_ms
+        self.state = "live"   # live | zombie (half-open) | closed
+
+    async def accept(self):
+        pass
+
+    async def close(self, code: int = 1000):
+        self.state = "closed"
+
+    async def send_text(self, text: str):
+        if self.state == "closed":
+            raise RuntimeError("socket closed")
+        if self.state == "zombie":
+            return
+        message = json.loads(text)
+        if message["type"] == "PING":
+            asyncio.get_running_loop().call_later(0.005, self._reply)
+        elif message["type"] == "MISSION":
+            asyncio.get_running_loop().call_later(self.ack_ms / 1000, self._reply, message["missionId"])
+
+    def _reply(self, mission_id=None):
+        if self.state != "live":
+            return
+        manager = self.gateway.manager
+        manager.touch(self.agent_id)
+        if mission_id is not None:
+            manager.ack(self.agent_id, mission_id)
+            self.gateway.take_offer(self.agent_id)      # accept (the DB side is left out)
+            self.gateway.agent_cache.set_status(self.agent_id, "BUSY")
+            asyncio.get_running_loop().call_later(random.uniform(1.0, 3.0), self.gateway.agent_cache.set_status, self.agent_id, "ONLINE")
+
+
+async def churn(gateway, sockets: dict, rate: float, stop: asyncio.Event, rng: random.Random):
+    """Every 100ms a slice of live sockets dies; dead agents reconnect 1-3s later."""
+    loop = asyncio.get_running_loop()
+
+    async def reconnect(agent_id: str):
+        ws = FakeAgentSocket(agent_id, gateway, sockets[agent_id].ack_ms)
+        sockets[agent_id] = ws
+        await gateway.manager.connect(agent_id, ws, gateway.ACK_PROTOCOL)
+
+    while not stop.is_set():
+        await asyncio.sleep(0.1)
+        for agent_id, ws in list(sockets.items()):
+            if ws.state != "live" or rng.random() >= rate * 0.1:
+                continue
+            if rng.random() < 0.5:
+                ws.state = "closed"
+                gateway.manager.disconnect(agent_id, ws)   # clean close: the receive loop sees it
+            else:
+                ws.state = "zombie"                         # half-open: nobody notices until a ping goes unanswered
+            loop.call_later(rng.uniform(1.0, 3.0), lambda a=agent_id: asyncio.ensure_future(reconnect(a)))
+
+
+async def run_mode(gateway, mode: str, fleet: list, args) -> tuple[list, int, int]:
+    rng = random.Random(23)
+    gateway.manager = gateway.ConnectionManager(ping_interval=args.ping_interval, liveness_timeout=args.liveness_timeout)
+    gateway.ACK_TIMEOUT_SECONDS = args.ack_timeout
+    gateway.dispatched_agents.clear()
+    gateway.open_offers.clear()
+    if mode == "legacy":
+        gateway.DISPATCH_CANDIDATES = 1
+        gateway.manager.is_live = lambda agent_id: True
+    else:
+        gateway.DISPATCH_CANDIDATES = args.candidates
+
+    sockets = {}
+    for a in fleet:
+        gateway.agent_cache.heartbeat(a["agent_id"], "ONLINE", a["lat"], a["lon"], a["radius"], a["loadout"])
+        slow = rng.random() < args.slow_share
+        sockets[a["agent_id"]] = FakeAgentSocket(a["agent_id"], gateway, rng.uniform(400, 900) if slow else rng.lognormvariate(3.5, 0.5))
+        await gateway.manager.connect(a["agent_id"], sockets[a["agent_id"]], gateway.ACK_PROTOCOL)
+
+    stop = asyncio.Event()
+    background = [asyncio.create_task(churn(gateway, sockets, args.churn, stop, rng))]
+    if mode == "live":
+        background.append(asyncio.create_task(gateway.manager.run_pings()))
+    await asyncio.sleep(args.warmup)   # let churn reach steady state
+
+    times, failed, no_match = [], 0, 0
+
+    async def incident(payload):
+        nonlocal failed, no_match
+        start = time.perf_counter()
+        result = await gateway.dispatch_mission(payload)
+        if result["status"] == "Dispatched":
+            times.append((time.perf_counter() - start) * 1000)
+        elif "market criteria" in result["status"]:
+            no_match += 1
+        else:
+            failed += 1
+
+    incidents = fleet_sim.make_incidents(int(args.rate * args.seconds), seed=31)
+    tasks = []
+    for i in incidents:
+        payload = gateway.WebhookPayload(lat=i["lat"], lon=i["lon"], required_gear=i["required_gear"], bounty="$60.00")
+        tasks.append(asyncio.create_task(incident(payload)))
+        await asyncio.sleep(1 / args.rate)
+    await asyncio.gather(*tasks)
+
+    stop.set()
+    for task in background:
+        task.cancel()
+    return times, failed, no_match
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time-to-dispatch under WebSocket churn: legacy vs. liveness + fallback")
+    parser.add_argument("--agents", type=int, default=2000)
+    parser.add_argument("--rate", type=float, default=20.0, help="Incidents per second")
+    parser.add_argument("--seconds", type=float, default=15.0)
+    parser.add_argument("--churn", type=float, default=0.1, help="Share of live sockets dying per second")
+    parser.add_argument("--slow-share", type=float, default=0.05, help="Agents that ack slower than the timeout")
+    parser.add_argument("--ping-interval", type=float, default=0.5)
+    parser.add_argument("--liveness-timeout", type=float, default=1.2)
+    parser.add_argument("--ack-timeout", type=float, default=0.3)
+    parser.add_argument("--candidates", type=int, default=3)
+    parser.add_argument("--warmup", type=float, default=3.0)
+    args = parser.parse_args()
+
+    fleet = fleet_sim.make_fleet(args.agents)
+    print(f"{args.agents} agents, {args.rate:.0f} incidents/s for {args.seconds:.0f}s, "
+          f"{args.churn:.0%}/s socket churn, ack timeout {args.ack_timeout * 1000:.0f}ms")
+    print(f"{'MODE':>7} | {'DISPATCHED':>10} | {'NO ACK':>7} | {'SUCCESS':>7} | {'p50 ms':>8} | {'p90 ms':>8} | {'p99 ms':>8}")
+    print("-" * 73)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        gateway = fleet_sim.import_gateway(tmp)
+        try:
+            for mode in ("legacy", "live"):
+                times, failed, no_match = asyncio.run(run_mode(gateway, mode, fleet, args))
+                q = statistics.quantiles(times, n=100, method="inclusive")
+                success = len(times) / (len(times) + failed)
+                print(f"{mode:>7} | {len(times):>10} | {failed:>7} | {success:>7.1%} | "
+                      f"{statistics.median(times):>8.1f} | {q[89]:>8.1f} | {q[98]:>8.1f}")
+        finally:
+            gateway.repo.shutdown()
+    print("Percentiles cover dispatched incidents, webhook to winning ACK. NO ACK = auction wasted, AV still stranded.")
+
+
+if __name__ == "__main__":
+    main()
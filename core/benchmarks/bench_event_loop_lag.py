@@ -0,0 +1,99 @@
+import os
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+import statistics
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import fleet_sim  # noqa: F401  (puts pan_gateway on sys.path)
+import repository
+from models import Base, Wallet
+from repository import Repository
+
+# PAN GATEWAY - EVENT LOOP LAG UNDER DB LOAD
+# A WebSocket-style probe wakes every few ms and records how late it was
+# serviced, while wallet/mission traffic hammers SQLite either inline on the
+# loop (the old handlers) or through the threadpool Repository.
+# ----------------------------------------------------
+
+
+def seed(path: str, agents: int):
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False, "timeout": 30})
+    Base.metadata.create_all(bind=engine)
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    with SessionLocal() as db:
+        db.add_all(Wallet(agent_id=f"AGENT-{i:07d}", balance=1000.0) for i in range(agents))
+        db.commit()
+    return SessionLocal
+
+
+async def probe(stop: asyncio.Event, interval: float, lags: list):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append((time.perf_counter() - start - interval) * 1000)
+
+
+async def db_client(SessionLocal, repo, agents: int, ops: int, offload: bool, rng: random.Random):
+    for _ in range(ops):
+        agent_id = f"AGENT-{rng.randrange(agents):07d}"
+        fn, args = rng.choice([
+            (repository.wallet_view, (agent_id,)),
+            (repository.complete_mission, (agent_id, 12.5)),
+            (repository.withdraw, (agent_id, 5.0)),
+        ])
+        if offload:
+            await repo.run(fn, *args)
+        else:
+            with SessionLocal() as db:
+                fn(db, *args)
+            await asyncio.sleep(0)
+
+
+async def run(path: str, offload: bool, args):
+    SessionLocal = seed(path, args.agents)
+    repo = Repository(SessionLocal)
+    rng = random.Random(11)
+
+    stop = asyncio.Event()
+    lags = []
+    prober = asyncio.create_task(probe(stop, args.probe_ms / 1000, lags))
+    await asyncio.sleep(0.2)
+    idle = len(lags)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(db_client(SessionLocal, repo, args.agents, args.ops, offload, rng) for _ in range(args.clients)))
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    await prober
+    repo.shutdown()
+    return elapsed, lags[idle:]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure event loop lag while DB traffic runs")
+    parser.add_argument("--agents", type=int, default=500)
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--ops", type=int, default=50, help="DB operations per client")
+    parser.add_argument("--probe-ms", type=float, default=5.0)
+    args = parser.parse_args()
+
+    total = args.clients * args.ops
+    print(f"{total} DB ops from {args.clients} concurrent clients | probe every {args.probe_ms}ms")
+    print(f"{'MODE':>10} | {'OPS/s':>8} | {'LAG p50 ms':>10} | {'LAG p99 ms':>10} | {'LAG max ms':>10}")
+    print("-" * 62)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for label, offload in (("inline", False), ("threadpool", True)):
+            elapsed, lags = asyncio.run(run(os.path.join(tmp, f"{label}.db"), offload, args))
+            p99 = statistics.quantiles(lags, n=100, method='inclusive')[98] if len(lags) > 1 else lags[0]
+            print(f"{label:>10} | {total / elapsed:>8.0f} | {statistics.median(lags):>10.2f} | {p99:>10.2f} | {max(lags):>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
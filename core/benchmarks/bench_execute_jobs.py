@@ -0,0 +1,112 @@
+import os
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+import statistics
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.abspath(os.path.join(BENCH_DIR, '..')))
+
+from backend.core.async_bridge import BRIDGE
+from backend.core.job_queue import JobQueue, FINISHED
+from backend.core.shared_state import SQLiteStateStore
+
+# PAID TOOL EXECUTION - BLOCKING HANDLER vs. JOB QUEUE
+# N paid executions arrive at once; each tool call is I/O-bound and takes
+# --duration seconds (a stand-in for an image render or Runway poll loop).
+#   blocking : the old /api/v1/execute, one Flask thread held per execution for
+#              the whole tool call (--threads request threads available)
+#   queue    : JobQueue.submit() returns a job ID at once; the call runs as an
+#              asyncio slot on the bridge loop (--workers slots), its state
+#              written through to a SQLite job store in a temp dir
+# Reports how long the handler holds its thread, when the last result lands, and
+# how many OS threads the process peaked at.
+# ----------------------------------------------------
+
+
+class ThreadPeak:
+    def __init__(self):
+        self.peak = threading.active_count()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._watch, daemon=True)
+
+    def _watch(self):
+        while not self._stop.wait(0.01):
+            self.peak = max(self.peak, threading.active_count())
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def report(label, samples, elapsed, peak):
+    p99 = statistics.quantiles(samples, n=100, method="inclusive")[98]
+    print(f"{label:>9} | {len(samples):>5} | {statistics.median(samples):>11.1f} | {p99:>11.1f} | {elapsed:>9.2f} | {peak:>12}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent paid executions: blocking Flask handler vs. async job queue")
+    parser.add_argument("--executions", type=int, default=500)
+    parser.add_argument("--duration", type=float, default=2.0, help="Seconds each tool call takes")
+    parser.add_argument("--threads", type=int, default=64, help="Request threads for the blocking handler")
+    parser.add_argument("--workers", type=int, default=500, help="Concurrent job slots for the queue")
+    args = parser.parse_args()
+
+    async def tool(request=None, progress=None):
+        for step in range(4):
+            await asyncio.sleep(args.duration / 4)
+            if progress:
+                await progress(step + 1, 4)
+        return {"type": "text", "content": "ok"}
+
+    BRIDGE.loop  # start the loop outside the timed sections
+
+    print(f"{args.executions} executions of {args.duration:.1f}s each")
+    print(f"{'MODE':>9} | {'JOBS':>5} | {'HOLD p50 ms':>11} | {'HOLD p99 ms':>11} | {'LAST DONE':>9} | {'PEAK THREADS':>12}")
+    print("-" * 73)
+
+    def blocking(i):
+        start = time.perf_counter()
+        BRIDGE.run(tool())
+        return (time.perf_counter() - start) * 1000
+
+    with ThreadPeak() as peak:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(args.threads) as pool:
+            samples = list(pool.map(blocking, range(args.executions)))
+        elapsed = time.perf_counter() - start
+    report("blocking", samples, elapsed, peak.peak)
+
+    workdir = tempfile.TemporaryDirectory()
+    queue = JobQueue(workers=args.workers, store=SQLiteStateStore(os.path.join(workdir.name, "jobs.sqlite")))
+
+    def submit(i):
+        start = time.perf_counter()
+        job = queue.submit(f"invoice-{i}", "bench_tool", {"n": i}, tool)
+        return job, (time.perf_counter() - start) * 1000
+
+    with ThreadPeak() as peak:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(args.threads) as pool:
+            jobs, samples = zip(*pool.map(submit, range(args.executions)))
+        for job in jobs:
+            state = job
+            while state['status'] not in FINISHED:
+                state = queue.wait(job['job_id'], state['version'])
+            assert state['status'] == "done" and state['progress']['done'] == 4, state
+        elapsed = time.perf_counter() - start
+    report("queue", list(samples), elapsed, peak.peak)
+    print(f"queue stats: {queue.stats()}")
+    workdir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
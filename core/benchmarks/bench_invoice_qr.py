@@ -0,0 +1,81 @@
+import time
+import logging
+import argparse
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+
+from fake_lnd import FakeLND
+from backend.core.qr_render import render_png, render_svg
+from backend.core.lightning_engine import LightningEngine
+
+# LIGHTNING - INVOICE QR BENCHMARK
+# Invoice creation latency as seen by a paid endpoint, against the local LND stand-in:
+#   inline  : QR PNG rendered + base64'd inside create_invoice (the old behaviour)
+#   prefetch: invoice returned right after AddInvoice, PNG pre-rendered on the QR pool
+#   lazy    : invoice returned right after AddInvoice, PNG rendered by the first fetch (the default)
+# Then how long the follow-up image fetch waits, and raw PNG vs. SVG render cost.
+# ----------------------------------------------------
+
+
+def summarize(samples: list) -> tuple[float, float]:
+    return statistics.median(samples), statistics.quantiles(samples, n=100, method="inclusive")[98]
+
+
+def create_many(engine, n: int, concurrency: int) -> tuple[list, list]:
+    def one(i):
+        start = time.perf_counter()
+        invoice = engine.create_invoice(100 + i, f"qr bench {i}")
+        return (time.perf_counter() - start) * 1000, invoice
+
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = list(pool.map(one, range(n)))
+    return [r[0] for r in results], [r[1] for r in results]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Invoice creation latency with inline vs. off-request-path QR rendering")
+    parser.add_argument("--invoices", type=int, default=300)
+    parser.add_argument("--concurrency", default="1,16")
+    parser.add_argument("--latency", type=float, default=0.002, help="Simulated LND RPC latency (s)")
+    args = parser.parse_args()
+    logging.getLogger("LND-gRPC").setLevel(logging.WARNING)
+
+    with FakeLND(latency=args.latency) as fake:
+        print(f"{args.invoices} invoices, {args.latency * 1000:.0f}ms AddInvoice latency")
+        print(f"{'MODE':>8} | {'IN FLIGHT':>9} | {'create p50':>10} | {'create p99':>10} | {'image wait p50':>14} | {'image wait p99':>14}")
+        print("-" * 81)
+        for concurrency in [int(c) for c in args.concurrency.split(",")]:
+            for mode in ("inline", "prefetch", "lazy"):
+                engine = LightningEngine(subscribe=False)
+                engine.inline_qr = mode == "inline"
+                engine.qr_prefetch = mode == "prefetch"
+                assert engine.connect(target=fake.node)
+                created, invoices = create_many(engine, args.invoices, concurrency)
+                assert all(invoices)
+                if mode == "inline":
+                    assert all(i['qr_code'].startswith("data:image/png;base64,") for i in invoices)
+                    waits = [0.0]
+                else:
+                    # The browser fetches qr_url a moment after the JSON arrives.
+                    time.sleep(0.05)
+                    waits = []
+                    for invoice in invoices:
+                        start = time.perf_counter()
+                        engine.qr.render(invoice['payment_request'])
+                        waits.append((time.perf_counter() - start) * 1000)
+                c50, c99 = summarize(created)
+                w50, w99 = summarize(waits) if len(waits) > 1 else (0.0, 0.0)
+                print(f"{mode:>8} | {concurrency:>9} | {c50:>10.2f} | {c99:>10.2f} | {w50:>14.2f} | {w99:>14.2f}")
+
+    payment_request = invoices[0]['payment_request']
+    for label, fn in (("PNG", render_png), ("SVG", render_svg)):
+        samples = []
+        for i in range(30):
+            start = time.perf_counter()
+            fn(payment_request + str(i))
+            samples.append((time.perf_counter() - start) * 1000)
+        print(f"{label} render (cold): p50 {statistics.median(samples):.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+import time
+import random
+import logging
+import argparse
+import statistics
+import threading
+
+from fake_lnd import FakeLND
+from backend.core.lightning_engine import LightningEngine
+
+# LIGHTNING - INVOICE SETTLEMENT BENCHMARK
+# 1k clients each hold a pending invoice and poll its status (as the paywall
+# pages and /api/v1/execute do) while a payer settles them in random order.
+#   polling     : every check_status is a LookupInvoice round-trip
+#   subscription: a SubscribeInvoices stream keeps states in memory
+# Runs against the local LND stand-in with simulated RPC latency.
+# ----------------------------------------------------
+
+
+def percentile(samples: list, p: int) -> float:
+    return statistics.quantiles(samples, n=100, method="inclusive")[p - 1]
+
+
+def run_mode(fake: FakeLND, subscribe: bool, args) -> dict:
+    engine = LightningEngine(subscribe=subscribe, cache_size=args.invoices * 2)
+    assert engine.connect(target=fake.node)
+    if subscribe:
+        assert engine._stream_live.wait(5), "invoice stream never came up"
+
+    invoices = [engine.create_invoice(args.sats, f"bench {i}") for i in range(args.invoices)]
+    rpc_before = dict(fake.servicer.calls)
+    settled_at = {}
+    polls, detections = [], []
+    lock = threading.Lock()
+    start = threading.Barrier(args.invoices + 2)
+
+    def client(invoice):
+        local = []
+        start.wait()
+        while True:
+            t0 = time.perf_counter()
+            state = engine.check_status(invoice['r_hash'])
+            local.append((time.perf_counter() - t0) * 1000)
+            if state == "SETTLED":
+                seen = time.perf_counter()
+                break
+            time.sleep(args.poll_interval)
+        with lock:
+            polls.extend(local)
+            detections.append((seen - settled_at[invoice['r_hash']]) * 1000)
+
+    def payer():
+        rng = random.Random(11)
+        order = rng.sample(invoices, len(invoices))
+        start.wait()
+        for invoice in order:
+            time.sleep(args.settle_seconds / len(order))
+            settled_at[invoice['r_hash']] = time.perf_counter()
+            fake.servicer.settle(bytes.fromhex(invoice['r_hash']))
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in invoices] + [threading.Thread(target=payer)]
+    for t in threads:
+        t.start()
+    start.wait()
+    wall = time.perf_counter()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - wall
+
+    lookups = fake.servicer.calls.get("LookupInvoice", 0) - rpc_before.get("LookupInvoice", 0)
+    assert all(engine.verify_payment(i['r_hash']) for i in invoices)
+    return {"polls": len(polls), "lookups": lookups, "rpc_rate": lookups / wall,
+            "poll_p50": statistics.median(polls), "poll_p99": percentile(polls, 99),
+            "detect_p50": statistics.median(detections), "detect_p99": percentile(detections, 99)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Invoice status polling: LookupInvoice per poll vs. SubscribeInvoices cache")
+    parser.add_argument("--invoices", type=int, default=1000, help="Concurrent pending invoices, one polling client each")
+    parser.add_argument("--poll-interval", type=float, default=0.25)
+    parser.add_argument("--settle-seconds", type=float, default=5.0, help="Time over which all invoices get paid")
+    parser.add_argument("--latency", type=float, default=0.002, help="Simulated LND RPC latency (s)")
+    parser.add_argument("--sats", type=int, default=500)
+    args = parser.parse_args()
+    logging.getLogger("LND-gRPC").setLevel(logging.CRITICAL)   # per-invoice INFO lines, and the stream drop at shutdown
+
+    print(f"{args.invoices} pending invoices polled every {args.poll_interval * 1000:.0f}ms, "
+          f"paid over {args.settle_seconds:.0f}s, {args.latency * 1000:.1f}ms RPC latency")
+    print(f"{'MODE':>12} | {'POLLS':>7} | {'LOOKUPS':>7} | {'RPC/s':>7} | {'poll p50':>8} | {'poll p99':>8} | {'seen p50':>8} | {'seen p99':>8}")
+    print("-" * 87)
+    for mode in ("polling", "subscription"):
+        with FakeLND(latency=args.latency, jitter=args.latency / 2) as fake:
+            r = run_mode(fake, mode == "subscription", args)
+        print(f"{mode:>12} | {r['polls']:>7} | {r['lookups']:>7} | {r['rpc_rate']:>7.0f} | {r['poll_p50']:>8.2f} | "
+              f"{r['poll_p99']:>8.2f} | {r['detect_p50']:>8.1f} | {r['detect_p99']:>8.1f}")
+    print("poll = one check_status call (ms); seen = settle to the client observing SETTLED (ms).")
+
+
+if __name__ == "__main__":
+    main()
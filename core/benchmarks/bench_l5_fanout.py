@@ -0,0 +1,122 @@
+import os
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.abspath(os.path.join(BENCH_DIR, '..')))
+
+from fake_lnd import FakeLND
+
+# MCP SERVER - LAYER 5 SPECIALIST FAN-OUT
+# Times deep_market_analysis end to end (paid through fake_lnd) with the Gemini
+# client and DuckDuckGo search swapped for stubs of fixed latency, so the number
+# is pure orchestration: --points data points, each one search + one LLM call,
+# then Alice's summary call. L5_CONCURRENCY=1 is the old one-at-a-time loop.
+# A final run makes one data point hang past L5_TIMEOUT to show the partial
+# report. Also times building a ChatGoogleGenerativeAI client, which the old
+# code did for every specialist and again for Alice.
+# ----------------------------------------------------
+
+
+class StubReply:
+    def __init__(self, content):
+        self.content = content
+
+
+class StubLLM:
+    def __init__(self, latency):
+        self.latency = latency
+        self.calls = 0
+
+    async def ainvoke(self, prompt):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        return StubReply(f"analysis of {len(prompt)} prompt chars")
+
+
+class StubSearch:
+    def __init__(self, latency, hang=None):
+        self.latency = latency
+        self.hang = hang
+
+    async def ainvoke(self, query):
+        await asyncio.sleep(self.hang if "HANG" in query and self.hang else self.latency)
+        return f"results for {query}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="deep_market_analysis latency: sequential vs. bounded concurrent specialists")
+    parser.add_argument("--points", type=int, default=8, help="Data points per analysis")
+    parser.add_argument("--llm-latency", type=float, default=1.0)
+    parser.add_argument("--search-latency", type=float, default=0.4)
+    parser.add_argument("--concurrency", default="1,2,4,8")
+    args = parser.parse_args()
+
+    os.environ.setdefault("GOOGLE_API_KEY", "bench-key")
+    os.chdir(tempfile.gettempdir())
+    with FakeLND() as fake:
+        import mcp_server
+        from langchain_google_genai import ChatGoogleGenerativeAI
+        assert mcp_server.lnd.connect(target=fake.node)
+        mcp_server.LND_CONNECTED = True
+        mcp_server.TOOL_CACHE.ttls.pop("deep_market_analysis")    # measure the work, not the cache
+
+        start = time.perf_counter()
+        for _ in range(3):
+            ChatGoogleGenerativeAI(model="gemini-2.5-flash", temperature=0.2, api_key="bench-key")
+        build_ms = (time.perf_counter() - start) / 3 * 1000
+        print(f"ChatGoogleGenerativeAI construction: {build_ms:.0f} ms each (old code: {args.points + 1} per analysis, "
+              f"{build_ms * (args.points + 1):.0f} ms blocking the loop; now one per loop)\n")
+
+        def paid_hash():
+            invoice = mcp_server.lnd.create_invoice(75, "L5 bench")
+            assert fake.servicer.settle(bytes.fromhex(invoice["r_hash"]))
+            while not mcp_server.lnd.verify_payment(invoice["r_hash"]):   # wait for the settle to arrive on the invoice stream
+                time.sleep(0.005)
+            return invoice["r_hash"]
+
+        points = [f"data point {i}" for i in range(args.points)]
+        ideal = args.search_latency + args.llm_latency
+        print(f"{args.points} data points, search {args.search_latency}s + LLM {args.llm_latency}s each, plus one summary call")
+        print(f"{'CONCURRENCY':>11} | {'SECONDS':>7} | {'LLM CALLS':>9} | {'vs. sequential':>14}")
+        print("-" * 52)
+        baseline = None
+        for concurrency in [int(c) for c in args.concurrency.split(",")]:
+            llm = StubLLM(args.llm_latency)
+            mcp_server.get_llm = lambda temperature: llm
+            mcp_server.get_search = lambda: StubSearch(args.search_latency)
+            mcp_server.L5_CONCURRENCY = concurrency
+            payment_hash = paid_hash()
+            start = time.perf_counter()
+            report = asyncio.run(mcp_server.deep_market_analysis("bench topic", "summarize", points, specialist_name="Bob", payment_hash=payment_hash))
+            elapsed = time.perf_counter() - start
+            assert report.startswith("analysis of"), report
+            baseline = baseline or elapsed
+            print(f"{concurrency:>11} | {elapsed:>7.2f} | {llm.calls:>9} | {baseline / elapsed:>13.1f}x")
+        print(f"(floor with unlimited concurrency: {ideal + args.llm_latency:.2f}s)")
+
+        mcp_server.L5_TIMEOUT = ideal * 2
+        mcp_server.get_search = lambda: StubSearch(args.search_latency, hang=ideal * 10)
+        captured = []
+        real_run = mcp_server.run_specialists
+
+        async def run_and_capture(*a, **kw):
+            results, failures = await real_run(*a, **kw)
+            captured.append(failures)
+            return results, failures
+
+        mcp_server.run_specialists = run_and_capture
+        start = time.perf_counter()
+        report = asyncio.run(mcp_server.deep_market_analysis("bench topic", "summarize", points[:-1] + ["HANG forever"],
+                                                             specialist_name="Bob", payment_hash=paid_hash()))
+        elapsed = time.perf_counter() - start
+        missing = [f for f in captured[0] if f]
+        assert report.startswith("analysis of") and missing == [f"timed out after {mcp_server.L5_TIMEOUT:.0f}s"], (report, captured)
+        print(f"\none data point hanging: report in {elapsed:.2f}s with {len(points) - 1}/{len(points)} specialists ({missing[0]})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+import time
+import asyncio
+import logging
+import argparse
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+
+import grpc
+
+from fake_lnd import FakeLND, ln, lnrpc
+from backend.core.lnd_channel import CHANNELS, LNDChannelPool, load_credentials
+from backend.core.lightning_engine import LightningEngine
+
+# LIGHTNING - PAYMENT THROUGHPUT BENCHMARK
+# Decode + pay a batch of invoices against the local LND stand-in over TLS:
+#   per-call : the old get_bob_stub(), fresh credentials + channel (+ handshake) per payment
+#   pooled   : shared keep-alive channels, blocking stubs on a thread pool
+#   aio      : shared grpc.aio channels, every payment in flight on one event loop
+# Also times invoice creation, blocking vs. LightningEngine.create_invoice_async.
+# ----------------------------------------------------
+
+
+def pay(stub, invoice: str) -> float:
+    start = time.perf_counter()
+    decoded = stub.DecodePayReq(ln.PayReqString(pay_req=invoice))
+    response = stub.SendPaymentSync(ln.SendRequest(payment_request=invoice))
+    assert not response.payment_error and decoded.num_satoshis > 0, response.payment_error
+    return (time.perf_counter() - start) * 1000
+
+
+async def pay_async(stub, invoice: str) -> float:
+    start = time.perf_counter()
+    decoded = await stub.DecodePayReq(ln.PayReqString(pay_req=invoice))
+    response = await stub.SendPaymentSync(ln.SendRequest(payment_request=invoice))
+    assert not response.payment_error and decoded.num_satoshis > 0, response.payment_error
+    return (time.perf_counter() - start) * 1000
+
+
+def per_call(node, invoices: list, concurrency: int) -> list:
+    target, cert, macaroon = node
+
+    def one(invoice):
+        channel = grpc.secure_channel(target, load_credentials(cert, macaroon))
+        try:
+            return pay(lnrpc.LightningStub(channel), invoice)
+        finally:
+            channel.close()
+
+    with ThreadPoolExecutor(concurrency) as pool:
+        return list(pool.map(one, invoices))
+
+
+def pooled(node, invoices: list, concurrency: int) -> list:
+    channels = LNDChannelPool()
+    with ThreadPoolExecutor(concurrency) as pool:
+        return list(pool.map(lambda invoice: pay(lnrpc.LightningStub(channels.channel(*node)), invoice), invoices))
+
+
+async def aio(node, invoices: list, concurrency: int) -> list:
+    channels = LNDChannelPool()
+    gate = asyncio.Semaphore(concurrency)
+
+    async def one(invoice):
+        async with gate:
+            return await pay_async(lnrpc.LightningStub(channels.aio_channel(*node)), invoice)
+
+    try:
+        return await asyncio.gather(*(one(i) for i in invoices))
+    finally:
+        await channels.close_loop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Payments per second: per-call channels vs. pooled keep-alive channels vs. grpc.aio")
+    parser.add_argument("--payments", type=int, default=2000)
+    parser.add_argument("--concurrency", default="1,16,64", help="Comma-separated payments in flight")
+    parser.add_argument("--latency", type=float, default=0.005, help="Simulated LND RPC latency (s)")
+    args = parser.parse_args()
+    logging.getLogger("LND-gRPC").setLevel(logging.WARNING)
+
+    with FakeLND(latency=args.latency, jitter=args.latency / 5, workers=128, tls=True) as fake:
+        print(f"{args.payments} payments against a TLS stand-in with {args.latency * 1000:.0f}ms per RPC")
+        print(f"{'MODE':>9} | {'IN FLIGHT':>9} | {'PAYMENTS/s':>10} | {'p50 ms':>8} | {'p99 ms':>8}")
+        print("-" * 56)
+        for concurrency in [int(c) for c in args.concurrency.split(",")]:
+            for mode in ("per-call", "pooled", "aio"):
+                invoices = [fake.servicer.AddInvoice(ln.Invoice(value=100 + i % 50, memo="bench"), None).payment_request
+                            for i in range(args.payments)]
+                start = time.perf_counter()
+                if mode == "per-call":
+                    samples = per_call(fake.node, invoices, concurrency)
+                elif mode == "pooled":
+                    samples = pooled(fake.node, invoices, concurrency)
+                else:
+                    samples = asyncio.run(aio(fake.node, invoices, concurrency))
+                elapsed = time.perf_counter() - start
+                p99 = statistics.quantiles(samples, n=100, method="inclusive")[98]
+                print(f"{mode:>9} | {concurrency:>9} | {len(samples) / elapsed:>10.0f} | {statistics.median(samples):>8.1f} | {p99:>8.1f}")
+
+        # Invoice side: LightningEngine on the shared pool, blocking vs. async creation.
+        engine = LightningEngine(subscribe=False)
+        assert engine.connect(target=fake.node)
+        n = args.payments // 4
+        start = time.perf_counter()
+        for i in range(n):
+            engine.create_invoice(100, f"sync {i}")
+        sync_rate = n / (time.perf_counter() - start)
+
+        async def create_all():
+            try:
+                return await asyncio.gather(*(engine.create_invoice_async(100, f"async {i}") for i in range(n)))
+            finally:
+                await CHANNELS.close_loop()
+
+        start = time.perf_counter()
+        created = asyncio.run(create_all())
+        async_rate = n / (time.perf_counter() - start)
+        assert all(created)
+        print(f"\nLightningEngine invoices/s: create_invoice {sync_rate:.0f}, create_invoice_async {async_rate:.0f}")
+
+
+if __name__ == "__main__":
+    main()
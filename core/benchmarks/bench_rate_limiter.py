@@ -0,0 +1,141 @@
+import os
+import sys
+import time
+import random
+import argparse
+import threading
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.abspath(os.path.join(BENCH_DIR, '..')))
+
+from backend.core.rate_limiter import SlidingWindowLimiter
+
+# FLASK APP - RATE LIMITER BENCHMARK
+#   legacy : per-IP timestamp list, filtered under one global lock on every request
+#   counter: two-bucket sliding window counter over sharded locks
+# Part 1 replays traffic from 100k distinct IPs on one thread (pure per-check cost).
+# Part 2 hammers the limiter from many threads (lock contention), then checks that
+# a single hot IP hit from every thread at once is still held to its quota.
+# ----------------------------------------------------
+
+
+class LegacyLimiter:
+    """The original app.py limiter, minus the Flask plumbing."""
+
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        self.data = {}
+        self.lock = threading.Lock()
+
+    def hit(self, key, max_requests, window_seconds):
+        now = self.clock()
+        with self.lock:
+            if key not in self.data:
+                self.data[key] = []
+            self.data[key] = [t for t in self.data[key] if now - t < window_seconds]
+            if len(self.data[key]) >= max_requests:
+                return False
+            self.data[key].append(now)
+            return True
+
+    def evict_idle(self):
+        now = self.clock()
+        with self.lock:
+            expired = [ip for ip, timestamps in self.data.items() if not [t for t in timestamps if now - t < 3600]]
+            for ip in expired:
+                del self.data[ip]
+
+
+def make_traffic(ips: int, requests: int, seed: int = 3) -> list[str]:
+    """Heavy-tailed: a few hot IPs (scrapers, NATs) and a long tail seen a handful of times."""
+    rng = random.Random(seed)
+    pool = [f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}" for i in range(ips)]
+    return [pool[min(int(rng.paretovariate(1.1)) - 1, ips - 1) if rng.random() < 0.5 else rng.randrange(ips)] for _ in range(requests)]
+
+
+def single_thread(limiter, traffic: list, limit: int) -> tuple[float, int]:
+    allowed = 0
+    start = time.perf_counter()
+    for ip in traffic:
+        allowed += limiter.hit(ip, limit, 60)
+    return (time.perf_counter() - start) / len(traffic) * 1e9, allowed
+
+
+def contended(limiter, traffic: list, limit: int, threads: int) -> float:
+    per_thread = len(traffic) // threads
+    barrier = threading.Barrier(threads + 1)
+
+    def worker(chunk):
+        barrier.wait()
+        for ip in chunk:
+            limiter.hit(ip, limit, 60)
+
+    workers = [threading.Thread(target=worker, args=(traffic[i * per_thread:(i + 1) * per_thread],)) for i in range(threads)]
+    for w in workers:
+        w.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for w in workers:
+        w.join()
+    return per_thread * threads / (time.perf_counter() - start)
+
+
+def hot_key_quota(limiter, threads: int, limit: int) -> int:
+    admitted = [0] * threads
+    barrier = threading.Barrier(threads)
+
+    def worker(n):
+        barrier.wait()
+        for _ in range(limit):
+            admitted[n] += limiter.hit("203.0.113.7", limit, 60)
+
+    workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    return sum(admitted)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the sliding window counter limiter against the timestamp-list limiter")
+    parser.add_argument("--ips", type=int, default=100_000)
+    parser.add_argument("--requests", type=int, default=1_000_000)
+    parser.add_argument("--limits", default="10,1000", help="Comma-separated max requests per 60s window")
+    parser.add_argument("--threads", type=int, default=16)
+    args = parser.parse_args()
+
+    traffic = make_traffic(args.ips, args.requests)
+    print(f"{len(set(traffic))} distinct IPs, {len(traffic)} requests")
+    print(f"{'LIMIT':>6} | {'MODE':>7} | {'ns/check':>9} | {'ALLOWED':>8} | {f'{args.threads}-THREAD req/s':>18} | {'EVICT ms':>9}")
+    print("-" * 74)
+
+    for limit in [int(n) for n in args.limits.split(",")]:
+        results = {}
+        for mode, factory in (("legacy", LegacyLimiter), ("counter", SlidingWindowLimiter)):
+            # Frozen clock: the whole replay lands in one window, so admissions must match exactly.
+            limiter = factory(clock=lambda: 30.0)
+            ns, allowed = single_thread(limiter, traffic, limit)
+            throughput = contended(factory(), traffic, limit, args.threads)
+            start = time.perf_counter()
+            limiter.evict_idle()
+            evict_ms = (time.perf_counter() - start) * 1000
+            results[mode] = allowed
+            print(f"{limit:>6} | {mode:>7} | {ns:>9.0f} | {allowed:>8} | {throughput:>18.0f} | {evict_ms:>9.1f}")
+        assert results["legacy"] == results["counter"], f"Admission mismatch: {results}"
+
+        admitted = hot_key_quota(SlidingWindowLimiter(clock=lambda: 30.0), args.threads, limit)
+        assert admitted == limit, f"Hot IP admitted {admitted}/{limit} under contention"
+
+    # Idle keys disappear once both of their windows have passed.
+    clock = [0.0]
+    limiter = SlidingWindowLimiter(clock=lambda: clock[0])
+    for ip in traffic[:10_000]:
+        limiter.hit(ip, 10, 60)
+    clock[0] = 120.0
+    assert limiter.evict_idle() > 0 and len(limiter) == 0
+    print(f"✅ Admissions match, hot IP held to quota across {args.threads} threads, idle keys evicted.")
+
+
+if __name__ == "__main__":
+    main()
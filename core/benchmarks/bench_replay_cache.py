@@ -0,0 +1,125 @@
+import os
+import sys
+import time
+import argparse
+import threading
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.abspath(os.path.join(BENCH_DIR, '..')))
+
+from backend.core.replay_cache import ReplayCache
+
+# FLASK APP - REPLAY CACHE BENCHMARK
+#   legacy : dict of signature -> first seen, O(N) sweep under SIG_LOCK every 10s
+#   buckets: ring of per-timestamp-window sets, expiry drops whole buckets
+# Fills the cache with a steady 5-minute stream of signed requests, then
+# measures insert / lookup throughput and how long a lookup can stall while
+# the 10s heartbeat expires the oldest signatures.
+# ----------------------------------------------------
+
+TTL = 300
+
+
+class LegacyCache:
+    """The original USED_SIGNATURES dict + SIG_LOCK, behind the ReplayCache interface."""
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.data = {}
+        self.lock = threading.Lock()
+
+    def seen(self, signature, signed_at):
+        with self.lock:
+            return signature in self.data
+
+    def add(self, signature, signed_at):
+        with self.lock:
+            if signature in self.data:
+                return False
+            self.data[signature] = self.clock()
+            return True
+
+    def expire(self):
+        now = self.clock()
+        with self.lock:
+            expired_keys = [k for k, v in self.data.items() if now - v > TTL]
+            for k in expired_keys:
+                del self.data[k]
+        return len(expired_keys)
+
+    def __len__(self):
+        return len(self.data)
+
+
+def fill(cache, clock: list, live: int) -> tuple[list, float]:
+    """`live` signatures arriving evenly over one TTL, each stamped at its arrival time."""
+    signatures = [f"{i:064x}" for i in range(live)]
+    step = TTL / live
+    start = time.perf_counter()
+    for i, sig in enumerate(signatures):
+        clock[0] = i * step
+        cache.add(sig, clock[0])
+    return signatures, time.perf_counter() - start
+
+
+def worst_pause(cache, signatures: list, step: float) -> tuple[float, float, int]:
+    """Runs the heartbeat's expiry while a request thread keeps checking signatures; returns (sweep ms, worst lookup ms, released)."""
+    stop = threading.Event()
+    worst = [0.0]
+
+    def requests():
+        i = len(signatures) - 1
+        while not stop.is_set():
+            start = time.perf_counter()
+            cache.seen(signatures[i], i * step)
+            worst[0] = max(worst[0], time.perf_counter() - start)
+            i = i - 1 if i else len(signatures) - 1
+
+    reader = threading.Thread(target=requests)
+    reader.start()
+    time.sleep(0.05)
+    worst[0] = 0.0
+    start = time.perf_counter()
+    released = cache.expire()
+    sweep = time.perf_counter() - start
+    time.sleep(0.05)
+    stop.set()
+    reader.join()
+    return sweep * 1000, worst[0] * 1000, released
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the bucketed replay cache against the swept signature dict")
+    parser.add_argument("--live", type=int, default=1_000_000, help="Signatures live in the cache")
+    parser.add_argument("--lookups", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    print(f"{args.live} live signatures over a {TTL}s window")
+    print(f"{'MODE':>8} | {'INSERT/s':>10} | {'LOOKUP/s':>10} | {'SWEEP ms':>9} | {'WORST LOOKUP ms':>15} | {'RELEASED':>8}")
+    print("-" * 76)
+
+    for mode in ("legacy", "buckets"):
+        clock = [0.0]
+        cache = LegacyCache(lambda: clock[0]) if mode == "legacy" else ReplayCache(ttl=TTL, clock=lambda: clock[0])
+        signatures, fill_s = fill(cache, clock, args.live)
+        assert len(cache) == args.live
+        step = TTL / args.live
+
+        probe = [(signatures[(i * 7919) % args.live], ((i * 7919) % args.live) * step) for i in range(args.lookups)]
+        start = time.perf_counter()
+        hits = sum(cache.seen(sig, at) for sig, at in probe)
+        lookup_s = time.perf_counter() - start
+        assert hits == args.lookups
+
+        # Next heartbeat: 10s on, the oldest 10s of signatures have aged out.
+        clock[0] = TTL + 10
+        sweep_ms, worst_ms, released = worst_pause(cache, signatures, step)
+        assert not cache.add(signatures[-1], (args.live - 1) * step), "Replay accepted after sweep!"
+
+        print(f"{mode:>8} | {args.live / fill_s:>10.0f} | {args.lookups / lookup_s:>10.0f} | {sweep_ms:>9.2f} | "
+              f"{worst_ms:>15.2f} | {released:>8}")
+    print("WORST LOOKUP = slowest signature check observed on a request thread while the sweep ran.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+import os
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+import statistics
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.abspath(os.path.join(BENCH_DIR, '..')))
+
+from fake_lnd import FakeLND
+from fake_runway import FakeRunway, FAKE_RUNWAY_KEY
+
+# MCP SERVER - CONCURRENT RUNWAY VIDEO JOBS
+# Runs mcp_server's FastMCP app in-process (in-memory MCP transport, one event
+# loop, as under uvicorn) against fake_runway.py and fake_lnd.py, then:
+#   1. times a cheap tool (buy_vip_pass, 402 path) on an idle server
+#   2. starts --jobs paid generate_video calls at once and keeps timing the cheap
+#      tool while they render; every job must succeed and report progress
+#   3. cancels one render mid-flight and checks the Runway task was cancelled
+# With the old time.sleep(10) poll loop a single render held the event loop, so
+# the jobs ran one after another and the cheap tool waited behind them.
+# ----------------------------------------------------
+
+
+def summary(samples):
+    p99 = statistics.quantiles(samples, n=100, method="inclusive")[98]
+    return f"p50 {statistics.median(samples):6.1f} ms | p99 {p99:6.1f} ms | max {max(samples):6.1f} ms | n={len(samples)}"
+
+
+async def probe(session, samples, stop, interval):
+    while not stop.is_set():
+        start = time.perf_counter()
+        result = await session.call_tool("buy_vip_pass", {})
+        assert "402 Payment Required" in result.content[0].text, result
+        samples.append((time.perf_counter() - start) * 1000)
+        await asyncio.sleep(interval)
+
+
+async def run(args, mcp_server, hashes, runway):
+    from mcp.shared.memory import create_connected_server_and_client_session
+
+    async with create_connected_server_and_client_session(mcp_server.mcp) as session:
+        idle, loaded, stop = [], [], asyncio.Event()
+        prober = asyncio.create_task(probe(session, idle, stop, args.probe_interval))
+        await asyncio.sleep(1.0)
+        stop.set()
+        await prober
+        print(f"cheap tool, idle server  : {summary(idle)}")
+
+        progress = {"events": 0}
+
+        async def on_progress(done, total, message):
+            progress["events"] += 1
+
+        async def video(payment_hash):
+            result = await session.call_tool("generate_video", {"prompt": "a lighthouse in a storm", "payment_hash": payment_hash},
+                                             progress_callback=on_progress)
+            return result.content[0].text
+
+        stop = asyncio.Event()
+        prober = asyncio.create_task(probe(session, loaded, stop, args.probe_interval))
+        start = time.perf_counter()
+        results = await asyncio.gather(*(video(h) for h in hashes[:args.jobs]))
+        elapsed = time.perf_counter() - start
+        stop.set()
+        await prober
+        print(f"cheap tool, {args.jobs} renders : {summary(loaded)}")
+
+        granted = sum("ACCESS GRANTED" in r for r in results)
+        assert granted == args.jobs, [r for r in results if "ACCESS GRANTED" not in r][:3]
+        print(f"\n{granted}/{args.jobs} videos in {elapsed:.2f}s (each render {args.task_seconds:.1f}s), "
+              f"{progress['events']} progress notifications, {runway.stats['polls']} Runway polls "
+              f"({runway.stats['polls'] / args.jobs:.1f} per job)")
+
+    task = asyncio.create_task(mcp_server.generate_video("a cancelled storm", payment_hash=hashes[-1]))
+    while runway.stats["created"] <= args.jobs:
+        await asyncio.sleep(0.05)
+    await asyncio.sleep(args.task_seconds / 2)
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+    assert runway.stats["cancelled"] == 1, runway.stats
+    print("cancelled render: Runway task cancelled upstream")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent generate_video jobs against a local Runway stand-in")
+    parser.add_argument("--jobs", type=int, default=50)
+    parser.add_argument("--task-seconds", type=float, default=5.0, help="How long each fake Runway render takes")
+    parser.add_argument("--probe-interval", type=float, default=0.05)
+    args = parser.parse_args()
+
+    workdir = tempfile.TemporaryDirectory()
+    os.makedirs(os.path.join(workdir.name, "secrets"))
+    with open(os.path.join(workdir.name, "secrets", "runway.key"), "w") as f:
+        f.write(FAKE_RUNWAY_KEY)
+    os.chdir(workdir.name)
+
+    with FakeLND() as fake, FakeRunway(task_seconds=args.task_seconds, jitter=args.task_seconds / 5) as runway:
+        os.environ.update({"IMAGEN_API_URL": runway.imagen_url, "RUNWAY_API_URL": runway.runway_url,
+                           "RUNWAY_POLL_INITIAL": str(args.task_seconds / 10), "RUNWAY_POLL_MAX": str(args.task_seconds / 2),
+                           "MEDIA_DIR": os.path.join(workdir.name, "static")})
+        import mcp_server
+        assert mcp_server.lnd.connect(target=fake.node)
+        mcp_server.LND_CONNECTED = True
+
+        hashes = []
+        for i in range(args.jobs + 1):
+            invoice = mcp_server.lnd.create_invoice(500, f"Generate Video: bench {i}")
+            assert fake.servicer.settle(bytes.fromhex(invoice["r_hash"]))
+            hashes.append(invoice["r_hash"])
+
+        asyncio.run(run(args, mcp_server, hashes, runway))
+    os.chdir(BENCH_DIR)
+    workdir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+import os
+import sys
+import html
+import glob
+import time
+import random
+import argparse
+import tempfile
+import statistics
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.abspath(os.path.join(BENCH_DIR, '..')))
+
+from backend.core.doc_store import SandboxKnowledgeBase
+
+# MCP SERVER - SANDBOX PDF KNOWLEDGE BASE
+# Builds a sandbox of --files PDFs totalling --pages pages of synthetic market
+# notes (written with a tiny built-in PDF writer), each page carrying one unique
+# marker term. Then, per layer_5_specialist call, compares:
+#   legacy : PyPDFLoader.load_and_split() on every file, first 15k chars of each
+#   index  : SandboxKnowledgeBase.search() over the BM25 (SQLite FTS5) index
+# Reports per-call latency, PDF context size in the prompt, and how often the
+# page a query is about actually made it into the context. Also times the first
+# build, a refresh after `touch`, a re-parse after an edit, and a restart.
+# ----------------------------------------------------
+
+VOCABULARY = ("liquidity routing channel capacity fee market inbound outbound settlement merchant adoption "
+              "regulation custody volatility hedging exchange volume stablecoin remittance invoice node operator "
+              "rebalancing watchtower mempool congestion latency throughput pricing competitor margin").split()
+
+
+def pdf_escape(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def write_pdf(path, pages):
+    """Writes a minimal PDF, one Helvetica text page per list of lines."""
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for lines in pages:
+        stream = "BT /F1 9 Tf 36 806 Td 11 TL " + " ".join(f"({pdf_escape(line)}) '" for line in lines) + " ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Resources << /Font << /F1 3 0 R >> >> "
+                       f"/Contents {len(objects)} 0 R >>")
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+    out, offsets = bytearray(b"%PDF-1.4\n"), []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    with open(path, "wb") as f:
+        f.write(out)
+
+
+def make_page(rng, marker):
+    words = [rng.choice(VOCABULARY) for _ in range(420)]
+    words.insert(rng.randrange(len(words)), marker)
+    return [" ".join(words[i:i + 14]) for i in range(0, len(words), 14)]
+
+
+def legacy_context(sandbox_dir):
+    from langchain_community.document_loaders import PyPDFLoader
+    pdf_context = ""
+    for pdf_file in glob.glob(os.path.join(sandbox_dir, "*.pdf")):
+        pages = PyPDFLoader(pdf_file).load_and_split()
+        raw_text = ' '.join([p.page_content for p in pages])[:15000]
+        pdf_context += f"\n--- EXTRACTED FROM {os.path.basename(pdf_file)} ---\n{html.escape(raw_text)}\n"
+    return pdf_context
+
+
+def indexed_context(kb, query):
+    return "".join(f"\n--- EXTRACTED FROM {name} (page {page}) ---\n{html.escape(text)}\n" for name, page, text in kb.search(query))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sandbox PDF context: re-parse per call vs. persistent BM25 index")
+    parser.add_argument("--pages", type=int, default=500)
+    parser.add_argument("--files", type=int, default=5)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--legacy-calls", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=11)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    sandbox = tempfile.TemporaryDirectory()
+    per_file = args.pages // args.files
+    markers = []
+    for f in range(args.files):
+        pages = []
+        for p in range(per_file):
+            marker = f"zq{f}k{p}"
+            markers.append(marker)
+            pages.append(make_page(rng, marker))
+        write_pdf(os.path.join(sandbox.name, f"research_{f}.pdf"), pages)
+    print(f"sandbox: {args.files} PDFs, {args.files * per_file} pages, "
+          f"{sum(os.path.getsize(p) for p in glob.glob(os.path.join(sandbox.name, '*.pdf'))) / 1e6:.1f} MB\n")
+
+    queries = [(m, f"{' '.join(rng.sample(VOCABULARY, 3))} {m}") for m in rng.sample(markers, min(args.queries, len(markers)))]
+
+    legacy_ms, legacy_chars, legacy_hits = [], 0, 0
+    for marker, query in queries[:args.legacy_calls]:
+        start = time.perf_counter()
+        context = legacy_context(sandbox.name)
+        legacy_ms.append((time.perf_counter() - start) * 1000)
+        legacy_chars = len(context)
+        legacy_hits += marker in context
+
+    kb = SandboxKnowledgeBase(sandbox.name)
+    start = time.perf_counter()
+    kb.refresh()
+    build_s = time.perf_counter() - start
+
+    index_ms, index_chars, index_hits = [], [], 0
+    for marker, query in queries:
+        start = time.perf_counter()
+        context = indexed_context(kb, query)
+        index_ms.append((time.perf_counter() - start) * 1000)
+        index_chars.append(len(context))
+        index_hits += marker in context
+
+    print(f"{'MODE':>6} | {'CALLS':>5} | {'p50 ms':>8} | {'max ms':>8} | {'CONTEXT CHARS':>13} | {'TARGET PAGE IN CONTEXT':>22}")
+    print("-" * 78)
+    print(f"{'legacy':>6} | {len(legacy_ms):>5} | {statistics.median(legacy_ms):>8.1f} | {max(legacy_ms):>8.1f} | {legacy_chars:>13} | "
+          f"{legacy_hits:>13}/{len(legacy_ms)}")
+    print(f"{'index':>6} | {len(index_ms):>5} | {statistics.median(index_ms):>8.2f} | {max(index_ms):>8.2f} | "
+          f"{statistics.median(index_chars):>13.0f} | {index_hits:>13}/{len(queries)}")
+
+    target = os.path.join(sandbox.name, "research_0.pdf")
+    os.utime(target)
+    start = time.perf_counter()
+    kb.refresh()
+    touch_ms = (time.perf_counter() - start) * 1000
+    write_pdf(target, [make_page(rng, f"edited{p}") for p in range(per_file)])
+    start = time.perf_counter()
+    kb.refresh()
+    edit_ms = (time.perf_counter() - start) * 1000
+    assert indexed_context(kb, "edited7") and not indexed_context(kb, "zq0k7")
+    kb.close()
+    start = time.perf_counter()
+    reopened = SandboxKnowledgeBase(sandbox.name)
+    reparsed = reopened.refresh()
+    restart_ms = (time.perf_counter() - start) * 1000
+    reopened.close()
+
+    print(f"\nfirst build {build_s:.2f}s | touched file {touch_ms:.1f} ms (hash only) | edited file {edit_ms:.0f} ms (one re-parse) | "
+          f"restart {restart_ms:.1f} ms ({reparsed} re-parsed)")
+    sandbox.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.abspath(os.path.join(BENCH_DIR, '..')))
+
+from backend.core.result_cache import ResultCache, normalize_text
+
+# MCP SERVER - PAID TOOL RESULT CACHE REPLAY
+# Replays a synthetic day-part of paid tool traffic through ResultCache on a
+# simulated clock, with mcp_server's per-tool TTLs and key normalization:
+#   spot price : a few tickers, BTC/ETH dominant, 30s TTL
+#   web search : Zipf over a query catalogue, typed with random case/spacing
+#   analysis   : Zipf over research briefs
+# (generate_image is not cached: a render belongs to the payer who bought it.)
+# Arrivals are Poisson at --rate req/s. A miss "pays" the tool's upstream cost
+# (API or LLM seconds, from --costs); the report compares upstream seconds with
+# and without the cache, then reopens the SQLite file to check entries survive
+# a restart, and checks expire() clears them from disk once their TTLs pass.
+# ----------------------------------------------------
+
+TTLS = {"get_crypto_spot_price": 30, "live_web_search": 900, "deep_market_analysis": 3600}
+MIX = {"get_crypto_spot_price": 0.45, "live_web_search": 0.40, "deep_market_analysis": 0.15}
+CATALOGUE = {"get_crypto_spot_price": 25, "live_web_search": 3000, "deep_market_analysis": 300}
+
+
+class SimClock:
+    def __init__(self):
+        self.now = 1_700_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+def zipf_weights(n, s):
+    return [1 / (rank ** s) for rank in range(1, n + 1)]
+
+
+def typed(rng, text):
+    """The same query as a user might retype it: random case and stray spaces."""
+    words = [w.upper() if rng.random() < 0.1 else (w.capitalize() if rng.random() < 0.2 else w) for w in text.split()]
+    return (" " if rng.random() < 0.2 else "") + ("  " if rng.random() < 0.2 else " ").join(words)
+
+
+def make_request(rng, tool, item):
+    if tool == "get_crypto_spot_price":
+        return {"ticker": normalize_text(["btc", "eth", "sol", "ln", "xmr"][item % 5] + ("" if item < 5 else str(item))).upper()}
+    if tool == "live_web_search":
+        return {"search_query": normalize_text(typed(rng, f"lightning network news topic {item}"), casefold=True)}
+    return {"primary_topic": normalize_text(f"market brief {item}", casefold=True), "original_user_intent": "summarize",
+            "specific_data_points_required": ["pricing", "competitors"], "specialist_name": "EVE", "historical_context": ""}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a paid MCP tool query mix through the result cache")
+    parser.add_argument("--requests", type=int, default=100000)
+    parser.add_argument("--rate", type=float, default=5.0, help="Mean arrivals per simulated second")
+    parser.add_argument("--zipf", type=float, default=1.1)
+    parser.add_argument("--costs", default="0.15,0.9,40", help="Upstream seconds per miss: spot,search,analysis")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    costs = dict(zip(MIX, (float(c) for c in args.costs.split(","))))
+    rng = random.Random(args.seed)
+    weights = {tool: zipf_weights(n, args.zipf) for tool, n in CATALOGUE.items()}
+    workdir = tempfile.TemporaryDirectory()
+    db_path = os.path.join(workdir.name, "tool_cache.db")
+    clock = SimClock()
+    cache = ResultCache(TTLS, path=db_path, clock=clock)
+
+    served = {tool: 0 for tool in MIX}
+    upstream = {tool: 0.0 for tool in MIX}
+    recent = []
+    lookup_time = 0.0
+    for i in range(args.requests):
+        clock.now += rng.expovariate(args.rate)
+        tool = rng.choices(list(MIX), weights=list(MIX.values()))[0]
+        item = rng.choices(range(CATALOGUE[tool]), weights=weights[tool])[0]
+        request = make_request(rng, tool, item)
+        served[tool] += 1
+
+        start = time.perf_counter()
+        result = cache.get(tool, request)
+        lookup_time += time.perf_counter() - start
+        if result is None:
+            upstream[tool] += costs[tool]
+            result = f"{tool}:{item}:{i}"
+            cache.put(tool, request, result)
+        else:
+            assert result.startswith(f"{tool}:{item}:"), (tool, item, result)
+        if tool == "deep_market_analysis":
+            recent.append(request)
+
+    stats = cache.stats()
+    hours = (clock.now - 1_700_000_000.0) / 3600
+    print(f"{args.requests} requests over {hours:.1f} simulated hours, mean lookup {lookup_time / args.requests * 1e6:.1f} us, "
+          f"{stats['entries']} entries\n")
+    print(f"{'TOOL':>22} | {'REQUESTS':>8} | {'HIT %':>6} | {'UPSTREAM s (no cache)':>21} | {'UPSTREAM s (cache)':>18}")
+    print("-" * 88)
+    for tool in MIX:
+        counts = stats["tools"][tool]
+        hit_rate = counts["hits"] / max(counts["hits"] + counts["misses"], 1) * 100
+        print(f"{tool:>22} | {served[tool]:>8} | {hit_rate:>6.1f} | {served[tool] * costs[tool]:>21.0f} | {upstream[tool]:>18.0f}")
+    total_before = sum(served[t] * costs[t] for t in MIX)
+    print(f"\noverall hit rate {stats['hit_rate'] * 100:.1f}%, upstream time {total_before:.0f}s -> {sum(upstream.values()):.0f}s")
+
+    cache.close()
+    reopened = ResultCache(TTLS, path=db_path, clock=clock)
+    sample = recent[-200:]
+    hits = sum(reopened.get("deep_market_analysis", request) is not None for request in sample)
+    print(f"after restart: {len(reopened)} entries reloaded, {hits}/{len(sample)} recent analysis requests hit")
+    clock.now += max(TTLS.values())
+    released = reopened.expire()
+    rows = reopened._db.execute("SELECT COUNT(*) FROM tool_results").fetchone()[0]
+    print(f"after the longest TTL: expire() released {released} entries, {rows} rows left on disk")
+    assert len(reopened) == 0 and rows == 0
+    reopened.close()
+    workdir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
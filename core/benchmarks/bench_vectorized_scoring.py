@@ -0,0 +1,56 @@
+import time
+import argparse
+import statistics
+
+from fleet_sim import make_fleet, make_incidents, scan_winner
+from auction_engine import FleetArrays
+
+# PAN GATEWAY - VECTORIZED SCORING MICRO-BENCHMARK
+# Scalar haversine() loop vs. one NumPy pass over FleetArrays.
+# Both sides score the whole fleet so only the scoring kernel is measured.
+# ----------------------------------------------------
+
+
+def bench(fn, incidents):
+    samples = []
+    results = []
+    for incident in incidents:
+        start = time.perf_counter()
+        results.append(fn(incident))
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples), results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark scalar vs. vectorized auction scoring")
+    parser.add_argument("--sizes", default="1000,10000,100000")
+    parser.add_argument("--auctions", type=int, default=100)
+    args = parser.parse_args()
+
+    incidents = make_incidents(args.auctions)
+    print(f"{'AGENTS':>8} | {'SCALAR p50 ms':>14} | {'NUMPY p50 ms':>13} | {'SPEEDUP':>8}")
+    print("-" * 54)
+
+    for n in [int(s) for s in args.sizes.split(",")]:
+        fleet = make_fleet(n)
+        arrays = FleetArrays()
+        for a in fleet:
+            arrays.upsert(a["agent_id"], a["lat"], a["lon"], a["radius"], a["loadout"])
+
+        def scalar(i):
+            return scan_winner(fleet, i["lat"], i["lon"], i["required_gear"], i["max_budget"])
+
+        def vectorized(i):
+            return arrays.select_winner(i["lat"], i["lon"], i["required_gear"], i["max_budget"])
+
+        scalar_p50, scalar_results = bench(scalar, incidents)
+        numpy_p50, numpy_results = bench(vectorized, incidents)
+
+        mismatches = sum(1 for a, b in zip(scalar_results, numpy_results) if (a and a[0]) != (b and b[0]))
+        assert mismatches == 0, f"{mismatches} auctions picked a different winner!"
+
+        print(f"{n:>8} | {scalar_p50:>14.3f} | {numpy_p50:>13.3f} | {scalar_p50 / numpy_p50:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+import os
+import time
+import random
+import argparse
+import tempfile
+import statistics
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, desc, insert, text
+from sqlalchemy.orm import sessionmaker
+
+import fleet_sim  # noqa: F401  (puts pan_gateway on sys.path)
+import repository
+from models import Base, Agent, Wallet, Transaction
+
+# PAN GATEWAY - WALLET HISTORY BENCHMARK
+# One long-tenured agent with a huge ledger, surrounded by ordinary agents.
+# Compares the old full-history wallet load against the running-summary
+# header and keyset-paginated history pages at shallow and deep offsets.
+# ----------------------------------------------------
+
+HERO = "AGENT-0000000"
+
+
+def legacy_wallet_view(db, agent_id: str) -> dict:
+    """The pre-pagination wallet body: every transaction, every call."""
+    wallet = db.query(Wallet).filter(Wallet.agent_id == agent_id).first()
+    agent = db.query(Agent).filter(Agent.agent_id == agent_id).first()
+    transactions = db.query(Transaction).filter(Transaction.agent_id == agent_id).order_by(desc(Transaction.id)).all()
+    history = [{"id": t.id, "date": t.date, "amount": t.amount, "description": t.description} for t in transactions]
+    return {"balance": wallet.balance if wallet else 0.0, "linkedCard": agent.linked_card if agent else None, "history": history}
+
+
+def seed(path: str, hero_txns: int, other_agents: int, other_txns: int):
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    rng = random.Random(5)
+    start = datetime(2024, 1, 1)
+    owners = [(HERO, hero_txns)] + [(f"AGENT-{i:07d}", other_txns) for i in range(1, other_agents + 1)]
+    with engine.begin() as conn:
+        conn.execute(insert(Agent), [{"agent_id": a, "status": "OFFLINE"} for a, _ in owners])
+        conn.execute(insert(Wallet), [{"agent_id": a, "balance": 0.0, "transaction_count": n} for a, n in owners])
+        for agent_id, n in owners:
+            batch = []
+            for i in range(n):
+                at = start + timedelta(seconds=i * 30)
+                amount = rng.uniform(15.0, 60.0)
+                batch.append({"id": f"TXN-{agent_id[-7:]}-{i:08d}", "agent_id": agent_id, "date": at.strftime("%m/%d/%Y %H:%M"),
+                              "amount": f"+${amount:.2f}", "description": "L402 Escrow Release - On-Scene Repair", "timestamp": at})
+                if len(batch) == 50_000:
+                    conn.execute(insert(Transaction), batch)
+                    batch = []
+            if batch:
+                conn.execute(insert(Transaction), batch)
+    return engine, SessionLocal
+
+
+def timed(fn, repeats: int) -> list[float]:
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def report(label: str, samples: list[float], payload: int = None):
+    size = f"{payload:>10}" if payload is not None else f"{'':>10}"
+    print(f"{label:>26} | {statistics.median(samples):>10.2f} | {max(samples):>10.2f} | {size}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark wallet header + history pagination against the full-history load")
+    parser.add_argument("--transactions", type=int, default=1_000_000, help="Ledger size of the long-tenured agent")
+    parser.add_argument("--agents", type=int, default=1000, help="Other agents sharing the table")
+    parser.add_argument("--agent-transactions", type=int, default=100)
+    parser.add_argument("--page-size", type=int, default=repository.HISTORY_PAGE_SIZE)
+    parser.add_argument("--repeats", type=int, default=50)
+    parser.add_argument("--legacy-repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        start = time.perf_counter()
+        engine, SessionLocal = seed(os.path.join(tmp, "wallet.db"), args.transactions, args.agents, args.agent_transactions)
+        print(f"Seeded {args.transactions} + {args.agents}x{args.agent_transactions} transactions in {time.perf_counter() - start:.1f}s")
+
+        with engine.connect() as conn:
+            plan = conn.execute(text(
+                "EXPLAIN QUERY PLAN SELECT * FROM transactions WHERE agent_id = :a AND (timestamp, id) < (:t, :i) "
+                "ORDER BY timestamp DESC, id DESC LIMIT 51"), {"a": HERO, "t": "2030-01-01", "i": ""}).all()
+        print("Keyset plan: " + "; ".join(row[-1] for row in plan))
+
+        print(f"{'QUERY':>26} | {'p50 ms':>10} | {'max ms':>10} | {'rows':>10}")
+        print("-" * 66)
+
+        with SessionLocal() as db:
+            rows = len(legacy_wallet_view(db, HERO)["history"])
+            report("legacy full history", timed(lambda: legacy_wallet_view(db, HERO), args.legacy_repeats), rows)
+
+            report("summary header", timed(lambda: repository.wallet_summary(db, HERO), args.repeats))
+            report("wallet view (page 1)", timed(lambda: repository.wallet_view(db, HERO), args.repeats), args.page_size)
+
+            # Walk to the middle and the tail of the ledger, then time single page fetches there.
+            for label, fraction in (("history page @ 50%", 0.5), ("history page @ 99%", 0.99)):
+                target = int(args.transactions * fraction)
+                at = datetime(2024, 1, 1) + timedelta(seconds=(args.transactions - 1 - target) * 30)
+                cursor = repository.encode_cursor(at, f"TXN-{HERO[-7:]}-{args.transactions - 1 - target:08d}")
+                page = repository.transaction_page(db, HERO, cursor, args.page_size)
+                assert len(page["history"]) == min(args.page_size, args.transactions - 1 - target)
+                report(label, timed(lambda: repository.transaction_page(db, HERO, cursor, args.page_size), args.repeats), len(page["history"]))
+
+            # Full paginated walk of a normal agent, checked against the ledger.
+            seen, cursor = 0, None
+            while True:
+                page = repository.transaction_page(db, "AGENT-0000001", cursor, args.page_size)
+                seen += len(page["history"])
+                cursor = page["nextCursor"]
+                if not cursor:
+                    break
+            assert seen == args.agent_transactions, f"Pagination lost rows: {seen}/{args.agent_transactions}"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,412 @@
+import os
+import re
+import ssl
+import sys
+import json
+import time
+import queue
+import base64
+import random
+import hashlib
+import tempfile
+import threading
+import subprocess
+from concurrent import futures
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+os.environ.setdefault("GRPC_VERBOSITY", "ERROR")   # quiet the GOAWAY notices when a server shuts down
+import grpc
+from google.protobuf import json_format
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.abspath(os.path.join(BENCH_DIR, '..')))
+sys.path.append(os.path.abspath(os.path.join(BENCH_DIR, '../backend/grpc')))
+
+import rpc_pb2 as ln
+import rpc_pb2_grpc as lnrpc
+from backend.core.lnd_channel import CHANNELS
+
+# LOCAL LND STAND-IN
+# Serves the slice of the lnrpc.Lightning gRPC surface the payment code uses,
+# over an insecure localhost port, so payment flows can be load-tested offline.
+# A plaintext node switches CHANNELS.allow_insecure on, since the pool refuses
+# cert-less nodes by default.
+# Invoices live in memory; preimages are derived from a seed so runs repeat.
+# Every unary call sleeps `latency` (+/- `jitter`) seconds to mimic a real node.
+# With tls=True it serves a throwaway self-signed cert (made with the openssl CLI)
+# and writes a dummy macaroon, so clients go through the real credential path.
+# With rest=True the same node also answers the REST gateway routes used by
+# EscrowManager (HODL invoices) and the SDK's ProxyClient, over HTTPS.
+# Settlement: plain invoices settle when paid; hold invoices (REST only, there
+# are no invoicesrpc stubs in backend/grpc) go OPEN -> ACCEPTED when paid and
+# wait for the preimage. `fail_rate` makes that share of payments fail to route.
+# ----------------------------------------------------
+
+OPEN, SETTLED, CANCELED, ACCEPTED = 0, 1, 2, 3
+
+
+class FakeLightning(lnrpc.LightningServicer):
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, seed: str = "fake-lnd", fail_rate: float = 0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.seed = seed
+        self.fail_rate = fail_rate
+        self.rng = random.Random(seed)
+        self.invoices = {}      # r_hash bytes -> ln.Invoice
+        self.holds = set()      # r_hashes of hold invoices, whose preimage only the creator knows
+        self.add_index = 0
+        self.settle_index = 0
+        self.calls = {}
+        self.subscribers = []
+        self.lock = threading.Lock()
+
+    def _rpc(self, name: str):
+        with self.lock:
+            self.calls[name] = self.calls.get(name, 0) + 1
+        if self.latency:
+            time.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+
+    def preimage(self, index: int) -> bytes:
+        return hashlib.sha256(f"{self.seed}:{index}".encode()).digest()
+
+    def _snapshot(self, invoice):
+        # Stored invoices keep changing under settle(); callers get a frozen copy.
+        copy = ln.Invoice()
+        copy.CopyFrom(invoice)
+        return copy
+
+    def _publish(self, invoice):
+        for subscriber in list(self.subscribers):
+            subscriber.put(invoice)
+
+    # --- lnrpc.Lightning ---
+    def pubkey(self) -> str:
+        return "02" + hashlib.sha256(self.seed.encode()).hexdigest()
+
+    def GetInfo(self, request, context):
+        self._rpc("GetInfo")
+        return ln.GetInfoResponse(alias="fake-lnd", identity_pubkey=self.pubkey())
+
+    def AddInvoice(self, request, context):
+        self._rpc("AddInvoice")
+        invoice = self.add_invoice(request.value, request.memo, request.expiry, r_preimage=request.r_preimage)
+        return ln.AddInvoiceResponse(r_hash=invoice.r_hash, payment_request=invoice.payment_request, add_index=invoice.add_index)
+
+    def DecodePayReq(self, request, context):
+        self._rpc("DecodePayReq")
+        amount, _, r_hash = request.pay_req[len("lnbcrt"):].partition("n1")
+        return ln.PayReq(destination=self.pubkey(), payment_hash=r_hash, num_satoshis=int(amount))
+
+    def SendPaymentSync(self, request, context):
+        self._rpc("SendPaymentSync")
+        return self.pay(request.payment_request)
+
+    def LookupInvoice(self, request, context):
+        self._rpc("LookupInvoice")
+        invoice = self.lookup(request.r_hash or bytes.fromhex(request.r_hash_str))
+        if invoice is None:
+            context.abort(grpc.StatusCode.NOT_FOUND, "unable to locate invoice")
+        return invoice
+
+    def SubscribeInvoices(self, request, context):
+        self._rpc("SubscribeInvoices")
+        updates = queue.Queue()
+        with self.lock:
+            self.subscribers.append(updates)
+            backlog = sorted((self._snapshot(i) for i in self.invoices.values()
+                              if (request.add_index and i.add_index > request.add_index)
+                              or (request.settle_index and i.settle_index > request.settle_index)),
+                             key=lambda i: (i.settle_index, i.add_index))
+        try:
+            yield from backlog
+            while context.is_active():
+                try:
+                    yield updates.get(timeout=0.5)
+                except queue.Empty:
+                    continue
+        finally:
+            self.subscribers.remove(updates)
+
+    # --- invoice state machine, shared by the gRPC and REST surfaces ---
+    def add_invoice(self, value: int, memo: str, expiry: int = 0, r_preimage: bytes = b"", r_hash: bytes = b"") -> ln.Invoice:
+        """Plain invoice (preimage given or derived from the seed), or a hold invoice when only `r_hash` is given."""
+        with self.lock:
+            self.add_index += 1
+            if not r_hash:
+                r_preimage = r_preimage or self.preimage(self.add_index)
+                r_hash = hashlib.sha256(r_preimage).digest()
+            invoice = ln.Invoice(memo=memo, value=value, r_preimage=r_preimage, r_hash=r_hash,
+                                 creation_date=int(time.time()), expiry=expiry or 86400,
+                                 payment_request=f"lnbcrt{value}n1{r_hash.hex()}",
+                                 add_index=self.add_index, state=OPEN)
+            self.invoices[r_hash] = invoice
+            if not r_preimage:
+                self.holds.add(r_hash)
+            update = self._snapshot(invoice)
+        self._publish(update)
+        return update
+
+    def lookup(self, r_hash: bytes):
+        with self.lock:
+            invoice = self.invoices.get(r_hash)
+            return self._snapshot(invoice) if invoice is not None else None
+
+    def pay(self, payment_request: str) -> ln.SendResponse:
+        """
+        What SendPaymentSync does on the paying side. Hold invoices come back as soon as the HTLC
+        is ACCEPTED (a real node blocks until settle/cancel); the preimage is empty until then.
+        """
+        try:
+            r_hash = bytes.fromhex(payment_request.rpartition("n1")[2])
+        except ValueError:
+            return ln.SendResponse(payment_error="invalid payment request")
+        with self.lock:
+            unroutable = self.fail_rate and self.rng.random() < self.fail_rate
+        invoice = self.invoices.get(r_hash)
+        if invoice is None or unroutable:
+            return ln.SendResponse(payment_error="no route found", payment_hash=r_hash)
+        if not self.settle(r_hash):
+            return ln.SendResponse(payment_error="invoice is already paid", payment_hash=r_hash)
+        return ln.SendResponse(payment_preimage=invoice.r_preimage, payment_hash=r_hash)
+
+    def _resolve(self, invoice, state):
+        # Caller holds the lock.
+        invoice.state = state
+        if state == SETTLED:
+            self.settle_index += 1
+            invoice.settled = True
+            invoice.settle_date = int(time.time())
+            invoice.settle_index = self.settle_index
+        if state in (SETTLED, ACCEPTED):
+            invoice.amt_paid_sat = invoice.value
+        return self._snapshot(invoice)
+
+    # --- test controls (what a paying wallet would do) ---
+    def settle(self, r_hash: bytes) -> bool:
+        """Pays an OPEN invoice: plain invoices settle, hold invoices are ACCEPTED and wait for settle_hold()."""
+        with self.lock:
+            invoice = self.invoices.get(r_hash)
+            if invoice is None or invoice.state != OPEN:
+                return False
+            update = self._resolve(invoice, ACCEPTED if r_hash in self.holds else SETTLED)
+        self._publish(update)
+        return True
+
+    # --- hold invoice controls (what invoicesrpc does for the invoice's creator) ---
+    def settle_hold(self, preimage: bytes):
+        """Settles an ACCEPTED hold invoice with its preimage. Returns an error string, or None on success."""
+        r_hash = hashlib.sha256(preimage).digest()
+        with self.lock:
+            invoice = self.invoices.get(r_hash)
+            if invoice is None:
+                return "unable to locate invoice"
+            if invoice.state != ACCEPTED:
+                return f"invoice is {ln.Invoice.InvoiceState.Name(invoice.state)}, not ACCEPTED"
+            invoice.r_preimage = preimage
+            update = self._resolve(invoice, SETTLED)
+        self._publish(update)
+        return None
+
+    def cancel(self, r_hash: bytes):
+        """Cancels an unsettled invoice (refunding an ACCEPTED HTLC). Returns an error string, or None on success."""
+        with self.lock:
+            invoice = self.invoices.get(r_hash)
+            if invoice is None:
+                return "unable to locate invoice"
+            if invoice.state == SETTLED:
+                return "invoice already settled"
+            update = self._resolve(invoice, CANCELED)
+        self._publish(update)
+        return None
+
+
+# --- REST GATEWAY ---
+# Routes are the ones this repo calls, answered with grpc-gateway style JSON:
+# bytes as base64, 64-bit ints as strings, enums by name, defaults included.
+# v1 and v2 prefixes are both accepted for the invoicesrpc routes, since the
+# escrow code uses /v1/invoices/hodl while LND serves /v2/invoices/hodl.
+# GET /v1/payments/{hash} answers with the IN_FLIGHT/SUCCEEDED/FAILED status the
+# SDK polls for, derived from the paid invoice's state.
+
+def to_json(message) -> dict:
+    return json_format.MessageToDict(message, preserving_proto_field_name=True, always_print_fields_with_no_presence=True)
+
+
+class FakeLNDRestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True   # headers and body go out as separate writes; don't let delayed ACKs stall them
+    ROUTES = [
+        ("GET", r"/v1/getinfo", "get_info"),
+        ("POST", r"/v1/invoices", "add_invoice"),
+        ("POST", r"/v[12]/invoices/hodl", "add_hold_invoice"),
+        ("POST", r"/v[12]/invoices/settle", "settle_invoice"),
+        ("POST", r"/v[12]/invoices/cancel", "cancel_invoice"),
+        ("GET", r"/v1/invoice/(?P<r_hash>[0-9a-f]{64})", "lookup_invoice"),
+        ("POST", r"/v1/channels/transactions", "send_payment"),
+        ("GET", r"/v1/payments/(?P<r_hash>[0-9a-f]{64})", "track_payment"),
+    ]
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def _reply(self, status: int, body: dict):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _error(self, status: int, message: str, code: int = 2):
+        # Older gateways sent "error", newer ones only "message"; callers in this repo check either.
+        self._reply(status, {"error": message, "message": message, "code": code, "details": []})
+
+    def _dispatch(self, method: str):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length) or b"{}") if length else {}
+        if self.server.macaroon_hex and self.headers.get("Grpc-Metadata-macaroon") != self.server.macaroon_hex:
+            return self._error(500, "verification failed: signature mismatch after caveat verification")
+        for route_method, pattern, name in self.ROUTES:
+            match = re.fullmatch(pattern, self.path.split("?")[0])
+            if match and route_method == method:
+                return getattr(self, name)(body, **match.groupdict())
+        self._error(404, "Not Found", code=5)
+
+    @property
+    def node(self) -> FakeLightning:
+        return self.server.servicer
+
+    def get_info(self, body):
+        self.node._rpc("GetInfo")
+        self._reply(200, to_json(ln.GetInfoResponse(alias="fake-lnd", identity_pubkey=self.node.pubkey())))
+
+    def add_invoice(self, body):
+        self.node._rpc("AddInvoice")
+        invoice = self.node.add_invoice(int(body.get("value", 0)), body.get("memo", ""), int(body.get("expiry", 0)),
+                                        r_preimage=base64.b64decode(body.get("r_preimage", "")))
+        self._reply(200, to_json(ln.AddInvoiceResponse(r_hash=invoice.r_hash, payment_request=invoice.payment_request,
+                                                       add_index=invoice.add_index)))
+
+    def add_hold_invoice(self, body):
+        self.node._rpc("AddHoldInvoice")
+        r_hash = base64.b64decode(body.get("hash", ""))
+        if len(r_hash) != 32:
+            return self._error(500, "payment hash must be exactly 32 bytes")
+        if self.node.lookup(r_hash) is not None:
+            return self._error(500, "invoice with payment hash already exists")
+        invoice = self.node.add_invoice(int(body.get("value", 0)), body.get("memo", ""), int(body.get("expiry", 0)), r_hash=r_hash)
+        self._reply(200, {"payment_request": invoice.payment_request, "add_index": str(invoice.add_index)})
+
+    def settle_invoice(self, body):
+        self.node._rpc("SettleInvoice")
+        error = self.node.settle_hold(base64.b64decode(body.get("preimage", "")))
+        if error:
+            return self._error(500, error)
+        self._reply(200, {})
+
+    def cancel_invoice(self, body):
+        self.node._rpc("CancelInvoice")
+        error = self.node.cancel(base64.b64decode(body.get("payment_hash", "")))
+        if error:
+            return self._error(500, error)
+        self._reply(200, {})
+
+    def lookup_invoice(self, body, r_hash):
+        self.node._rpc("LookupInvoice")
+        invoice = self.node.lookup(bytes.fromhex(r_hash))
+        if invoice is None:
+            return self._error(404, "unable to locate invoice", code=5)
+        self._reply(200, to_json(invoice))
+
+    def send_payment(self, body):
+        self.node._rpc("SendPaymentSync")
+        self._reply(200, to_json(self.node.pay(body.get("payment_request", ""))))
+
+    def track_payment(self, body, r_hash):
+        self.node._rpc("TrackPayment")
+        invoice = self.node.lookup(bytes.fromhex(r_hash))
+        if invoice is None or invoice.state == OPEN:
+            return self._error(404, "payment isn't initiated", code=5)
+        status = {ACCEPTED: "IN_FLIGHT", SETTLED: "SUCCEEDED", CANCELED: "FAILED"}[invoice.state]
+        self._reply(200, {"payment_hash": r_hash, "status": status, "value_sat": str(invoice.value),
+                          "payment_preimage": invoice.r_preimage.hex() if invoice.state == SETTLED else ""})
+
+
+class FakeLNDRestServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256
+
+    def __init__(self, servicer: FakeLightning, cert: str, key: str, macaroon_hex: str):
+        super().__init__(("127.0.0.1", 0), FakeLNDRestHandler)
+        self.servicer = servicer
+        self.macaroon_hex = macaroon_hex
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(cert, key)
+        # Handshake on the handler thread, not in the accept loop.
+        self.socket = context.wrap_socket(self.socket, server_side=True, do_handshake_on_connect=False)
+
+
+def make_tls_identity(directory: str) -> tuple[str, str, str]:
+    """Writes a self-signed localhost cert, its key and a dummy macaroon; returns their paths."""
+    cert, key, macaroon = (os.path.join(directory, name) for name in ("tls.cert", "tls.key", "admin.macaroon"))
+    subprocess.run(["openssl", "req", "-x509", "-newkey", "ec", "-pkeyopt", "ec_paramgen_curve:prime256v1", "-nodes",
+                    "-keyout", key, "-out", cert, "-days", "1", "-subj", "/CN=localhost",
+                    "-addext", "subjectAltName=DNS:localhost,IP:127.0.0.1"], check=True, capture_output=True)
+    with open(macaroon, "wb") as f:
+        f.write(hashlib.sha256(b"fake-macaroon").digest())
+    return cert, key, macaroon
+
+
+class FakeLND:
+    """
+    Runs FakeLightning on a localhost port. Use as a context manager.
+    `node` is the (host:port, cert_path, macaroon_path) triple LightningEngine.connect() and the channel pool take.
+    With rest=True, `rest_host`, `cert` and `macaroon_hex` are what EscrowManager and ProxyClient take.
+    """
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, seed: str = "fake-lnd", workers: int = 64, tls: bool = False,
+                 rest: bool = False, fail_rate: float = 0.0):
+        self.servicer = FakeLightning(latency, jitter, seed, fail_rate)
+        self.server = grpc.server(futures.ThreadPoolExecutor(max_workers=workers))
+        lnrpc.add_LightningServicer_to_server(self.servicer, self.server)
+        self._tmp = None
+        self.rest = None
+        if tls or rest:
+            self._tmp = tempfile.TemporaryDirectory()
+            cert, key, macaroon = make_tls_identity(self._tmp.name)
+            self.cert = cert
+            with open(macaroon, "rb") as f:
+                self.macaroon_hex = f.read().hex()
+        if rest:
+            self.rest = FakeLNDRestServer(self.servicer, cert, key, self.macaroon_hex)
+            self.rest_host = f"127.0.0.1:{self.rest.server_address[1]}"
+        if tls:
+            with open(key, "rb") as k, open(cert, "rb") as c:
+                creds = grpc.ssl_server_credentials([(k.read(), c.read())])
+            self.port = self.server.add_secure_port("127.0.0.1:0", creds)
+            self.node = (f"127.0.0.1:{self.port}", cert, macaroon)
+        else:
+            self.port = self.server.add_insecure_port("127.0.0.1:0")
+            self.node = (f"127.0.0.1:{self.port}", None, None)
+            CHANNELS.allow_insecure = True      # the pool refuses cert-less nodes unless told this is a test
+        self.target = self.node[0]
+
+    def __enter__(self):
+        self.server.start()
+        if self.rest:
+            threading.Thread(target=self.rest.serve_forever, name="fake-lnd-rest", daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.stop(grace=None)
+        if self.rest:
+            self.rest.shutdown()
+            self.rest.server_close()
+        if self._tmp:
+            self._tmp.cleanup()
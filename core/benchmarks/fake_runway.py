@@ -0,0 +1,138 @@
+import re
+import json
+import time
+import uuid
+import base64
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# LOCAL RUNWAY / IMAGEN STAND-IN
+# Serves the two upstream APIs mcp_server.generate_video talks to, over plain
+# HTTP on localhost, so the video pipeline can be load-tested offline:
+#   POST   /imagen:predict        -> one tiny base64 "seed image"
+#   POST   /v1/image_to_video     -> a new task ID (needs the bearer key)
+#   GET    /v1/tasks/{id}         -> PENDING, RUNNING with progress 0..1, then SUCCEEDED
+#   DELETE /v1/tasks/{id}         -> CANCELLED
+#   GET    /videos/{id}.mp4       -> a few bytes of "video"
+# A task renders for `task_seconds` (+/- `jitter`); `fail_rate` makes that share
+# of tasks end FAILED. Point IMAGEN_API_URL at `imagen_url` and RUNWAY_API_URL
+# at `runway_url`. `stats` counts task creations, polls and cancellations.
+# ----------------------------------------------------
+
+FAKE_RUNWAY_KEY = "fake-runway-key"
+
+
+class FakeRunwayHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    ROUTES = [
+        ("POST", r"/imagen:predict", "predict"),
+        ("POST", r"/v1/image_to_video", "create_task"),
+        ("GET", r"/v1/tasks/(?P<task_id>[0-9a-f-]{36})", "get_task"),
+        ("DELETE", r"/v1/tasks/(?P<task_id>[0-9a-f-]{36})", "cancel_task"),
+        ("GET", r"/videos/(?P<task_id>[0-9a-f-]{36})\.mp4", "download"),
+    ]
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_DELETE(self):
+        self._dispatch("DELETE")
+
+    def _reply(self, status: int, body, content_type: str = "application/json"):
+        payload = body if isinstance(body, bytes) else json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _dispatch(self, method: str):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length)) if length else {}
+        path = self.path.split("?")[0]
+        if path.startswith("/v1/") and self.headers.get("Authorization") != f"Bearer {FAKE_RUNWAY_KEY}":
+            return self._reply(401, {"error": "Invalid API key"})
+        for route_method, pattern, name in self.ROUTES:
+            match = re.fullmatch(pattern, path)
+            if match and route_method == method:
+                return getattr(self.server.runway, name)(self, body, **match.groupdict())
+        self._reply(404, {"error": "Not Found"})
+
+
+class FakeRunway:
+    def __init__(self, task_seconds: float = 5.0, jitter: float = 0.0, fail_rate: float = 0.0, seed: str = "fake-runway"):
+        self.task_seconds = task_seconds
+        self.jitter = jitter
+        self.fail_rate = fail_rate
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.tasks = {}
+        self.stats = {"created": 0, "polls": 0, "cancelled": 0}
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), FakeRunwayHandler)
+        self.server.daemon_threads = True
+        self.server.request_queue_size = 256
+        self.server.runway = self
+        base = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.imagen_url = f"{base}/imagen:predict"
+        self.runway_url = f"{base}/v1"
+        self.video_url = f"{base}/videos"
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, name="fake-runway", daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+    # --- routes ---
+    def predict(self, handler, body):
+        handler._reply(200, {"predictions": [{"bytesBase64Encoded": base64.b64encode(b"\xff\xd8fake-seed\xff\xd9").decode()}]})
+
+    def create_task(self, handler, body):
+        if not body.get("promptImage", "").startswith("data:image/"):
+            return handler._reply(400, {"error": "promptImage must be a data URI"})
+        with self.lock:
+            task_id = str(uuid.UUID(int=self.rng.getrandbits(128)))
+            runtime = max(self.task_seconds + self.rng.uniform(-self.jitter, self.jitter), 0.0)
+            failed = self.rng.random() < self.fail_rate
+            self.tasks[task_id] = {"started": time.monotonic(), "runtime": runtime, "failed": failed, "cancelled": False}
+            self.stats["created"] += 1
+        handler._reply(200, {"id": task_id})
+
+    def get_task(self, handler, body, task_id):
+        with self.lock:
+            task = self.tasks.get(task_id)
+            self.stats["polls"] += 1
+        if task is None:
+            return handler._reply(404, {"error": "Task not found"})
+        elapsed = time.monotonic() - task["started"]
+        if task["cancelled"]:
+            status = {"id": task_id, "status": "CANCELLED"}
+        elif elapsed >= task["runtime"]:
+            status = {"id": task_id, "status": "FAILED", "failure": "Content moderation"} if task["failed"] else \
+                     {"id": task_id, "status": "SUCCEEDED", "output": [f"{self.video_url}/{task_id}.mp4"]}
+        elif elapsed < task["runtime"] * 0.1:
+            status = {"id": task_id, "status": "PENDING"}
+        else:
+            status = {"id": task_id, "status": "RUNNING", "progress": round(elapsed / task["runtime"], 3)}
+        handler._reply(200, status)
+
+    def cancel_task(self, handler, body, task_id):
+        with self.lock:
+            task = self.tasks.get(task_id)
+            if task is not None and not task["cancelled"]:
+                task["cancelled"] = True
+                self.stats["cancelled"] += 1
+        handler._reply(204 if task is not None else 404, b"")
+
+    def download(self, handler, body, task_id):
+        handler._reply(200, b"\x00\x00\x00\x18ftypmp42" + task_id.encode(), content_type="video/mp4")
@@ -0,0 +1,84 @@
+import os
+import sys
+import random
+
+# PAN GATEWAY - SIMULATED FLEET (Benchmark Fixtures)
+# "A city full of agents, none of them real."
+# ----------------------------------------------------
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.abspath(os.path.join(BENCH_DIR, '../pan_gateway')))
+
+from auction_engine import haversine
+
+# Metro centres the fleet is scattered around (lat, lon).
+METROS = [
+    (33.4484, -112.0740),   # Phoenix
+    (37.7749, -122.4194),   # San Francisco
+    (34.0522, -118.2437),   # Los Angeles
+    (30.2672, -97.7431),    # Austin
+    (47.6062, -122.3321),   # Seattle
+    (25.7617, -80.1918),    # Miami
+    (40.7128, -74.0060),    # New York
+    (41.8781, -87.6298),    # Chicago
+]
+
+GEAR_TYPES = ["sensor_cleaning", "tire_change", "jump_start", "door_close", "tow_hitch"]
+
+
+def make_agent(i: int, rng: random.Random) -> dict:
+    metro_lat, metro_lon = rng.choice(METROS)
+    gear = rng.sample(GEAR_TYPES, rng.randint(1, 3))
+    return {
+        "agent_id": f"AGENT-{i:07d}",
+        "lat": metro_lat + rng.uniform(-0.5, 0.5),
+        "lon": metro_lon + rng.uniform(-0.5, 0.5),
+        "radius": rng.choice([3.0, 5.0, 5.0, 10.0, 15.0]),
+        "loadout": {g: round(rng.uniform(15.0, 60.0), 2) for g in gear},
+    }
+
+
+def make_fleet(n: int, seed: int = 42) -> list[dict]:
+    rng = random.Random(seed)
+    return [make_agent(i, rng) for i in range(n)]
+
+
+def make_incidents(n: int, seed: int = 7) -> list[dict]:
+    rng = random.Random(seed)
+    incidents = []
+    for _ in range(n):
+        metro_lat, metro_lon = rng.choice(METROS)
+        incidents.append({
+            "lat": metro_lat + rng.uniform(-0.4, 0.4),
+            "lon": metro_lon + rng.uniform(-0.4, 0.4),
+            "required_gear": rng.choice(GEAR_TYPES),
+            "max_budget": 45.0,
+        })
+    return incidents
+
+
+def scan_winner(fleet, lat: float, lon: float, required_gear: str, max_budget: float):
+    """
+    Reference auction over every agent: cheapest bid wins, ties broken by distance.
+    Returns (agent_id, bid, distance) or None, like the head of BidBook.ranked().
+    """
+    best = None
+    for agent in fleet:
+        bid = agent["loadout"].get(required_gear)
+        if bid is None or bid > max_budget:
+            continue
+        dist = haversine(lat, lon, agent["lat"], agent["lon"])
+        if dist <= agent["radius"] and (best is None or (bid, dist) < (best[1], best[2])):
+            best = (agent["agent_id"], float(bid), dist)
+    return best
+
+
+def import_gateway(workdir: str):
+    """Imports pan_gateway's main module with its SQLite file created under `workdir`."""
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        import main
+    finally:
+        os.chdir(cwd)
+    return main
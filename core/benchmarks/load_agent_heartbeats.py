@@ -0,0 +1,145 @@
+import os
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+import statistics
+from datetime import datetime, timezone
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import fleet_sim  # noqa: F401  (puts pan_gateway on sys.path)
+from models import Base, Agent, Wallet, AgentSession
+from agent_cache import AgentStateCache
+
+# PAN GATEWAY - HEARTBEAT LOAD TEST
+# Legacy synchronous read-modify-commit per heartbeat vs. the write-behind
+# AgentStateCache, both driven by concurrent simulated agents on one event loop.
+# ----------------------------------------------------
+
+
+def legacy_heartbeat(SessionLocal, hb: dict):
+    """The pre-cache /v1/agent/status body, verbatim in behaviour."""
+    db = SessionLocal()
+    try:
+        agent = db.query(Agent).filter(Agent.agent_id == hb["agentId"]).first()
+        if not agent:
+            agent = Agent(agent_id=hb["agentId"])
+            db.add(agent)
+            db.add(Wallet(agent_id=hb["agentId"], balance=0.0))
+
+        agent.status = hb["status"]
+        agent.lat = hb["latitude"]
+        agent.lon = hb["longitude"]
+        agent.radius = hb["radius"]
+        agent.loadout = hb["loadout"]
+
+        if hb["status"] == "ONLINE":
+            active_session = db.query(AgentSession).filter(AgentSession.agent_id == hb["agentId"], AgentSession.went_offline_at == None).first()
+            if not active_session:
+                db.add(AgentSession(agent_id=hb["agentId"]))
+        elif hb["status"] == "OFFLINE":
+            active_session = db.query(AgentSession).filter(AgentSession.agent_id == hb["agentId"], AgentSession.went_offline_at == None).first()
+            if active_session:
+                active_session.went_offline_at = datetime.now(timezone.utc)
+
+        db.commit()
+    finally:
+        db.close()
+
+
+def make_heartbeats(agents: int, per_agent: int, seed: int = 3) -> list[list[dict]]:
+    rng = random.Random(seed)
+    fleet = fleet_sim.make_fleet(agents)
+    streams = []
+    for a in fleet:
+        stream = []
+        for _ in range(per_agent):
+            stream.append({
+                "agentId": a["agent_id"],
+                "status": "ONLINE" if rng.random() > 0.02 else "OFFLINE",
+                "latitude": a["lat"] + rng.uniform(-0.001, 0.001),
+                "longitude": a["lon"] + rng.uniform(-0.001, 0.001),
+                "radius": a["radius"],
+                "loadout": a["loadout"],
+            })
+        streams.append(stream)
+    return streams
+
+
+def fresh_db(path: str):
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+async def drive(streams, handler):
+    latencies = []
+
+    async def agent_loop(stream):
+        for hb in stream:
+            start = time.perf_counter()
+            handler(hb)
+            latencies.append((time.perf_counter() - start) * 1000)
+            await asyncio.sleep(0)   # yield like a real request boundary
+
+    start = time.perf_counter()
+    await asyncio.gather(*(agent_loop(s) for s in streams))
+    return time.perf_counter() - start, latencies
+
+
+async def run_legacy(streams, path):
+    SessionLocal = fresh_db(path)
+    return await drive(streams, lambda hb: legacy_heartbeat(SessionLocal, hb))
+
+
+async def run_cached(streams, path, flush_interval):
+    SessionLocal = fresh_db(path)
+    cache = AgentStateCache(SessionLocal, flush_interval=flush_interval)
+    flusher = asyncio.create_task(cache.run())
+
+    def handler(hb):
+        cache.heartbeat(hb["agentId"], hb["status"], hb["latitude"], hb["longitude"], hb["radius"], hb["loadout"])
+
+    elapsed, latencies = await drive(streams, handler)
+    flusher.cancel()
+    await cache.flush()
+
+    with SessionLocal() as db:
+        persisted = db.query(Agent).count()
+    assert persisted == len(streams), f"Write-behind lost agents: {persisted}/{len(streams)}"
+    return elapsed, latencies
+
+
+def report(label, total, elapsed, latencies):
+    p50 = statistics.median(latencies)
+    p99 = statistics.quantiles(latencies, n=100)[98]
+    print(f"{label:>12} | {total / elapsed:>12.0f} | {p50:>9.3f} | {p99:>9.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test /v1/agent/status heartbeat handling")
+    parser.add_argument("--agents", type=int, default=2000)
+    parser.add_argument("--heartbeats", type=int, default=5, help="Heartbeats per agent")
+    parser.add_argument("--flush-interval", type=float, default=1.0)
+    args = parser.parse_args()
+
+    streams = make_heartbeats(args.agents, args.heartbeats)
+    total = args.agents * args.heartbeats
+
+    print(f"{total} heartbeats from {args.agents} agents (SQLite file DB)")
+    print(f"{'MODE':>12} | {'BEATS/s':>12} | {'p50 ms':>9} | {'p99 ms':>9}")
+    print("-" * 52)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        elapsed, latencies = asyncio.run(run_legacy(streams, os.path.join(tmp, "legacy.db")))
+        report("legacy", total, elapsed, latencies)
+
+        elapsed, latencies = asyncio.run(run_cached(streams, os.path.join(tmp, "cached.db"), args.flush_interval))
+        report("write-behind", total, elapsed, latencies)
+
+
+if __name__ == "__main__":
+    main()
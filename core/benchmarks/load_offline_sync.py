@@ -0,0 +1,131 @@
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+import statistics
+
+import httpx
+
+import fleet_sim
+
+# PAN GATEWAY - OFFLINE SYNC LOAD TEST
+# Devices come back online with a long queue of telemetry, status changes
+# and mission acks and replay it through /v1/agent/sync in ordered batches,
+# all concurrently against the real app over an in-process ASGI transport.
+# A second pass re-sends every batch, as a device would after losing the
+# acks, to measure duplicate rejection from the in-memory key LRU and from
+# the sync_receipts table.
+# ----------------------------------------------------
+
+HEADERS = {"X-Auth-Token": "bench-hardware-attestation"}
+SIGNATURE = "b" * 64
+
+
+def make_queue(agent: dict, events: int, rng: random.Random) -> list[dict]:
+    queue = []
+    lat, lon = agent["lat"], agent["lon"]
+    for i in range(events):
+        key = f"{agent['agent_id']}-{i:08d}"
+        roll = rng.random()
+        if roll < 0.01:
+            queue.append({"key": key, "type": "accept"})
+        elif roll < 0.03:
+            queue.append({"key": key, "type": "status", "status": rng.choice(["ONLINE", "BUSY", "OFFLINE"])})
+        else:
+            lat += rng.uniform(-0.0005, 0.0005)
+            lon += rng.uniform(-0.0005, 0.0005)
+            queue.append({"key": key, "type": "telemetry", "status": "ONLINE", "latitude": lat, "longitude": lon,
+                          "radius": agent["radius"], "loadout": agent["loadout"]})
+    return queue
+
+
+def batches(agent_id: str, queue: list[dict], size: int):
+    for i in range(0, len(queue), size):
+        yield {"agentId": agent_id, "events": queue[i:i + size], "signature": SIGNATURE}
+
+
+async def replay(client, device_batches, latencies: list, totals: dict):
+    for body in device_batches:
+        start = time.perf_counter()
+        response = await client.post("/v1/agent/sync", json=body, headers=HEADERS)
+        latencies.append((time.perf_counter() - start) * 1000)
+        response.raise_for_status()
+        result = response.json()
+        totals["applied"] += result["applied"]
+        totals["duplicates"] += result["duplicates"]
+
+
+async def run_pass(client, plans: dict) -> tuple[float, list, dict]:
+    latencies, totals = [], {"applied": 0, "duplicates": 0}
+    start = time.perf_counter()
+    await asyncio.gather(*(replay(client, device_batches, latencies, totals) for device_batches in plans.values()))
+    return time.perf_counter() - start, latencies, totals
+
+
+def report(label: str, events: int, elapsed: float, latencies: list, totals: dict):
+    p50 = statistics.median(latencies)
+    p99 = statistics.quantiles(latencies, n=100, method="inclusive")[98]
+    print(f"{label:>16} | {events / elapsed:>10.0f} | {p50:>9.1f} | {p99:>9.1f} | {totals['applied']:>8} | {totals['duplicates']:>8}")
+
+
+async def run(args, gateway):
+    gateway.limiter.enabled = False   # measure the handler, not slowapi's per-IP quota
+    rng = random.Random(17)
+    fleet = fleet_sim.make_fleet(args.devices)
+    queues = {a["agent_id"]: make_queue(a, args.events, rng) for a in fleet}
+    plans = {agent_id: list(batches(agent_id, queue, args.batch_size)) for agent_id, queue in queues.items()}
+    total = args.devices * args.events
+
+    transport = httpx.ASGITransport(app=gateway.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://gateway") as client:
+        print(f"{args.devices} devices x {args.events} queued events, batches of {args.batch_size}")
+        print(f"{'PASS':>16} | {'EVENTS/s':>10} | {'p50 ms':>9} | {'p99 ms':>9} | {'APPLIED':>8} | {'DUPES':>8}")
+        print("-" * 75)
+
+        elapsed, latencies, totals = await run_pass(client, plans)
+        report("first replay", total, elapsed, latencies, totals)
+        assert totals["applied"] == total, f"Applied {totals['applied']}/{total} events"
+
+        elapsed, latencies, totals = await run_pass(client, plans)
+        report("retry (LRU hit)", total, elapsed, latencies, totals)
+        assert totals["applied"] == 0
+
+        gateway.recent_sync_keys.clear()
+        elapsed, latencies, totals = await run_pass(client, plans)
+        report("retry (DB check)", total, elapsed, latencies, totals)
+        assert totals["applied"] == 0
+
+    # Every device's cache row must reflect the last event in its queue.
+    for agent_id, queue in queues.items():
+        last = queue[-1]
+        state = gateway.agent_cache.get(agent_id)
+        if last["type"] == "telemetry":
+            assert (state["lat"], state["lon"]) == (last["latitude"], last["longitude"]), f"{agent_id} replayed out of order"
+        elif last["type"] == "accept":
+            assert state["status"] == "BUSY"
+    await gateway.agent_cache.flush()
+
+    with gateway.SessionLocal() as db:
+        receipts = db.query(gateway.repository.SyncReceipt).count()
+    assert receipts == total, f"{receipts} receipts for {total} events"
+    print(f"✅ {receipts} receipts, no event applied twice, per-device order preserved.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test batched offline-sync ingest")
+    parser.add_argument("--devices", type=int, default=20)
+    parser.add_argument("--events", type=int, default=10_000, help="Queued events per device")
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        gateway = fleet_sim.import_gateway(tmp)
+        try:
+            asyncio.run(run(args, gateway))
+        finally:
+            gateway.repo.shutdown()
+
+
+if __name__ == "__main__":
+    main()
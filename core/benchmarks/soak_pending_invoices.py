@@ -0,0 +1,93 @@
+import os
+import sys
+import time
+import hashlib
+import argparse
+import tempfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.abspath(os.path.join(BENCH_DIR, '..')))
+
+from backend.core.invoice_store import PendingInvoiceStore
+
+# LIGHTNING - PENDING INVOICE SOAK TEST
+# Issues millions of invoices on a simulated clock (a fixed number per simulated
+# second), settling a share of them, and samples process RSS as it goes:
+#   dict  : the old pending_invoices, which only ever grows
+#   store : PendingInvoiceStore, entries leave at settlement or expiry
+# The store must plateau once the first invoices start expiring.
+# ----------------------------------------------------
+
+
+def rss_mb() -> float:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+
+
+def invoice(i: int) -> tuple[str, dict]:
+    r_hash = hashlib.sha256(i.to_bytes(8, "big")).hexdigest()
+    # Real regtest payment requests are ~280 chars; pad to keep the per-entry cost honest.
+    return r_hash, {'amount': 100 + i % 900, 'memo': f"soak {i}", 'payment_request': f"lnbcrt{100 + i % 900}n1{r_hash}".ljust(280, "q")}
+
+
+def soak(mode: str, args, path=None) -> list:
+    clock = [0.0]
+    if mode == "dict":
+        pending = {}
+    else:
+        pending = PendingInvoiceStore(ttl=args.ttl, max_size=args.invoices, path=path, clock=lambda: clock[0])
+    samples = []
+    step = args.invoices // args.samples
+    for i in range(args.invoices):
+        clock[0] = i / args.rate
+        r_hash, entry = invoice(i)
+        if mode == "dict":
+            pending[r_hash] = entry
+        else:
+            pending.put(r_hash, entry)
+            if i % 100 < args.settled_pct:
+                pending.discard(r_hash)
+            pending.get(invoice(i // 2)[0])     # QR fetches: mostly for invoices that already expired
+        if (i + 1) % step == 0:
+            samples.append((i + 1, clock[0], len(pending), rss_mb()))
+    if mode == "store":
+        print(f"  store stats: {pending.stats}")
+        pending.close()
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memory of the pending-invoice map over millions of invoices")
+    parser.add_argument("--invoices", type=int, default=2_000_000)
+    parser.add_argument("--rate", type=float, default=1000, help="Invoices issued per simulated second")
+    parser.add_argument("--ttl", type=float, default=120, help="Invoice expiry (simulated seconds)")
+    parser.add_argument("--settled-pct", type=int, default=30, help="Percent of invoices paid right away")
+    parser.add_argument("--samples", type=int, default=10)
+    parser.add_argument("--sqlite", action="store_true", help="Write the store through to a temporary SQLite file")
+    parser.add_argument("--baseline", action="store_true", help="Also run the unbounded dict (needs several GB at the default size)")
+    args = parser.parse_args()
+
+    modes = (["dict"] if args.baseline else []) + ["store"]
+    print(f"{args.invoices} invoices at {args.rate:.0f}/s, {args.ttl:.0f}s expiry, {args.settled_pct}% settled immediately"
+          f"{', SQLite write-through' if args.sqlite else ''}")
+    for mode in modes:
+        with tempfile.TemporaryDirectory() as tmp:
+            start = time.perf_counter()
+            samples = soak(mode, args, os.path.join(tmp, "pending.db") if args.sqlite and mode == "store" else None)
+            elapsed = time.perf_counter() - start
+        print(f"\n[{mode}] {args.invoices / elapsed:.0f} invoices/s")
+        print(f"{'INVOICES':>10} | {'SIM TIME':>9} | {'ENTRIES':>9} | {'RSS MB':>8}")
+        print("-" * 46)
+        for issued, sim_time, entries, rss in samples:
+            print(f"{issued:>10} | {sim_time:>8.0f}s | {entries:>9} | {rss:>8.1f}")
+        if mode == "store":
+            # Everything after the first expiry window is steady state: RSS must stop climbing there.
+            steady = [rss for issued, sim_time, _, rss in samples if sim_time > 2 * args.ttl]
+            assert len(steady) >= 2, "run longer than two expiry windows to see the plateau"
+            growth = (steady[-1] - steady[0]) / steady[0] * 100
+            print(f"RSS growth across the steady-state samples: {growth:+.1f}%")
+            assert growth < 10, "pending invoice memory is still growing"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+import time
+import logging
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from fake_lnd import FakeLND
+from backend.core.lightning_engine import LightningEngine
+
+# LIGHTNING - SLOW LOOKUP VS. STREAM SETTLEMENT RACE
+# A LookupInvoice that reads an invoice while it is still OPEN but answers only
+# after SubscribeInvoices has delivered its settlement must not put the cached
+# entry back to OPEN: with the stream live, check_status trusts the cache and
+# the stream never sends that invoice again, so the payer would see 402 forever.
+# For each invoice: drop its cache entry (as LRU eviction would), start a
+# check_status whose LookupInvoice snapshots OPEN, settle the invoice, wait for
+# the stream to cache SETTLED, then let the stale OPEN answer through.
+# Invariant: every invoice reads SETTLED afterwards, with the stream still live.
+# ----------------------------------------------------
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Slow LookupInvoice racing a SubscribeInvoices settlement")
+    parser.add_argument("--invoices", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+    logging.getLogger("LND-gRPC").setLevel(logging.CRITICAL)
+
+    with FakeLND() as fake:
+        engine = LightningEngine(subscribe=True, cache_size=args.invoices * 2)
+        assert engine.connect(target=fake.node)
+        assert engine._stream_live.wait(5), "invoice stream never came up"
+        servicer = fake.servicer
+        real_lookup = servicer.lookup     # behind LookupInvoice; the gRPC handler itself is bound at server start
+        read, release = {}, {}     # r_hash bytes -> Event: lookup has its OPEN snapshot / stream has cached SETTLED
+
+        def slow_lookup(r_hash):
+            answer = real_lookup(r_hash)
+            if answer is not None and r_hash in release:
+                read[r_hash].set()
+                release[r_hash].wait(10)
+            return answer
+
+        servicer.lookup = slow_lookup
+        invoices = [engine.create_invoice(100 + i, f"race {i}")["r_hash"] for i in range(args.invoices)]
+        stale_answers = []
+
+        def race(r_hash_hex):
+            r_hash = bytes.fromhex(r_hash_hex)
+            read[r_hash], release[r_hash] = threading.Event(), threading.Event()
+            with engine._cache_lock:
+                engine.invoice_states.pop(r_hash_hex, None)
+            checker = ThreadPoolExecutor(1)
+            first = checker.submit(engine.check_status, r_hash_hex)
+            assert read[r_hash].wait(10), "lookup never reached LND"
+            assert servicer.settle(r_hash)
+            deadline = time.monotonic() + 5
+            while (engine.invoice_states.get(r_hash_hex) or {}).get("state") != "SETTLED" and time.monotonic() < deadline:
+                time.sleep(0.001)
+            release[r_hash].set()
+            stale_answers.append(first.result())
+            checker.shutdown()
+            return engine.check_status(r_hash_hex)
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(args.concurrency) as pool:
+            states = list(pool.map(race, invoices))
+        elapsed = time.perf_counter() - start
+
+        wrong = [(h[:8], s) for h, s in zip(invoices, states) if s != "SETTLED"]
+        print(f"{args.invoices} invoices, {args.concurrency} races at a time, {elapsed:.2f}s | "
+              f"stale OPEN lookups answered after settlement: {len(stale_answers)}, "
+              f"read as SETTLED: {stale_answers.count('SETTLED')} | stream live: {engine._stream_live.is_set()}")
+        if wrong or stale_answers.count("SETTLED") != len(stale_answers) or not engine._stream_live.is_set():
+            raise SystemExit(f"❌ FAIL: {len(wrong)} paid invoices read back as not SETTLED: {wrong[:5]}")
+        print("✅ PASS: every paid invoice stays SETTLED after a stale lookup.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+import statistics
+from collections import Counter
+
+import fleet_sim
+
+# PAN GATEWAY - AUCTION CONCURRENCY STRESS TEST
+# Fires thousands of simultaneous incidents at the real gateway.dispatch_mission
+# (its SQLite ledger, offers and ACK fallback included) over a fleet of fake
+# agent sockets, and checks that no agent is ever handed two missions. Incidents
+# cluster on a few metros, so auctions keep competing for the same agents while
+# others sit in ACK waits and DB round-trips. Some agents ack too late, so
+# offers fall back and get revoked; winners accept through accept_mission.
+# Invariants, checked on every MISSION frame an agent receives:
+#   - it holds no other open offer (reserve_agent took it out of the book)
+#   - it hasn't already accepted a mission
+# ----------------------------------------------------
+
+
+class FakeAgentSocket:
+    """Plays a protocol 2 agent: acks MISSION frames, then accepts over the HTTP handler."""
+
+    def __init__(self, agent_id: str, gateway, ack_ms: float, report: dict):
+        self.agent_id = agent_id
+        self.gateway = gateway
+        self.ack_ms = ack_ms
+        self.report = report
+        self.holding = None      # mission id of the open offer, if any
+        self.accepted = None
+
+    async def accept(self):
+        pass
+
+    async def close(self, code: int = 1000):
+        pass
+
+    async def send_text(self, text: str):
+        message = self.gateway.json.loads(text)
+        if message["type"] == "MISSION":
+            self.report["offers"] += 1
+            if self.holding is not None or self.accepted is not None or self.agent_id in self.gateway.bid_book:
+                self.report["violations"].append((self.agent_id, self.holding, self.accepted, message["missionId"]))
+            self.holding = message["missionId"]
+            asyncio.get_running_loop().call_later(self.ack_ms / 1000, lambda: asyncio.ensure_future(self.reply(message["missionId"])))
+        elif message["type"] == "MISSION_REVOKED":
+            self.report["revoked"] += 1
+            if self.holding == message["missionId"]:
+                self.holding = None
+
+    async def reply(self, mission_id: int):
+        if self.holding != mission_id:
+            return      # revoked before we got to it
+        self.gateway.manager.ack(self.agent_id, mission_id)
+        accept = self.gateway.accept_mission.__wrapped__    # skip the per-IP rate limit
+        try:
+            await accept(None, self.gateway.MissionAccept(agentId=self.agent_id), auth=None)
+        except self.gateway.HTTPException:
+            self.report["late_accepts"] += 1
+            return
+        self.holding, self.accepted = None, mission_id
+        self.report["accepted"][self.agent_id] += 1
+
+
+async def run(gateway, fleet: list, incidents: list, args) -> dict:
+    rng = random.Random(5)
+    gateway.ACK_TIMEOUT_SECONDS = args.ack_timeout
+    report = {"offers": 0, "revoked": 0, "late_accepts": 0, "violations": [], "accepted": Counter()}
+    for a in fleet:
+        gateway.agent_cache.heartbeat(a["agent_id"], "ONLINE", a["lat"], a["lon"], a["radius"], a["loadout"])
+        slow = rng.random() < args.slow_share
+        ack_ms = args.ack_timeout * 1000 * rng.uniform(1.5, 3.0) if slow else rng.uniform(5, args.ack_timeout * 500)
+        await gateway.manager.connect(a["agent_id"], FakeAgentSocket(a["agent_id"], gateway, ack_ms, report), gateway.ACK_PROTOCOL)
+
+    times, results = [], Counter()
+
+    async def incident(i):
+        payload = gateway.WebhookPayload(lat=i["lat"], lon=i["lon"], required_gear=i["required_gear"], bounty=f"${i['max_budget']:.2f}")
+        start = time.perf_counter()
+        result = await gateway.dispatch_mission(payload)
+        times.append((time.perf_counter() - start) * 1000)
+        results[result["status"].split(":")[0]] += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(incident(i) for i in incidents))
+    report["elapsed"] = time.perf_counter() - start
+    await asyncio.sleep(args.ack_timeout * 4)    # let the last acks and accepts land
+    report["times"], report["results"] = times, results
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stress test concurrent dispatch_mission auctions for double assignment")
+    parser.add_argument("--agents", type=int, default=5000)
+    parser.add_argument("--incidents", type=int, default=3000)
+    parser.add_argument("--ack-timeout", type=float, default=0.2)
+    parser.add_argument("--slow-share", type=float, default=0.2, help="Agents that ack after the timeout")
+    args = parser.parse_args()
+
+    fleet = fleet_sim.make_fleet(args.agents)
+    incidents = fleet_sim.make_incidents(args.incidents)
+    tmp = tempfile.TemporaryDirectory()
+    gateway = fleet_sim.import_gateway(tmp.name)
+    gateway.print = lambda *a, **k: None     # one line per dispatch drowns the report
+    report = asyncio.run(run(gateway, fleet, incidents, args))
+    gateway.repo.shutdown()
+
+    accepted = report["accepted"]
+    doubles = sum(1 for count in accepted.values() if count > 1)
+    p99 = statistics.quantiles(report["times"], n=100, method="inclusive")[98]
+    print(f"{args.incidents} simultaneous incidents | {args.agents} agents | ack timeout {args.ack_timeout * 1000:.0f} ms, "
+          f"{args.slow_share:.0%} slow ackers")
+    print(f"elapsed {report['elapsed']:.2f}s ({args.incidents / report['elapsed']:.0f} auctions/s), "
+          f"p50 {statistics.median(report['times']):.0f} ms, p99 {p99:.0f} ms")
+    print(f"outcomes: {dict(report['results'])}")
+    print(f"offers {report['offers']}, revoked {report['revoked']}, late accepts rejected {report['late_accepts']}, "
+          f"missions accepted {sum(accepted.values())} by {len(accepted)} agents")
+
+    if doubles or report["violations"]:
+        raise SystemExit(f"❌ FAIL: {doubles} agents accepted twice, {len(report['violations'])} offers to agents already holding one: "
+                         f"{report['violations'][:5]}")
+    print("✅ PASS: zero double-assignments, no agent offered two missions at once.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+import os
+import sys
+import time
+import argparse
+import tempfile
+import statistics
+import multiprocessing
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.abspath(os.path.join(BENCH_DIR, '..')))
+
+from backend.core.rate_limiter import SlidingWindowLimiter, SharedWindowLimiter
+from backend.core.replay_cache import ReplayCache, SharedReplayCache
+from backend.core.shared_state import SQLiteStateStore, SharedMessageLog
+
+# FLASK APP - CROSS-WORKER STATE STRESS TEST
+# Forks N processes standing in for gunicorn workers. All of them hammer the
+# same client IP and replay the same signed requests at once:
+#   local : each worker's in-memory limiter and replay cache (the default)
+#   shared: one SQLite WAL store opened by every worker (SHARED_STATE_URL)
+# Shared mode must admit exactly one quota and one use per signature in total.
+# Then times single-request overhead of each backend.
+# ----------------------------------------------------
+
+FROZEN_NOW = 1_700_000_030.0   # mid-window, so the run never straddles a rate limit boundary
+
+
+def worker(mode, path, limit, attempts, signatures, barrier, results):
+    clock = lambda: FROZEN_NOW  # noqa: E731
+    if mode == "shared":
+        store = SQLiteStateStore(path, clock=clock)
+        limiter, replay = SharedWindowLimiter(store, clock=clock), SharedReplayCache(store)
+        messages = SharedMessageLog(store, "daemon")
+    else:
+        limiter, replay, messages = SlidingWindowLimiter(clock=clock), ReplayCache(clock=clock), []
+
+    barrier.wait()
+    admitted = sum(limiter.hit("198.51.100.9", limit, 60) for _ in range(attempts))
+    consumed = sum(replay.add(sig, FROZEN_NOW) for sig in signatures)
+    messages.append(f"worker {os.getpid()} done")
+    results.put((admitted, consumed, len(list(messages))))
+
+
+def timed(fn, n):
+    samples = []
+    for i in range(n):
+        start = time.perf_counter()
+        fn(i)
+        samples.append((time.perf_counter() - start) * 1e6)
+    return statistics.median(samples), statistics.quantiles(samples, n=100, method="inclusive")[98]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prove rate limits and replay protection hold across worker processes")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--limit", type=int, default=100, help="Requests per 60s window for the hot IP")
+    parser.add_argument("--attempts", type=int, default=500, help="Requests each worker sends for the hot IP")
+    parser.add_argument("--signatures", type=int, default=2000, help="Signed requests every worker tries to replay")
+    parser.add_argument("--ops", type=int, default=20_000, help="Operations timed for the latency table")
+    args = parser.parse_args()
+
+    ctx = multiprocessing.get_context("fork")
+    signatures = [f"{i:064x}" for i in range(args.signatures)]
+    print(f"{args.workers} workers, hot IP limit {args.limit}/60s, {args.signatures} signatures replayed by every worker")
+    print(f"{'MODE':>7} | {'ADMITTED':>9} | {'CONSUMED':>9} | {'MESSAGES SEEN':>13} | {'SECONDS':>8}")
+    print("-" * 60)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "state.db")
+        SQLiteStateStore(path)
+        for mode in ("local", "shared"):
+            barrier, results = ctx.Barrier(args.workers), ctx.Queue()
+            procs = [ctx.Process(target=worker, args=(mode, path, args.limit, args.attempts, signatures, barrier, results))
+                     for _ in range(args.workers)]
+            start = time.perf_counter()
+            for p in procs:
+                p.start()
+            rows = [results.get() for _ in procs]
+            for p in procs:
+                p.join()
+            admitted = sum(r[0] for r in rows)
+            consumed = sum(r[1] for r in rows)
+            print(f"{mode:>7} | {admitted:>9} | {consumed:>9} | {max(r[2] for r in rows):>13} | {time.perf_counter() - start:>8.2f}")
+            if mode == "shared":
+                assert admitted == args.limit, f"{admitted} requests admitted for a quota of {args.limit}"
+                assert consumed == args.signatures, f"{consumed - args.signatures} signatures replayed across workers"
+
+        # Per-request overhead, one process, fresh keys each time.
+        store = SQLiteStateStore(path)
+        local_limiter, shared_limiter = SlidingWindowLimiter(), SharedWindowLimiter(store)
+        local_replay, shared_replay = ReplayCache(), SharedReplayCache(store)
+        now = time.time()
+        print(f"\n{'OPERATION':>22} | {'p50 us':>8} | {'p99 us':>8}")
+        print("-" * 44)
+        for label, fn in (
+            ("local rate limit", lambda i: local_limiter.hit(f"ip-{i}", 10, 60)),
+            ("shared rate limit", lambda i: shared_limiter.hit(f"ip-{i}", 10, 60)),
+            ("local signature", lambda i: local_replay.add(f"sig-{i}", now)),
+            ("shared signature", lambda i: shared_replay.add(f"sig-{i}", now)),
+        ):
+            p50, p99 = timed(fn, args.ops)
+            print(f"{label:>22} | {p50:>8.1f} | {p99:>8.1f}")
+    print(f"✅ Shared mode held one quota and one use per signature across {args.workers} processes.")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,14 +7,21 @@ import os
 import shutil
 import base64
 import time
-import glob 
 import html
+import random
+import asyncio
+import weakref
+import threading
+import anyio
+import httpx
 from duckduckgo_search import DDGS
-from mcp.server.fastmcp import FastMCP
+from mcp.server.fastmcp import FastMCP, Context
+from starlette.responses import JSONResponse
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_community.tools import DuckDuckGoSearchRun
-from langchain_community.document_loaders import PyPDFLoader 
 from backend.core.lightning_engine import LightningEngine
+from backend.core.result_cache import ResultCache, normalize_text
+from backend.core.doc_store import SandboxKnowledgeBase
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
@@ -22,6 +29,69 @@ logger = logging.getLogger("MCP-Server")
 
 mcp = FastMCP("LightningProxyServer")
 
+# ⚡ PERFORMANCE FIX: Video generation is async. Runway tasks are polled with backoff instead of
+# time.sleep(), so one render no longer stalls the event loop for every other tool caller.
+# Endpoints are overridable so the pipeline can run against benchmarks/fake_runway.py.
+IMAGEN_API_URL = os.getenv("IMAGEN_API_URL", "https://generativelanguage.googleapis.com/v1beta/models/imagen-4.0-generate-001:predict")
+RUNWAY_API_URL = os.getenv("RUNWAY_API_URL", "https://api.dev.runwayml.com/v1")
+RUNWAY_POLL_INITIAL = float(os.getenv("RUNWAY_POLL_INITIAL", 2))
+RUNWAY_POLL_MAX = float(os.getenv("RUNWAY_POLL_MAX", 15))
+RUNWAY_TIMEOUT = float(os.getenv("RUNWAY_TIMEOUT", 600))
+MEDIA_DIR = os.getenv("MEDIA_DIR", "/app/static")
+# ⚡ PERFORMANCE FIX: Identical paid queries inside a tool's TTL are answered from TOOL_CACHE instead of
+# redoing the API/LLM work. Lookups happen only after safe_verify_payment, so a hit still needs a settled invoice.
+# 🛑 SECURITY FIX: generate_image is never cached; a render belongs to the payer who bought it.
+# In memory unless RESULT_CACHE_DB names an SQLite file; expired results are swept every TOOL_CACHE_SWEEP seconds.
+TOOL_CACHE_TTLS = {
+    "get_crypto_spot_price": int(os.getenv("CACHE_TTL_SPOT_PRICE", 30)),
+    "live_web_search": int(os.getenv("CACHE_TTL_WEB_SEARCH", 900)),
+    "deep_market_analysis": int(os.getenv("CACHE_TTL_MARKET_ANALYSIS", 3600)),
+}
+TOOL_CACHE = ResultCache(TOOL_CACHE_TTLS)
+TOOL_CACHE_SWEEP = float(os.getenv("TOOL_CACHE_SWEEP", 60))
+
+def start_tool_cache_sweeper():
+    def loop():
+        while True:
+            time.sleep(TOOL_CACHE_SWEEP)
+            try:
+                TOOL_CACHE.expire()
+            except Exception as e:
+                logger.error(f"Tool cache sweep failed: {e}")
+
+    threading.Thread(target=loop, name="tool-cache-sweeper", daemon=True).start()
+
+@mcp.custom_route("/metrics/tool-cache", methods=["GET"])
+async def tool_cache_metrics(request):
+    return JSONResponse(TOOL_CACHE.stats())
+
+_HTTP_CLIENTS = weakref.WeakKeyDictionary()    # loop -> httpx.AsyncClient; building one loads the CA bundle (~50ms, blocking)
+
+def get_http_client():
+    loop = asyncio.get_running_loop()
+    if loop not in _HTTP_CLIENTS:
+        _HTTP_CLIENTS[loop] = httpx.AsyncClient(timeout=60, limits=httpx.Limits(max_connections=200, max_keepalive_connections=50))
+    return _HTTP_CLIENTS[loop]
+
+# ⚡ PERFORMANCE FIX: deep_market_analysis fans its data points out to Layer 5 specialists concurrently
+# (at most L5_CONCURRENCY at once, each capped at L5_TIMEOUT seconds) and reuses one LLM client per loop.
+L5_CONCURRENCY = int(os.getenv("L5_CONCURRENCY", 4))
+L5_TIMEOUT = float(os.getenv("L5_TIMEOUT", 90))
+_LLMS = weakref.WeakKeyDictionary()    # loop -> {temperature: client}; async clients are bound to their loop
+_SEARCH = None
+
+def get_llm(temperature):
+    llms = _LLMS.setdefault(asyncio.get_running_loop(), {})
+    if temperature not in llms:
+        llms[temperature] = ChatGoogleGenerativeAI(model="gemini-2.5-flash", temperature=temperature, api_key=os.environ.get("GOOGLE_API_KEY"))
+    return llms[temperature]
+
+def get_search():
+    global _SEARCH
+    if _SEARCH is None:
+        _SEARCH = DuckDuckGoSearchRun()
+    return _SEARCH
+
 lnd = LightningEngine()
 LND_CONNECTED = False
 LND_FAILED = False 
@@ -86,9 +156,14 @@ def get_crypto_spot_price(ticker: str, payment_hash: str = None) -> str:
         invoice_data = get_safe_invoice(15, f"Real-time price lookup for {ticker}")
         return f"ERROR: 402 Payment Required\nPlease pay this invoice:\nInvoice: {invoice_data['payment_request']}\nHash to use: {invoice_data['r_hash']}"
     if not safe_verify_payment(payment_hash): return "ERROR: 401 Unauthorized."
+    cache_args = {"ticker": normalize_text(ticker).upper()}
+    cached = TOOL_CACHE.get("get_crypto_spot_price", cache_args)
+    if cached is not None: return cached
     try:
         response = requests.get(f"https://api.coinbase.com/v2/prices/{ticker.upper()}-USD/spot")
-        return f"🔓 ACCESS GRANTED. The current live spot price of {ticker.upper()} is ${response.json()['data']['amount']} USD."
+        result = f"🔓 ACCESS GRANTED. The current live spot price of {ticker.upper()} is ${response.json()['data']['amount']} USD."
+        TOOL_CACHE.put("get_crypto_spot_price", cache_args, result)
+        return result
     except Exception as e: return f"Error fetching price: {e}"
 
 @mcp.tool()
@@ -97,10 +172,15 @@ def live_web_search(search_query: str, payment_hash: str = None) -> str:
         invoice_data = get_safe_invoice(20, f"Web Search: {search_query}")
         return f"ERROR: 402 Payment Required\nPlease pay this invoice:\nInvoice: {invoice_data['payment_request']}\nHash to use: {invoice_data['r_hash']}"
     if not safe_verify_payment(payment_hash): return "ERROR: 401 Unauthorized."
+    cache_args = {"search_query": normalize_text(search_query, casefold=True)}
+    cached = TOOL_CACHE.get("live_web_search", cache_args)
+    if cached is not None: return cached
     try:
         results = DDGS().text(search_query, max_results=3)
         formatted_results = "\n\n".join([f"📰 {res['title']}\n{res['body']}" for res in results])
-        return f"🔓 ACCESS GRANTED.\n--- Top Web Results for '{search_query}' ---\n{formatted_results}"
+        result = f"🔓 ACCESS GRANTED.\n--- Top Web Results for '{search_query}' ---\n{formatted_results}"
+        TOOL_CACHE.put("live_web_search", cache_args, result)
+        return result
     except Exception as e: return f"Search engine failed: {e}"
 
 @mcp.tool()
@@ -119,21 +199,41 @@ def generate_image(prompt: str, cost: int = 100, payment_hash: str = None) -> st
             data = response.json()
             if "predictions" in data and len(data["predictions"]) > 0:
                 filename = f"nano_banana_{uuid.uuid4().hex[:6]}.jpg"
-                os.makedirs("/app/static", exist_ok=True)
-                filepath = f"/app/static/{filename}"
+                os.makedirs(MEDIA_DIR, exist_ok=True)
+                filepath = os.path.join(MEDIA_DIR, filename)
                 with open(filepath, 'wb') as f: f.write(base64.b64decode(data["predictions"][0]["bytesBase64Encoded"]))
                 return f"🔓 ACCESS GRANTED. Masterpiece saved as '{filename}'!"
         return f"🔓 Image API failed with status {response.status_code}: {response.text}"
     except Exception as e: return f"Image generation failed: {e}"
 
+def _save_media(filename, data):
+    os.makedirs(MEDIA_DIR, exist_ok=True)
+    with open(os.path.join(MEDIA_DIR, filename), 'wb') as f: f.write(data)
+
+async def poll_runway_task(client, task_id, headers, ctx=None):
+    """Polls a Runway task until it finishes, backing off from RUNWAY_POLL_INITIAL to RUNWAY_POLL_MAX. Returns None on timeout."""
+    delay = RUNWAY_POLL_INITIAL
+    deadline = time.monotonic() + RUNWAY_TIMEOUT
+    while time.monotonic() < deadline:
+        # Jitter keeps concurrent renders from polling Runway in lockstep
+        await asyncio.sleep(min(delay * random.uniform(0.8, 1.2), max(deadline - time.monotonic(), 0)))
+        delay = min(delay * 2, RUNWAY_POLL_MAX)
+        status_res = await client.get(f"{RUNWAY_API_URL}/tasks/{task_id}", headers=headers)
+        status_data = status_res.json()
+        if status_data.get("status") in ("SUCCEEDED", "FAILED", "CANCELLED"):
+            return status_data
+        if ctx is not None and status_data.get("progress") is not None:
+            await ctx.report_progress(status_data["progress"], 1.0, f"Runway task {status_data.get('status', 'PENDING').lower()}")
+    return None
+
 # 🌟 FIX: Updated default cost to 500 (for 5 seconds at 100 SATS/sec) 🌟
 @mcp.tool()
-def generate_video(prompt: str, cost: int = 500, payment_hash: str = None) -> str:
+async def generate_video(prompt: str, cost: int = 500, payment_hash: str = None, ctx: Context = None) -> str:
     """PREMIUM TOOL: Generates an AI video using Runway ML Gen-3 via a Silent Seed pipeline."""
     if not payment_hash:
-        invoice_data = get_safe_invoice(cost, f"Generate Video: {prompt[:20]}...")
+        invoice_data = await asyncio.to_thread(get_safe_invoice, cost, f"Generate Video: {prompt[:20]}...")
         return f"ERROR: 402 Payment Required\nPlease pay this invoice:\nInvoice: {invoice_data['payment_request']}\nHash to use: {invoice_data['r_hash']}"
-    if not safe_verify_payment(payment_hash): return "ERROR: 401 Unauthorized."
+    if not await asyncio.to_thread(safe_verify_payment, payment_hash): return "ERROR: 401 Unauthorized."
     
     try:
         with open("secrets/runway.key", "r") as f:
@@ -142,13 +242,13 @@ def generate_video(prompt: str, cost: int = 500, payment_hash: str = None) -> st
         return "⚠️ Error: Missing Runway ML API key."
 
     try:
+        client = get_http_client()
         # 🌟 PHASE 1: THE SILENT SEED (GOOGLE IMAGEN) 🌟
         static_prompt = f"A pristine, high-quality static establishing shot of: {prompt}"
         api_key = os.environ.get("GOOGLE_API_KEY")
-        url = f"https://generativelanguage.googleapis.com/v1beta/models/imagen-4.0-generate-001:predict?key={api_key}"
         
         img_payload = {"instances": [{"prompt": static_prompt}], "parameters": {"aspectRatio": "16:9"}}
-        res_img = requests.post(url, headers={"Content-Type": "application/json"}, json=img_payload)
+        res_img = await client.post(IMAGEN_API_URL, params={"key": api_key}, headers={"Content-Type": "application/json"}, json=img_payload)
         
         if res_img.status_code != 200:
             return f"⚠️ Internal Engine Error: Silent Seed Generation failed. {res_img.text}"
@@ -175,67 +275,99 @@ def generate_video(prompt: str, cost: int = 500, payment_hash: str = None) -> st
             "duration": video_duration
         }
         
-        # ... (rest of the polling loop remains exactly the same) ...
-        res = requests.post("https://api.dev.runwayml.com/v1/image_to_video", json=payload, headers=headers)
+        res = await client.post(f"{RUNWAY_API_URL}/image_to_video", json=payload, headers=headers)
         if res.status_code != 200:
             return f"⚠️ Runway API Error: {res.text}"
             
         task_id = res.json().get("id")
         
-        for _ in range(60): 
-            time.sleep(10)
-            status_res = requests.get(f"https://api.dev.runwayml.com/v1/tasks/{task_id}", headers=headers)
-            status_data = status_res.json()
+        status_data = None
+        try:
+            status_data = await poll_runway_task(client, task_id, headers, ctx)
+        finally:
+            # Timed out, or the caller cancelled the request: stop the render instead of paying for an orphan
+            if status_data is None:
+                with anyio.CancelScope(shield=True):
+                    try: await client.delete(f"{RUNWAY_API_URL}/tasks/{task_id}", headers=headers)
+                    except httpx.HTTPError as e: logger.error(f"Runway task {task_id} cancel failed: {e}")
+        
+        if status_data is None:
+            return "⚠️ Error: Runway Generation timed out."
+        if status_data.get("status") != "SUCCEEDED":
+            return f"⚠️ Runway Task Failed: {status_data}"
             
-            if status_data.get("status") == "SUCCEEDED":
-                video_url = status_data["output"][0]
-                video_bytes = requests.get(video_url).content
-                filename = f"veo_video_{uuid.uuid4().hex[:6]}.mp4"
-                
-                os.makedirs("/app/static", exist_ok=True)
-                filepath = f"/app/static/{filename}"
-                with open(filepath, 'wb') as f: f.write(video_bytes)
-                return f"🔓 ACCESS GRANTED. Runway Gen-3 Video saved as '{filename}'!"
-                
-            elif status_data.get("status") == "FAILED":
-                return f"⚠️ Runway Task Failed: {status_data}"
-                
-        return "⚠️ Error: Runway Generation timed out."
+        video_url = status_data["output"][0]
+        video_bytes = (await client.get(video_url)).content
+        filename = f"veo_video_{uuid.uuid4().hex[:6]}.mp4"
+        await asyncio.to_thread(_save_media, filename, video_bytes)
+        return f"🔓 ACCESS GRANTED. Runway Gen-3 Video saved as '{filename}'!"
     except Exception as e: 
         return f"Video generation failed: {str(e)}"
 
-def layer_5_specialist(task: str, context: str, specialist_name: str, historical_context: str = "") -> str:
-    llm_l5 = ChatGoogleGenerativeAI(model="gemini-2.5-flash", temperature=0.2, api_key=os.environ.get("GOOGLE_API_KEY"))
+# ⚡ PERFORMANCE FIX: Sandbox PDFs are parsed once into a BM25 index; specialists get the best-matching passages
+# instead of every file re-parsed and truncated on each call.
+KNOWLEDGE_BASE = SandboxKnowledgeBase()
+
+def _sandbox_pdf_context(query):
+    pdf_context = ""
+    for name, page, text in KNOWLEDGE_BASE.search(query):
+        # 🛑 SECURITY FIX: Sanitize extracted text to prevent Prompt Injection tags
+        pdf_context += f"\n--- EXTRACTED FROM {name} (page {page}) ---\n{html.escape(text)}\n"
+    return pdf_context
+
+async def layer_5_specialist(task: str, context: str, specialist_name: str, historical_context: str = "") -> str:
     search_query = f"{context} {task}"
-    raw_data = DuckDuckGoSearchRun().invoke(search_query)
+    raw_data = await get_search().ainvoke(search_query)
     pdf_context = ""
     if specialist_name.upper() == "EVE":
-        # 🛑 SECURITY FIX: Restrict file reading to an isolated sandbox to prevent LFI (Data Poisoning)
-        sandbox_dir = os.path.abspath("/app/sandbox")
-        os.makedirs(sandbox_dir, exist_ok=True)
-        for pdf_file in glob.glob(os.path.join(sandbox_dir, "*.pdf")):
-            try:
-                pages = PyPDFLoader(pdf_file).load_and_split()
-                raw_text = ' '.join([p.page_content for p in pages])[:15000]
-                # 🛑 SECURITY FIX: Sanitize extracted text to prevent Prompt Injection tags
-                safe_text = html.escape(raw_text)
-                pdf_context += f"\n--- EXTRACTED FROM {os.path.basename(pdf_file)} ---\n{safe_text}\n"
-            except Exception: pass
+        pdf_context = await asyncio.to_thread(_sandbox_pdf_context, search_query)
             
     l5_prompt = f"You are {specialist_name}, an elite AI Specialist.\nContext: {context}\nTask: {task}\nWeb Data:\n{raw_data}\nPDF Data:\n{pdf_context}\nExecute your task professionally without hallucinating."
-    return llm_l5.invoke(l5_prompt).content
+    return (await get_llm(0.2).ainvoke(l5_prompt)).content
+
+async def run_specialists(tasks, context, specialist_name, historical_context=""):
+    """
+    Runs one Layer 5 specialist per data point, at most L5_CONCURRENCY at a time.
+    Returns (results, failures) in input order; a failed or timed-out data point gets None and a reason.
+    """
+    slots = asyncio.Semaphore(L5_CONCURRENCY)
+
+    async def one(task):
+        async with slots:
+            try:
+                return await asyncio.wait_for(layer_5_specialist(task, context, specialist_name, historical_context), L5_TIMEOUT), None
+            except asyncio.TimeoutError:
+                return None, f"timed out after {L5_TIMEOUT:.0f}s"
+            except Exception as e:
+                return None, str(e)
+
+    outcomes = await asyncio.gather(*(one(task) for task in tasks))
+    return [r for r, _ in outcomes], [reason for _, reason in outcomes]
 
 @mcp.tool()
-def deep_market_analysis(primary_topic: str, original_user_intent: str, specific_data_points_required: list[str], specialist_name: str = "Eve", historical_context: str = "", payment_hash: str = "") -> str:
+async def deep_market_analysis(primary_topic: str, original_user_intent: str, specific_data_points_required: list[str], specialist_name: str = "Eve", historical_context: str = "", payment_hash: str = "") -> str:
     dynamic_cost = 75
-    if not payment_hash or not safe_verify_payment(payment_hash):
-        invoice_data = get_safe_invoice(dynamic_cost, f"L5 Deployment ({specialist_name}): {primary_topic}")
+    if not payment_hash or not await asyncio.to_thread(safe_verify_payment, payment_hash):
+        invoice_data = await asyncio.to_thread(get_safe_invoice, dynamic_cost, f"L5 Deployment ({specialist_name}): {primary_topic}")
         return f"402 Payment Required: Deploying {specialist_name} requires a {dynamic_cost} sat retainer:\nInvoice: {invoice_data['payment_request']}\nHash: {invoice_data['r_hash']}"
+    cache_args = {"primary_topic": normalize_text(primary_topic, casefold=True),
+                  "original_user_intent": normalize_text(original_user_intent, casefold=True),
+                  "specific_data_points_required": [normalize_text(req, casefold=True) for req in specific_data_points_required],
+                  "specialist_name": specialist_name.upper(), "historical_context": normalize_text(historical_context)}
+    cached = TOOL_CACHE.get("deep_market_analysis", cache_args)
+    if cached is not None: return cached
     try:
-        layer_5_results = [f"{layer_5_specialist(req, primary_topic, specialist_name, historical_context)}\n" for req in specific_data_points_required]
-        llm_alice = ChatGoogleGenerativeAI(model="gemini-2.5-flash", temperature=0.2, api_key=os.environ.get("GOOGLE_API_KEY"))
+        results, failures = await run_specialists(specific_data_points_required, primary_topic, specialist_name, historical_context)
+        if results and all(r is None for r in results):
+            return f"Layer 5 Sub-Agent failed during execution: {failures[0]}"
+        # Partial results still make a report; Alice is told which data points are missing
+        layer_5_results = [f"{r}\n" if r is not None else f"[No data for '{req}': {reason}]\n"
+                           for req, r, reason in zip(specific_data_points_required, results, failures)]
         alice_prompt = f"You are Alice, Layer 4 Manager.\nUser intent: {original_user_intent}\nL5 ({specialist_name}) returned:\n{''.join(layer_5_results)}\nFormat this directly for the user as an executive report."
-        return llm_alice.invoke(alice_prompt).content
+        result = (await get_llm(0.2).ainvoke(alice_prompt)).content
+        if not any(failures):
+            TOOL_CACHE.put("deep_market_analysis", cache_args, result)
+        return result
     except Exception as e: return f"Layer 5 Sub-Agent failed during execution: {str(e)}"
 
 if __name__ == "__main__":
@@ -250,4 +382,5 @@ if __name__ == "__main__":
 
     uvicorn.Config.__init__ = _patched_config_init
     
+    start_tool_cache_sweeper()
     mcp.run(transport="sse")
\ No newline at end of file
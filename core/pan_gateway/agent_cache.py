@@ -0,0 +1,195 @@
+import asyncio
+import logging
+from datetime import datetime, timezone
+from sqlalchemy.dialects.sqlite import insert
+
+from models import Agent, Wallet, AgentSession
+
+# PAN GATEWAY - WRITE-BEHIND AGENT STATE CACHE
+# "Heartbeats hit RAM. SQLite hears about it once a second."
+# ----------------------------------------------------
+
+# A row that keeps failing on its own is dropped after this many flushes
+# (the cache still holds its state; the next change re-queues it).
+MAX_ROW_RETRIES = 5
+MAX_SESSION_EVENTS = 100_000
+
+
+class AgentStateCache:
+    """
+    Authoritative in-memory table of agent telemetry (status, position, radius, loadout).
+    Heartbeats are O(1) dict writes that mark the agent dirty; the flush loop drains
+    the dirty set and writes every coalesced change in one batched transaction.
+    A separate change set feeds the dashboard delta stream on its own tick.
+    Non-telemetry columns (linked card, onboarding, Checkr) stay owned by the DB.
+    """
+
+    def __init__(self, session_factory, flush_interval: float = 1.0, on_change=None):
+        self.session_factory = session_factory
+        self.flush_interval = flush_interval
+        self.on_change = on_change
+        self.agents: dict[str, dict] = {}
+        self.dirty: set[str] = set()
+        self.new_agents: set[str] = set()
+        self.session_events: list[tuple[str, str, datetime]] = []
+        self.feed_changes: set[str] = set()
+        self.row_failures: dict[str, int] = {}
+        self.flushes = 0
+        self.rows_flushed = 0
+        self.rows_dropped = 0
+
+        logging.basicConfig(level=logging.INFO)
+        self.logger = logging.getLogger("PAN-AgentCache")
+
+    def __contains__(self, agent_id: str):
+        return agent_id in self.agents
+
+    def __len__(self):
+        return len(self.agents)
+
+    def get(self, agent_id: str):
+        return self.agents.get(agent_id)
+
+    def _changed(self, agent_id: str, state: dict, previous_status: str):
+        # ONLINE/OFFLINE transitions are kept in order so session analytics
+        # survive heartbeats being coalesced between flushes.
+        if state["status"] != previous_status and state["status"] in ("ONLINE", "OFFLINE"):
+            self.session_events.append((agent_id, state["status"], datetime.now(timezone.utc)))
+        self.dirty.add(agent_id)
+        self.feed_changes.add(agent_id)
+        if self.on_change:
+            self.on_change(agent_id, state)
+
+    def load(self):
+        """Warms the table from the `agents` rows on boot."""
+        with self.session_factory() as db:
+            for a in db.query(Agent).all():
+                state = {"status": a.status, "lat": a.lat, "lon": a.lon, "radius": a.radius, "loadout": a.loadout or {}}
+                self.agents[a.agent_id] = state
+                if self.on_change:
+                    self.on_change(a.agent_id, state)
+        self.logger.info(f"🛰️ Agent cache warmed with {len(self.agents)} agents.")
+
+    def heartbeat(self, agent_id: str, status: str, lat: float, lon: float, radius: float, loadout: dict) -> dict:
+        state = self.agents.get(agent_id)
+        if state is None:
+            state = self.agents[agent_id] = {}
+            self.new_agents.add(agent_id)
+        previous_status = state.get("status")
+
+        state["status"] = status
+        state["lat"] = lat
+        state["lon"] = lon
+        state["radius"] = radius
+        state["loadout"] = loadout or {}
+        self._changed(agent_id, state, previous_status)
+        return state
+
+    def set_status(self, agent_id: str, status: str) -> bool:
+        state = self.agents.get(agent_id)
+        if state is None:
+            return False
+        previous_status = state["status"]
+        state["status"] = status
+        self._changed(agent_id, state, previous_status)
+        return True
+
+    def snapshot(self, live_only: bool = False) -> dict:
+        return {
+            agent_id: dict(state) for agent_id, state in self.agents.items()
+            if not live_only or state["status"] != "OFFLINE"
+        }
+
+    def drain_feed(self) -> dict:
+        """Agents whose telemetry changed since the last feed tick."""
+        changed = {agent_id: dict(self.agents[agent_id]) for agent_id in self.feed_changes}
+        self.feed_changes = set()
+        return changed
+
+    def drain(self):
+        """Swaps out the dirty set. Must run on the event loop thread."""
+        batch = {agent_id: dict(self.agents[agent_id]) for agent_id in self.dirty}
+        new_ids = self.new_agents & batch.keys()
+        events = self.session_events
+        self.dirty = set()
+        self.new_agents -= new_ids
+        self.session_events = []
+        return batch, new_ids, events
+
+    def write_batch(self, batch: dict, new_ids: set, events: list):
+        """Persists one drained batch in a single transaction. Safe to run in a worker thread."""
+        with self.session_factory() as db:
+            # Upserts: the row may already exist even for an agent this process
+            # first saw (another worker or an admin tool created it).
+            if batch:
+                stmt = insert(Agent)
+                db.execute(stmt.on_conflict_do_update(index_elements=[Agent.agent_id], set_={
+                    column: stmt.excluded[column] for column in ("status", "lat", "lon", "radius", "loadout")
+                }), [{"agent_id": agent_id, **state} for agent_id, state in batch.items()])
+            if new_ids:
+                db.execute(insert(Wallet).on_conflict_do_nothing(index_elements=[Wallet.agent_id]),
+                           [{"agent_id": agent_id, "balance": 0.0} for agent_id in new_ids])
+
+            # Analytics: Session Time Tracking, replayed from the status transitions
+            for agent_id, status, at in events:
+                active_session = db.query(AgentSession).filter(AgentSession.agent_id == agent_id, AgentSession.went_offline_at == None).first()
+                if status == "ONLINE" and not active_session:
+                    db.add(AgentSession(agent_id=agent_id, went_online_at=at))
+                    db.flush()
+                elif status == "OFFLINE" and active_session:
+                    active_session.went_offline_at = at
+                    db.flush()
+
+            db.commit()
+
+    def write_rows(self, batch: dict, new_ids: set, events: list) -> list[str]:
+        """Persists a batch that failed as a whole one agent at a time. Returns the agents that still failed."""
+        failed = []
+        for agent_id, state in batch.items():
+            try:
+                self.write_batch({agent_id: state}, new_ids & {agent_id}, [e for e in events if e[0] == agent_id])
+            except Exception as e:
+                self.logger.error(f"❌ Agent cache row {agent_id} failed: {e}")
+                failed.append(agent_id)
+        return failed
+
+    async def flush(self) -> int:
+        if not self.dirty:
+            return 0
+
+        batch, new_ids, events = self.drain()
+        try:
+            await asyncio.to_thread(self.write_batch, batch, new_ids, events)
+            failed = []
+        except Exception as e:
+            # Isolate the rows at fault so one bad agent can't hold back everyone else's state.
+            self.logger.error(f"❌ Agent cache flush failed ({len(batch)} rows), retrying row by row: {e}")
+            failed = await asyncio.to_thread(self.write_rows, batch, new_ids, events)
+
+        for agent_id in batch.keys() - set(failed):
+            self.row_failures.pop(agent_id, None)
+        requeue = set()
+        for agent_id in failed:
+            self.row_failures[agent_id] = self.row_failures.get(agent_id, 0) + 1
+            if self.row_failures[agent_id] < MAX_ROW_RETRIES:
+                requeue.add(agent_id)
+            else:
+                self.logger.error(f"❌ Dropping agent {agent_id} from the flush after {MAX_ROW_RETRIES} failures.")
+                del self.row_failures[agent_id]
+                self.rows_dropped += 1
+
+        # Re-queue what failed; newer heartbeats for these agents simply overwrite it.
+        self.dirty.update(requeue)
+        self.new_agents.update(new_ids & requeue)
+        self.session_events[:0] = [e for e in events if e[0] in requeue]
+        if len(self.session_events) > MAX_SESSION_EVENTS:
+            del self.session_events[:len(self.session_events) - MAX_SESSION_EVENTS]
+
+        self.flushes += 1
+        self.rows_flushed += len(batch) - len(failed)
+        return len(batch) - len(failed)
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
@@ -0,0 +1,289 @@
+import math
+import heapq
+import bisect
+import numpy as np
+
+# PAN GATEWAY - AUCTION ENGINE (v1)
+# "Only wake up the agents who can actually get there."
+# ----------------------------------------------------
+# In-memory index over ONLINE agent bids. AgentGrid is the lat/lon cell
+# geometry; BidBook keeps per-region, per-gear price ladders on top of it so
+# the reverse auction walks the cheapest bids around the stranded AV first and
+# stops at the first agent in range, instead of scanning the whole fleet out
+# of SQLite. Concurrent auctions need no lock: ranking and reserving the
+# winners happen in one synchronous step on the event loop.
+# FleetArrays is the full-fleet reference: one vectorized NumPy pass that scores
+# every agent, used to check BidBook.ranked() (benchmarks/bench_bid_book.py)
+# where a scalar scan over a large fleet would be too slow to run per auction.
+
+EARTH_RADIUS_MILES = 3958.8
+MILES_PER_DEG_LAT = 69.0
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    R = EARTH_RADIUS_MILES
+    dlat = math.radians(lat2 - lat1)
+    dlon = math.radians(lon2 - lon1)
+    a = math.sin(dlat / 2)**2 + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(dlon / 2)**2
+    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+    return R * c
+
+
+class AgentGrid:
+    """Uniform lat/lon cell grid: maps positions to cells and search boxes to cell ranges."""
+
+    def __init__(self, cell_deg: float = 0.1):
+        self.cell_deg = cell_deg
+        self.lat_cells = int(math.ceil(180 / cell_deg))
+        self.lon_cells = int(math.ceil(360 / cell_deg))
+
+    def cell_for(self, lat: float, lon: float) -> tuple[int, int]:
+        row = min(int((lat + 90) // self.cell_deg), self.lat_cells - 1)
+        col = int((lon + 180) // self.cell_deg) % self.lon_cells
+        return row, col
+
+    def cell_ranges(self, lat: float, lon: float, radius: float):
+        """Row span and column list of the cells overlapping the `radius`-mile box around (lat, lon)."""
+        dlat = radius / MILES_PER_DEG_LAT
+        lat_lo, lat_hi = max(lat - dlat, -90.0), min(lat + dlat, 90.0)
+        row_lo, _ = self.cell_for(lat_lo, lon)
+        row_hi, _ = self.cell_for(lat_hi, lon)
+
+        # Longitude degrees shrink towards the poles; size the box at the widest latitude.
+        cos_lat = math.cos(math.radians(max(abs(lat_lo), abs(lat_hi))))
+        if cos_lat <= 1e-9 or radius / (MILES_PER_DEG_LAT * cos_lat) >= 180:
+            cols = range(self.lon_cells)
+        else:
+            dlon = radius / (MILES_PER_DEG_LAT * cos_lat)
+            _, col_lo = self.cell_for(lat, lon - dlon)
+            span = int(math.ceil(2 * dlon / self.cell_deg)) + 1
+            cols = [(col_lo + i) % self.lon_cells for i in range(min(span, self.lon_cells))]
+        return row_lo, row_hi, cols
+
+
+def haversine_np(lat1, lon1, lat2: np.ndarray, lon2: np.ndarray) -> np.ndarray:
+    """Vectorized haversine: one point against arrays of points, in miles."""
+    lat1, lon1 = np.radians(lat1), np.radians(lon1)
+    lat2, lon2 = np.radians(lat2), np.radians(lon2)
+    a = np.sin((lat2 - lat1) / 2)**2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2)**2
+    return EARTH_RADIUS_MILES * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+
+class FleetArrays:
+    """
+    Struct-of-arrays mirror of the dispatchable fleet.
+    Agents own a slot in contiguous lat/lon/radius columns plus one bid column
+    per gear type (inf = gear not carried). Freed slots are recycled.
+    """
+
+    def __init__(self, capacity: int = 1024):
+        self.capacity = capacity
+        self.lat = np.zeros(capacity)
+        self.lon = np.zeros(capacity)
+        self.radius = np.zeros(capacity)
+        self.bids: dict[str, np.ndarray] = {}
+        self.slots: dict[str, int] = {}
+        self.agent_ids: list = [None] * capacity
+        self._free: list[int] = list(range(capacity - 1, -1, -1))
+
+    def __len__(self):
+        return len(self.slots)
+
+    def _grow(self):
+        old = self.capacity
+        self.capacity = old * 2
+        for name in ("lat", "lon", "radius"):
+            col = np.zeros(self.capacity)
+            col[:old] = getattr(self, name)
+            setattr(self, name, col)
+        for gear, col in self.bids.items():
+            grown = np.full(self.capacity, np.inf)
+            grown[:old] = col
+            self.bids[gear] = grown
+        self.agent_ids.extend([None] * old)
+        self._free.extend(range(self.capacity - 1, old - 1, -1))
+
+    def upsert(self, agent_id: str, lat: float, lon: float, radius: float, loadout: dict):
+        slot = self.slots.get(agent_id)
+        if slot is None:
+            if not self._free:
+                self._grow()
+            slot = self._free.pop()
+            self.slots[agent_id] = slot
+            self.agent_ids[slot] = agent_id
+
+        self.lat[slot] = lat
+        self.lon[slot] = lon
+        self.radius[slot] = radius
+
+        loadout = loadout or {}
+        for gear, col in self.bids.items():
+            col[slot] = float(loadout[gear]) if gear in loadout else np.inf
+        for gear in loadout.keys() - self.bids.keys():
+            col = np.full(self.capacity, np.inf)
+            col[slot] = float(loadout[gear])
+            self.bids[gear] = col
+
+    def remove(self, agent_id: str):
+        slot = self.slots.pop(agent_id, None)
+        if slot is None:
+            return
+        for col in self.bids.values():
+            col[slot] = np.inf
+        self.agent_ids[slot] = None
+        self._free.append(slot)
+
+    def slots_for(self, agent_ids) -> np.ndarray:
+        slots = self.slots
+        return np.fromiter((slots[a] for a in agent_ids if a in slots), dtype=np.intp)
+
+    def select_winner(self, lat: float, lon: float, required_gear: str, max_budget: float, slots: np.ndarray = None):
+        """
+        The auction's winner, scored in one pass over `slots` (defaults to the whole
+        fleet): the head of BidBook.ranked(). Returns (agent_id, bid, distance) or None.
+        """
+        bid_col = self.bids.get(required_gear)
+        if bid_col is None or not self.slots:
+            return None
+        if slots is None:
+            # Freed slots carry inf bids, so scoring every column is safe.
+            slots = slice(None)
+        elif not len(slots):
+            return None
+
+        bids = bid_col[slots]
+        dist = haversine_np(lat, lon, self.lat[slots], self.lon[slots])
+        eligible = (bids <= max_budget) & (dist <= self.radius[slots])
+        if not eligible.any():
+            return None
+
+        # Cheapest bid wins; among equal bids the closest agent takes it.
+        bids = np.where(eligible, bids, np.inf)
+        tied = bids == bids.min()
+        best = int(np.argmin(np.where(tied, dist, np.inf)))
+
+        slot = best if isinstance(slots, slice) else int(slots[best])
+        return self.agent_ids[slot], float(bids[best]), float(dist[best])
+
+
+class BidBook:
+    """
+    Price-ordered bid ladders, one per (region, gear). A region is a square of
+    `cells_per_region` grid cells, so an auction only merges the ladders its
+    search box touches. Ladders are sorted lists of (bid, agent_id) and are
+    only re-sorted when an agent's loadout actually changes; movement inside
+    a region just updates the position table. `max_radius` is the largest
+    service radius listed, which bounds how far an auction has to search.
+    """
+
+    def __init__(self, grid: AgentGrid, cells_per_region: int = 5):
+        self.grid = grid
+        self.cells_per_region = cells_per_region
+        self.ladders: dict[tuple[int, int], dict[str, list[tuple[float, str]]]] = {}
+        self.positions: dict[str, tuple[float, float, float]] = {}
+        self.listings: dict[str, tuple[tuple[int, int], dict[str, float]]] = {}
+        self.max_radius = 0.0
+        self._radius_counts: dict[float, int] = {}
+
+    def __len__(self):
+        return len(self.listings)
+
+    def __contains__(self, agent_id: str):
+        return agent_id in self.listings
+
+    def region_for(self, lat: float, lon: float) -> tuple[int, int]:
+        row, col = self.grid.cell_for(lat, lon)
+        return row // self.cells_per_region, col // self.cells_per_region
+
+    def upsert(self, agent_id: str, lat: float, lon: float, radius: float, loadout: dict):
+        previous = self.positions.get(agent_id)
+        if previous is None or previous[2] != radius:
+            if previous is not None:
+                self._forget_radius(previous[2])
+            self._radius_counts[radius] = self._radius_counts.get(radius, 0) + 1
+            if radius > self.max_radius:
+                self.max_radius = radius
+        self.positions[agent_id] = (lat, lon, radius)
+        region = self.region_for(lat, lon)
+        bids = {gear: float(bid) for gear, bid in (loadout or {}).items()}
+        if self.listings.get(agent_id) == (region, bids):
+            return
+
+        self._unlist(agent_id)
+        ladders = self.ladders.setdefault(region, {})
+        for gear, bid in bids.items():
+            bisect.insort(ladders.setdefault(gear, []), (bid, agent_id))
+        self.listings[agent_id] = (region, bids)
+
+    def remove(self, agent_id: str):
+        self._unlist(agent_id)
+        position = self.positions.pop(agent_id, None)
+        if position is not None:
+            self._forget_radius(position[2])
+
+    def _forget_radius(self, radius: float):
+        # O(1) apart from the rare max-radius recount
+        self._radius_counts[radius] -= 1
+        if not self._radius_counts[radius]:
+            del self._radius_counts[radius]
+            if radius == self.max_radius:
+                self.max_radius = max(self._radius_counts, default=0.0)
+
+    def _unlist(self, agent_id: str):
+        listing = self.listings.pop(agent_id, None)
+        if listing is None:
+            return
+        region, bids = listing
+        ladders = self.ladders[region]
+        for gear, bid in bids.items():
+            ladder = ladders[gear]
+            del ladder[bisect.bisect_left(ladder, (bid, agent_id))]
+            if not ladder:
+                del ladders[gear]
+        if not ladders:
+            del self.ladders[region]
+
+    def ladders_for(self, lat: float, lon: float, radius: float, required_gear: str):
+        row_lo, row_hi, cols = self.grid.cell_ranges(lat, lon, radius)
+        k = self.cells_per_region
+        regions = {(row // k, col // k) for row in range(row_lo, row_hi + 1) for col in cols}
+        ladders = []
+        for region in regions:
+            ladder = self.ladders.get(region, {}).get(required_gear)
+            if ladder:
+                ladders.append(ladder)
+        return ladders
+
+    def ranked(self, lat: float, lon: float, required_gear: str, max_budget: float, radius: float = None,
+               limit: int = 1, eligible=None) -> list[tuple[str, float, float]]:
+        """
+        Up to `limit` in-range agents as (agent_id, bid, distance), ordered like
+        the auction: cheapest bid first, ties to the closest. Walks the merged
+        ladders cheapest-first and stops once the price rises past the
+        `limit`-th in-range bid (or the budget). `eligible`, if given, is a
+        predicate on agent_id checked before any distance math.
+        """
+        if radius is None:
+            radius = self.max_radius
+        ladders = self.ladders_for(lat, lon, radius, required_gear)
+        if not ladders:
+            return []
+        bids = ladders[0] if len(ladders) == 1 else heapq.merge(*ladders)
+
+        found = []
+        for bid, agent_id in bids:
+            if bid > max_budget or (len(found) >= limit and bid > found[limit - 1][1]):
+                break
+            if eligible is not None and not eligible(agent_id):
+                continue
+            agent_lat, agent_lon, agent_radius = self.positions[agent_id]
+            # Cheap latitude reject before paying for the haversine.
+            if abs(agent_lat - lat) * MILES_PER_DEG_LAT > agent_radius:
+                continue
+            dist = haversine(lat, lon, agent_lat, agent_lon)
+            if dist <= agent_radius:
+                found.append((agent_id, bid, dist))
+
+        found.sort(key=lambda c: (c[1], c[2]))
+        return found[:limit]
+
@@ -3,11 +3,14 @@ from fastapi.responses import HTMLResponse, JSONResponse
 from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
+from typing import Literal, Optional
+from collections import OrderedDict, deque
+from sqlalchemy.exc import IntegrityError
 import json
-import math
+import time
 import hashlib
-from datetime import datetime, timezone
 import asyncio
+import statistics
 
 # --- SECURITY & RATE LIMITING ---
 from slowapi import Limiter, _rate_limit_exceeded_handler
@@ -15,82 +18,61 @@ from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
 
 # --- SQLALCHEMY DATABASE ---
-from sqlalchemy import create_engine, Column, String, Float, Integer, DateTime, ForeignKey, JSON, Boolean, desc
-from sqlalchemy.orm import declarative_base, sessionmaker, Session
-
-# 1. Database Configuration (Easily swappable to PostgreSQL)
-SQLALCHEMY_DATABASE_URL = "sqlite:///./pan_command.db"
-engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-Base = declarative_base()
-
-# 2. ORM Models (The Analytics Schema)
-class Agent(Base):
-    __tablename__ = "agents"
-    agent_id = Column(String, primary_key=True, index=True)
-    status = Column(String, default="OFFLINE") # ONLINE, BUSY, OFFLINE
-    lat = Column(Float, nullable=True)
-    lon = Column(Float, nullable=True)
-    radius = Column(Float, default=5.0)
-    loadout = Column(JSON, default={})
-    linked_card = Column(String, nullable=True)
-    reputation_score = Column(Float, default=5.0)
-    onboarding_status = Column(String, default="UNVERIFIED") # UNVERIFIED, PENDING, APPROVED, REJECTED
-    checkr_candidate_id = Column(String, nullable=True) # The ID linking this agent to Checkr's vault
-    bg_check_status = Column(String, nullable=True) # CLEAR, CONSIDER, SUSPENDED
-
-class Wallet(Base):
-    __tablename__ = "wallets"
-    agent_id = Column(String, primary_key=True)
-    balance = Column(Float, default=0.0)
-
-class Transaction(Base):
-    __tablename__ = "transactions"
-    id = Column(String, primary_key=True)
-    agent_id = Column(String, index=True)
-    date = Column(String)
-    amount = Column(String)
-    description = Column(String)
-
-class AgentSession(Base):
-    __tablename__ = "agent_sessions"
-    id = Column(Integer, primary_key=True, autoincrement=True)
-    agent_id = Column(String, index=True)
-    went_online_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
-    went_offline_at = Column(DateTime, nullable=True)
-
-class Mission(Base):
-    __tablename__ = "missions"
-    id = Column(Integer, primary_key=True, autoincrement=True)
-    fleet_id = Column(String, default="VANGUARD-01")
-    category_id = Column(String) # e.g., ERR-DOOR
-    bounty_amount = Column(Float)
-    status = Column(String, default="PENDING") # PENDING, ACTIVE, COMPLETED, ABORTED_AGENT, ABORTED_AV
-    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
-    accepted_at = Column(DateTime, nullable=True)
-    resolved_at = Column(DateTime, nullable=True)
-    assigned_agent_id = Column(String, nullable=True)
-
-class DispatchEvent(Base):
-    __tablename__ = "dispatch_events"
-    id = Column(Integer, primary_key=True, autoincrement=True)
-    mission_id = Column(Integer, index=True)
-    agent_id = Column(String, index=True)
-    dispatched_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
-    agent_response = Column(String, default="PENDING") # ACCEPTED, DECLINED, IGNORED
+from models import engine, SessionLocal, Base, upgrade_schema
+import repository
+from repository import Repository
+
+# --- DISPATCH INDEX & AGENT STATE ---
+import contextlib
+from contextlib import asynccontextmanager
+from auction_engine import AgentGrid, BidBook
+from agent_cache import AgentStateCache
 
 Base.metadata.create_all(bind=engine)
+upgrade_schema(engine)
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+# In-memory index of dispatchable agents on per-region, per-gear price ladders,
+# warmed from the DB on boot and kept current by telemetry so auctions never
+# scan the full fleet. Agents holding an unanswered dispatch stay out of the
+# index until they accept, go offline or the offer is closed, so no agent can
+# win two missions.
+bid_book = BidBook(AgentGrid())
+dispatched_agents: set[str] = set()
+
+def sync_bid_book(agent_id: str, state: dict):
+    if state["status"] != 'ONLINE':
+        dispatched_agents.discard(agent_id)
+
+    if state["status"] == 'ONLINE' and state["lat"] is not None and state["lon"] is not None and agent_id not in dispatched_agents:
+        bid_book.upsert(agent_id, state["lat"], state["lon"], state["radius"] or 0.0, state["loadout"])
+    else:
+        bid_book.remove(agent_id)
+
+# The cache is the source of truth for agent telemetry; every change is
+# mirrored into the dispatch index and written behind to SQLite in batches.
+agent_cache = AgentStateCache(SessionLocal, flush_interval=1.0, on_change=sync_bid_book)
+agent_cache.load()
+
+# All request-path DB work is offloaded to the repository's thread pool.
+repo = Repository(SessionLocal)
 
 # --- APP SETUP ---
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    flusher = asyncio.create_task(agent_cache.run())
+    feed = asyncio.create_task(agent_feed_loop())
+    pinger = asyncio.create_task(manager.run_pings())
+    sweeper = asyncio.create_task(offer_expiry_loop())
+    yield
+    sweeper.cancel()
+    pinger.cancel()
+    feed.cancel()
+    flusher.cancel()
+    await agent_cache.flush()
+    repo.shutdown()
+
 limiter = Limiter(key_func=get_remote_address)
-app = FastAPI(title="PAN Central Dispatch Gateway")
+app = FastAPI(title="PAN Central Dispatch Gateway", lifespan=lifespan)
 app.state.limiter = limiter
 app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
 
@@ -142,67 +124,114 @@ class MissionAccept(BaseModel):
 
 @app.post("/v1/agent/status")
 @limiter.limit("60/minute")
-async def update_agent_status(request: Request, payload: StatusUpdate, db: Session = Depends(get_db), auth: str = Depends(verify_agent_token)):
+async def update_agent_status(request: Request, payload: StatusUpdate, auth: str = Depends(verify_agent_token)):
     if not verify_ecdsa_signature(payload.dict(), payload.signature):
         raise HTTPException(status_code=403, detail="Invalid cryptographic signature.")
         
-    # 1. Update Agent Core State
-    agent = db.query(Agent).filter(Agent.agent_id == payload.agentId).first()
-    if not agent:
-        agent = Agent(agent_id=payload.agentId)
-        db.add(agent)
-        # Initialize Wallet
-        db.add(Wallet(agent_id=payload.agentId, balance=0.0))
-    
-    agent.status = payload.status
-    agent.lat = payload.latitude
-    agent.lon = payload.longitude
-    agent.radius = payload.radius
-    agent.loadout = payload.loadout
-    
-    # 2. Analytics: Session Time Tracking
-    if payload.status == "ONLINE":
-        # Create a new session if one isn't open
-        active_session = db.query(AgentSession).filter(AgentSession.agent_id == payload.agentId, AgentSession.went_offline_at == None).first()
-        if not active_session:
-            db.add(AgentSession(agent_id=payload.agentId))
-    elif payload.status == "OFFLINE":
-        # Close open sessions
-        active_session = db.query(AgentSession).filter(AgentSession.agent_id == payload.agentId, AgentSession.went_offline_at == None).first()
-        if active_session:
-            active_session.went_offline_at = datetime.now(timezone.utc)
-
-    db.commit()
+    # O(1) write to the agent cache; the DB row, wallet and session analytics
+    # are written behind by the flush loop.
+    agent_cache.heartbeat(payload.agentId, payload.status, payload.latitude, payload.longitude, payload.radius, payload.loadout)
     return {"acknowledged": True}
 
 @app.post("/v1/mission/accept")
 @limiter.limit("10/minute")
-async def accept_mission(request: Request, payload: MissionAccept, db: Session = Depends(get_db), auth: str = Depends(verify_agent_token)):
-    agent = db.query(Agent).filter(Agent.agent_id == payload.agentId).first()
-    if agent:
-        agent.status = 'BUSY'
-        
-        # Analytics: Correlate Accept to the Dispatch Event
-        dispatch_event = db.query(DispatchEvent).filter(
-            DispatchEvent.agent_id == payload.agentId, 
-            DispatchEvent.agent_response == "PENDING"
-        ).order_by(desc(DispatchEvent.dispatched_at)).first()
-        
-        if dispatch_event:
-            dispatch_event.agent_response = "ACCEPTED"
-            mission = db.query(Mission).filter(Mission.id == dispatch_event.mission_id).first()
-            if mission:
-                mission.status = "ACTIVE"
-                mission.accepted_at = datetime.now(timezone.utc)
-                mission.assigned_agent_id = payload.agentId
-
-        db.commit()
+async def accept_mission(request: Request, payload: MissionAccept, auth: str = Depends(verify_agent_token)):
+    # Only an open offer can be accepted; a revoked or expired one is gone.
+    offer = take_offer(payload.agentId)
+    if offer is None:
+        raise HTTPException(status_code=409, detail="No open mission offer. It expired or was revoked.")
+    mission_id, _ = offer
+
+    # Accepting over HTTP also acknowledges the offer if it is still waiting on a socket ACK.
+    manager.ack(payload.agentId, mission_id)
+    if not await repo.run(repository.accept_dispatch, payload.agentId, mission_id):
+        release_agent(payload.agentId)
+        await manager.revoke_mission(payload.agentId, mission_id)
+        raise HTTPException(status_code=409, detail="No open mission offer. It expired or was revoked.")
+    if agent_cache.set_status(payload.agentId, 'BUSY'):
         print(f"白 MISSION LOCKED: {payload.agentId[:8]}*** is now en route.")
         return {"status": "accepted"}
     return {"status": "error: agent not found"}
 
+# --- OFFLINE SYNC (batched replay of queued field events) ---
+MAX_SYNC_BATCH = 1000
+RECENT_SYNC_KEYS = 200_000
+
+class SyncEvent(BaseModel):
+    key: str = Field(..., min_length=8, max_length=128)
+    type: Literal["telemetry", "status", "accept"]
+    status: Optional[str] = None
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+    radius: Optional[float] = None
+    loadout: dict[str, float] = {}
+
+class SyncBatch(BaseModel):
+    agentId: str
+    events: list[SyncEvent] = Field(..., min_length=1, max_length=MAX_SYNC_BATCH)
+    signature: str
+
+# Bounded LRU of keys applied by this process: retried uploads are rejected
+# without a DB round-trip. The sync_receipts PK stays the source of truth.
+recent_sync_keys: OrderedDict[tuple[str, str], None] = OrderedDict()
+
+def remember_sync_keys(agent_id: str, keys):
+    for key in keys:
+        recent_sync_keys[(agent_id, key)] = None
+    while len(recent_sync_keys) > RECENT_SYNC_KEYS:
+        recent_sync_keys.popitem(last=False)
+
+def replay_sync_event(agent_id: str, event: dict):
+    if event["type"] == "telemetry":
+        agent_cache.heartbeat(agent_id, event["status"], event["latitude"], event["longitude"], event["radius"], event["loadout"])
+    elif event["type"] == "status":
+        agent_cache.set_status(agent_id, event["status"])
+    elif event["type"] == "accept" and event["accepted"]:
+        agent_cache.set_status(agent_id, 'BUSY')
+
+@app.post("/v1/agent/sync")
+@limiter.limit("30/minute")
+async def sync_agent_events(request: Request, payload: SyncBatch, auth: str = Depends(verify_agent_token)):
+    body = payload.model_dump()
+    if not verify_ecdsa_signature(body, payload.signature):
+        raise HTTPException(status_code=403, detail="Invalid cryptographic signature.")
+
+    events = [e for e in body["events"] if (payload.agentId, e["key"]) not in recent_sync_keys]
+    for e in events:
+        if e["type"] == "telemetry" and None in (e["status"], e["latitude"], e["longitude"], e["radius"]):
+            raise HTTPException(status_code=400, detail=f"Telemetry event {e['key']} is missing fields.")
+        if e["type"] == "status" and not e["status"]:
+            raise HTTPException(status_code=400, detail=f"Status event {e['key']} is missing a status.")
+
+    fresh = []
+    if events:
+        # A queued accept can only take the agent's current open offer.
+        offer = take_offer(payload.agentId) if any(e["type"] == "accept" for e in events) else None
+        try:
+            fresh = await repo.run(repository.apply_sync_batch, payload.agentId, events, offer and offer[0])
+        except IntegrityError:
+            # A concurrent upload of the same keys won the race; a retry will see them as duplicates.
+            restore_offer(payload.agentId, offer)
+            raise HTTPException(status_code=409, detail="Overlapping sync in progress. Retry the batch.")
+        if any(e["type"] == "accept" and e["accepted"] for e in fresh):
+            manager.ack(payload.agentId, offer[0])
+        else:
+            restore_offer(payload.agentId, offer)
+
+    # Receipts are committed; replay the new events into the cache in queue order.
+    # A telemetry fix superseded by the next one (same status) changes nothing
+    # the cache keeps, so runs of movement collapse to their last position.
+    for i, event in enumerate(fresh):
+        following = fresh[i + 1] if i + 1 < len(fresh) else None
+        if event["type"] == "telemetry" and following and following["type"] == "telemetry" and following["status"] == event["status"]:
+            continue
+        replay_sync_event(payload.agentId, event)
+    remember_sync_keys(payload.agentId, (e["key"] for e in body["events"]))
+
+    return {"status": "success", "applied": len(fresh), "duplicates": len(payload.events) - len(fresh)}
+
 @app.post("/v1/webhooks/checkr")
-async def checkr_webhook(request: Request, db: Session = Depends(get_db)):
+async def checkr_webhook(request: Request):
     payload = await request.json()
     
     # 1. Verify the webhook signature (prove it actually came from Checkr)
@@ -214,16 +243,7 @@ async def checkr_webhook(request: Request, db: Session = Depends(get_db)):
         candidate_id = payload["data"]["object"]["candidate_id"]
         status = payload["data"]["object"]["status"] # Will be "clear" or "consider"
         
-        agent = db.query(Agent).filter(Agent.checkr_candidate_id == candidate_id).first()
-        if agent:
-            agent.bg_check_status = status.upper()
-            if status == "clear":
-                agent.onboarding_status = "APPROVED"
-                # Send push notification to agent: "You are approved for the Mesa Sector!"
-            else:
-                agent.onboarding_status = "REJECTED" # Flagged for manual review
-                
-            db.commit()
+        await repo.run(repository.apply_checkr_report, candidate_id, status)
             
     return {"status": "received"}
 
@@ -231,27 +251,161 @@ async def checkr_webhook(request: Request, db: Session = Depends(get_db)):
 # ====================================================================
 # 2. LIVE DISPATCHER
 # ====================================================================
+# Agent sockets advertise their protocol on connect (?protocol=2). Protocol 2
+# clients answer an application-level PING with PONG (any inbound frame counts)
+# and ACK every MISSION frame by id; auctions only rank them while their socket
+# was heard from within LIVENESS_TIMEOUT_SECONDS. Older clients only listen:
+# they count as live while connected (uvicorn's WebSocket-level ping/pong closes
+# their dead sockets), are never sent PINGs, and a MISSION frame that went out
+# counts as acknowledged.
+ACK_PROTOCOL = 2
+PING_INTERVAL_SECONDS = 5.0
+LIVENESS_TIMEOUT_SECONDS = 12.0
+ACK_SAMPLES = 50
+
 class ConnectionManager:
-    def __init__(self):
+    def __init__(self, ping_interval: float = PING_INTERVAL_SECONDS, liveness_timeout: float = LIVENESS_TIMEOUT_SECONDS):
+        self.ping_interval = ping_interval
+        self.liveness_timeout = liveness_timeout
         self.active_connections: dict[str, WebSocket] = {}
-
-    async def connect(self, agent_id: str, websocket: WebSocket):
+        self.protocols: dict[str, int] = {}
+        self.last_seen: dict[str, float] = {}
+        self.pending_acks: dict[str, tuple[int, asyncio.Future, float]] = {}
+        self.ack_latency: dict[str, deque] = {}
+        self.ack_timeouts: dict[str, int] = {}
+        self.viewers: set[WebSocket] = set()
+
+    async def connect(self, agent_id: str, websocket: WebSocket, protocol: int = 1):
         await websocket.accept()
         self.active_connections[agent_id] = websocket
-
-    def disconnect(self, agent_id: str):
+        self.protocols[agent_id] = protocol
+        self.last_seen[agent_id] = time.monotonic()
+
+    def disconnect(self, agent_id: str, websocket: WebSocket = None):
+        # A stale socket closing must not evict the agent's newer connection.
+        if websocket is not None and self.active_connections.get(agent_id) is not websocket:
+            return
+        self.active_connections.pop(agent_id, None)
+        self.protocols.pop(agent_id, None)
+        self.last_seen.pop(agent_id, None)
+
+    def touch(self, agent_id: str):
         if agent_id in self.active_connections:
-            del self.active_connections[agent_id]
+            self.last_seen[agent_id] = time.monotonic()
+
+    def acks(self, agent_id: str) -> bool:
+        return self.protocols.get(agent_id, 1) >= ACK_PROTOCOL
+
+    def is_live(self, agent_id: str) -> bool:
+        seen = self.last_seen.get(agent_id)
+        if seen is None:
+            return False
+        return not self.acks(agent_id) or time.monotonic() - seen <= self.liveness_timeout
+
+    async def ping_all(self):
+        """Drops protocol 2 sockets that missed the liveness window and pings the rest."""
+        now = time.monotonic()
+        frame = json.dumps({"type": "PING"})
+        sockets = []
+        for agent_id, websocket in list(self.active_connections.items()):
+            if not self.acks(agent_id):
+                continue
+            if now - self.last_seen.get(agent_id, 0.0) > self.liveness_timeout:
+                self.disconnect(agent_id, websocket)
+                with contextlib.suppress(Exception):
+                    await websocket.close(code=1001)
+            else:
+                sockets.append((agent_id, websocket))
 
-    async def send_mission(self, agent_id: str, lat: float, lon: float, error_code: str, bounty: str, intersection: str):
-        if agent_id in self.active_connections:
-            payload = {
-                "type": "MISSION", "lat": lat, "lon": lon,
-                "errorCode": error_code, "bounty": bounty, "intersection": intersection
-            }
-            await self.active_connections[agent_id].send_text(json.dumps(payload))
+        results = await asyncio.gather(*(ws.send_text(frame) for _, ws in sockets), return_exceptions=True)
+        for (agent_id, websocket), result in zip(sockets, results):
+            if isinstance(result, Exception):
+                self.disconnect(agent_id, websocket)
+
+    async def run_pings(self):
+        while True:
+            await asyncio.sleep(self.ping_interval)
+            await self.ping_all()
+
+    async def send_mission(self, agent_id: str, lat: float, lon: float, error_code: str, bounty: str, intersection: str, mission_id: int = None):
+        websocket = self.active_connections.get(agent_id)
+        if websocket is None:
+            return False
+        payload = {
+            "type": "MISSION", "missionId": mission_id, "lat": lat, "lon": lon,
+            "errorCode": error_code, "bounty": bounty, "intersection": intersection
+        }
+        try:
+            await websocket.send_text(json.dumps(payload))
+        except Exception:
+            self.disconnect(agent_id, websocket)
+            return False
+        return True
+
+    async def offer_mission(self, agent_id: str, mission_id: int, timeout: float, **mission) -> bool:
+        """Sends a MISSION and waits up to `timeout` seconds for the agent's ACK (protocol 2 clients only)."""
+        future = asyncio.get_running_loop().create_future()
+        self.pending_acks[agent_id] = (mission_id, future, time.monotonic())
+        try:
+            if not await self.send_mission(agent_id, mission_id=mission_id, **mission):
+                return False
+            if not self.acks(agent_id):
+                return True
+            try:
+                await asyncio.wait_for(future, timeout)
+            except asyncio.TimeoutError:
+                self.ack_timeouts[agent_id] = self.ack_timeouts.get(agent_id, 0) + 1
+                return False
             return True
-        return False
+        finally:
+            self.pending_acks.pop(agent_id, None)
+
+    async def revoke_mission(self, agent_id: str, mission_id: int):
+        """Tells the agent an offer it may still be holding is gone; best effort."""
+        websocket = self.active_connections.get(agent_id)
+        if websocket is None:
+            return
+        try:
+            await websocket.send_text(json.dumps({"type": "MISSION_REVOKED", "missionId": mission_id}))
+        except Exception:
+            self.disconnect(agent_id, websocket)
+
+    def ack(self, agent_id: str, mission_id: int = None):
+        """Resolves the agent's outstanding offer; `mission_id=None` acks whatever is pending."""
+        pending = self.pending_acks.get(agent_id)
+        if pending is None:
+            return
+        pending_mission, future, sent_at = pending
+        if mission_id is not None and mission_id != pending_mission:
+            return
+        if not future.done():
+            future.set_result(True)
+            self.ack_latency.setdefault(agent_id, deque(maxlen=ACK_SAMPLES)).append((time.monotonic() - sent_at) * 1000)
+
+    def ack_stats(self, agent_id: str) -> dict:
+        samples = self.ack_latency.get(agent_id, ())
+        return {
+            "live": self.is_live(agent_id),
+            "acks": len(samples),
+            "timeouts": self.ack_timeouts.get(agent_id, 0),
+            "lastAckMs": round(samples[-1], 1) if samples else None,
+            "medianAckMs": round(statistics.median(samples), 1) if samples else None,
+        }
+
+    async def connect_viewer(self, websocket: WebSocket):
+        await websocket.accept()
+        self.viewers.add(websocket)
+
+    def disconnect_viewer(self, websocket: WebSocket):
+        self.viewers.discard(websocket)
+
+    async def broadcast(self, frame: str):
+        """Fans one pre-serialized frame out to every dashboard viewer, dropping dead sockets."""
+        viewers = list(self.viewers)
+        results = await asyncio.gather(*(v.send_text(frame) for v in viewers), return_exceptions=True)
+        for viewer, result in zip(viewers, results):
+            if isinstance(result, Exception):
+                self.viewers.discard(viewer)
 
 manager = ConnectionManager()
 
@@ -262,20 +416,49 @@ async def websocket_endpoint(websocket: WebSocket, agent_id: str):
         await websocket.close(code=1008)
         return
 
-    await manager.connect(agent_id, websocket)
+    try:
+        protocol = int(websocket.query_params.get("protocol", 1))
+    except ValueError:
+        protocol = 1
+
+    await manager.connect(agent_id, websocket, protocol)
     try:
         while True:
             data = await websocket.receive_text()
+            manager.touch(agent_id)
+            try:
+                message = json.loads(data)
+            except ValueError:
+                continue
+            if isinstance(message, dict) and message.get("type") == "ACK":
+                manager.ack(agent_id, message.get("missionId"))
     except WebSocketDisconnect:
-        manager.disconnect(agent_id)
-
-def haversine(lat1, lon1, lat2, lon2):
-    R = 3958.8 
-    dlat = math.radians(lat2 - lat1)
-    dlon = math.radians(lon2 - lon1)
-    a = math.sin(dlat / 2)**2 + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(dlon / 2)**2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-    return R * c
+        manager.disconnect(agent_id, websocket)
+
+# Dashboard viewers get one full snapshot on connect, then only the agents that
+# changed each tick. Every delta frame is serialized once and shared by all viewers.
+FEED_TICK_SECONDS = 1.0
+
+async def publish_agent_deltas():
+    changes = agent_cache.drain_feed()
+    if changes and manager.viewers:
+        await manager.broadcast(json.dumps({"type": "DELTA", "agents": changes}))
+
+async def agent_feed_loop():
+    while True:
+        await asyncio.sleep(FEED_TICK_SECONDS)
+        await publish_agent_deltas()
+
+@app.websocket("/ws/v1/agents")
+async def agent_feed(websocket: WebSocket):
+    # Register before snapshotting so no change can fall between the two.
+    await manager.connect_viewer(websocket)
+    try:
+        await websocket.send_text(json.dumps({"type": "SNAPSHOT", "agents": agent_cache.snapshot(live_only=True)}))
+        while True:
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        manager.disconnect_viewer(websocket)
 
 
 # ====================================================================
@@ -289,54 +472,108 @@ class WebhookPayload(BaseModel):
     intersection: str = "Main St & 1st Ave"
     required_gear: str = "sensor_cleaning"
 
-auction_lock = asyncio.Lock()
+def reserve_agent(agent_id: str):
+    dispatched_agents.add(agent_id)
+    bid_book.remove(agent_id)
+
+def release_agent(agent_id: str):
+    dispatched_agents.discard(agent_id)
+    state = agent_cache.get(agent_id)
+    if state:
+        sync_bid_book(agent_id, state)
+
+# --- MISSION OFFERS ---
+# Every MISSION frame opens an offer: { agent_id: (mission_id, accept_deadline) }.
+# Only an open offer can be accepted, over HTTP or offline sync. An offer that
+# isn't acknowledged in time, or acknowledged but not accepted by its deadline,
+# is closed: the agent gets a MISSION_REVOKED frame, its reservation is released
+# and the DispatchEvent is marked IGNORED, so a late accept is rejected.
+ACCEPT_TIMEOUT_SECONDS = 60.0
+OFFER_SWEEP_SECONDS = 1.0
+open_offers: dict[str, tuple[int, float]] = {}
+
+def open_offer(agent_id: str, mission_id: int, timeout: float):
+    open_offers[agent_id] = (mission_id, time.monotonic() + timeout)
+
+def take_offer(agent_id: str):
+    return open_offers.pop(agent_id, None)
+
+def restore_offer(agent_id: str, offer):
+    if offer is not None:
+        open_offers.setdefault(agent_id, offer)
+
+async def close_offer(agent_id: str, mission_id: int, abort_mission: bool):
+    await manager.revoke_mission(agent_id, mission_id)
+    release_agent(agent_id)
+    await repo.run(repository.expire_dispatch, mission_id, agent_id, abort_mission)
+
+async def expire_offers():
+    now = time.monotonic()
+    for agent_id, (mission_id, deadline) in list(open_offers.items()):
+        if deadline <= now and open_offers.get(agent_id) == (mission_id, deadline):
+            del open_offers[agent_id]
+            print(f"⏱ OFFER EXPIRED: {agent_id[:8]}*** never accepted mission {mission_id}.")
+            await close_offer(agent_id, mission_id, True)
+
+async def offer_expiry_loop():
+    while True:
+        await asyncio.sleep(OFFER_SWEEP_SECONDS)
+        await expire_offers()
+
+# The winner plus its fallbacks are ranked and reserved in one pass; each gets
+# ACK_TIMEOUT_SECONDS to acknowledge before the offer moves down the list.
+DISPATCH_CANDIDATES = 3
+ACK_TIMEOUT_SECONDS = 2.0
+
+async def dispatch_mission(payload: WebhookPayload) -> dict:
+    search_radius = bid_book.max_radius
+    max_budget = float(payload.bounty.replace("$", ""))
+    # Cheapest live bids near the incident first; agents without a live socket are never ranked.
+    ranked = bid_book.ranked(payload.lat, payload.lon, payload.required_gear, max_budget, search_radius,
+                             limit=DISPATCH_CANDIDATES, eligible=manager.is_live)
+    # Ranking and reserving never yield the event loop, so no concurrent auction
+    # can rank an agent between this one picking it and pulling it out of the index.
+    for agent_id, _, _ in ranked:
+        reserve_agent(agent_id)
+
+    if not ranked:
+        return {"status": "Failed: No agents met market criteria"}
+
+    reserved = [agent_id for agent_id, _, _ in ranked]
+    mission_id = None
+    try:
+        for agent_id, bid, _ in ranked:
+            final_bounty_str = f"${bid:.2f}"
+
+            # Analytics: Mission ledger + dispatch event, written off the event loop
+            if mission_id is None:
+                mission_id = await repo.run(repository.record_dispatch, payload.errorCode, bid, agent_id)
+            else:
+                await repo.run(repository.record_redispatch, mission_id, bid, agent_id)
+
+            open_offer(agent_id, mission_id, ACK_TIMEOUT_SECONDS + ACCEPT_TIMEOUT_SECONDS)
+            acked = await manager.offer_mission(
+                agent_id, mission_id, ACK_TIMEOUT_SECONDS, lat=payload.lat, lon=payload.lon,
+                error_code=payload.errorCode, bounty=final_bounty_str, intersection=payload.intersection,
+            )
+            reserved.remove(agent_id)
+            # An offer already taken was accepted over HTTP while the ACK was in flight.
+            if acked or agent_id not in open_offers:
+                print(f"識 MISSION MATCH: {agent_id[:8]}*** won contract! (Bid: {final_bounty_str})")
+                return {"status": "Dispatched", "contract_price": final_bounty_str}
+
+            del open_offers[agent_id]
+            await close_offer(agent_id, mission_id, not reserved)
+
+        return {"status": "Failed: No agent acknowledged the dispatch"}
+    finally:
+        for agent_id in reserved:
+            release_agent(agent_id)
 
 @app.post("/v1/webhook/stranded")
 @limiter.limit("30/minute")
-async def trigger_stranded_av(request: Request, payload: WebhookPayload, db: Session = Depends(get_db)):
-    async with auction_lock: 
-        best_agent_id = None
-        shortest_distance = float('inf')
-        winning_bid = float('inf')
-        
-        max_budget = float(payload.bounty.replace("$", ""))
-        agents = db.query(Agent).filter(Agent.status == 'ONLINE').all()
-
-        for agent in agents:
-            loadout = agent.loadout if agent.loadout else {}
-            if payload.required_gear in loadout:
-                agent_bid = float(loadout[payload.required_gear])
-                
-                if agent_bid <= max_budget:
-                    dist = haversine(payload.lat, payload.lon, agent.lat, agent.lon)
-                    if dist <= agent.radius:
-                        if agent_bid < winning_bid:
-                            winning_bid = agent_bid
-                            shortest_distance = dist
-                            best_agent_id = agent.agent_id
-                        elif agent_bid == winning_bid and dist < shortest_distance:
-                            shortest_distance = dist
-                            best_agent_id = agent.agent_id
-
-        if best_agent_id:
-            final_bounty_str = f"${winning_bid:.2f}"
-            
-            # Analytics: Create the Master Mission Ledger entry
-            mission = Mission(category_id=payload.errorCode, bounty_amount=winning_bid)
-            db.add(mission)
-            db.commit()
-            db.refresh(mission)
-            
-            # Analytics: Track the Dispatch Event (for acceptance funnels)
-            dispatch = DispatchEvent(mission_id=mission.id, agent_id=best_agent_id)
-            db.add(dispatch)
-            db.commit()
-            
-            print(f"識 MISSION MATCH: {best_agent_id[:8]}*** won contract! (Bid: {final_bounty_str})")
-            await manager.send_mission(best_agent_id, payload.lat, payload.lon, payload.errorCode, final_bounty_str, payload.intersection)
-            return {"status": f"Dispatched", "contract_price": final_bounty_str}
-        
-        return {"status": "Failed: No agents met market criteria"}
+async def trigger_stranded_av(request: Request, payload: WebhookPayload):
+    return await dispatch_mission(payload)
 
 
 # ====================================================================
@@ -356,88 +593,55 @@ class WithdrawRequest(BaseModel):
 
 @app.post("/v1/mission/complete")
 @limiter.limit("10/minute")
-async def complete_mission(request: Request, req: MissionCompleteRequest, db: Session = Depends(get_db), auth: str = Depends(verify_agent_token)):
-    wallet = db.query(Wallet).filter(Wallet.agent_id == req.agentId).first()
-    if wallet:
-        wallet.balance += req.netPayout
-        
-    agent = db.query(Agent).filter(Agent.agent_id == req.agentId).first()
-    if agent:
-        agent.status = 'ONLINE'
-        
-    # Analytics: Close out the Active Mission Ledger
-    mission = db.query(Mission).filter(Mission.assigned_agent_id == req.agentId, Mission.status == "ACTIVE").order_by(desc(Mission.id)).first()
-    if mission:
-        mission.status = "COMPLETED"
-        mission.resolved_at = datetime.now(timezone.utc)
-
-    txn_id = f"TXN-{int(datetime.now(timezone.utc).timestamp())}"
-    timestamp = datetime.now().strftime("%m/%d/%Y %H:%M")
-    db.add(Transaction(id=txn_id, agent_id=req.agentId, date=timestamp, amount=f"+${req.netPayout:.2f}", description="L402 Escrow Release - On-Scene Repair"))
-    
-    db.commit()
-    return {"status": "success", "newBalance": wallet.balance if wallet else 0.0}
+async def complete_mission(request: Request, req: MissionCompleteRequest, auth: str = Depends(verify_agent_token)):
+    agent_cache.set_status(req.agentId, 'ONLINE')
+    new_balance = await repo.run(repository.complete_mission, req.agentId, req.netPayout)
+    return {"status": "success", "newBalance": new_balance}
 
 @app.post("/v1/wallet/link_card")
 @limiter.limit("5/minute")
-async def link_card(request: Request, req: LinkCardRequest, db: Session = Depends(get_db), auth: str = Depends(verify_agent_token)):
+async def link_card(request: Request, req: LinkCardRequest, auth: str = Depends(verify_agent_token)):
     hashed_card = hashlib.sha256(req.cardNumber.encode()).hexdigest()[:16]
     secure_mask = f"ENCRYPTED-****-{hashed_card}"
     
-    agent = db.query(Agent).filter(Agent.agent_id == req.agentId).first()
-    if agent:
-        agent.linked_card = secure_mask
-        db.commit()
+    await repo.run(repository.link_card, req.agentId, secure_mask)
     return {"status": "success"}
 
 @app.post("/v1/wallet/withdraw")
 @limiter.limit("5/minute")
-async def withdraw_funds(request: Request, req: WithdrawRequest, db: Session = Depends(get_db), auth: str = Depends(verify_agent_token)):
-    wallet = db.query(Wallet).filter(Wallet.agent_id == req.agentId).first()
-    if not wallet or wallet.balance < req.amount:
+async def withdraw_funds(request: Request, req: WithdrawRequest, auth: str = Depends(verify_agent_token)):
+    new_balance = await repo.run(repository.withdraw, req.agentId, req.amount)
+    if new_balance is None:
         return {"status": "error", "message": "Insufficient funds"}
-        
-    wallet.balance -= req.amount
-    txn_id = f"WD-{int(datetime.now(timezone.utc).timestamp())}"
-    timestamp = datetime.now().strftime("%m/%d/%Y %H:%M")
-    
-    db.add(Transaction(id=txn_id, agent_id=req.agentId, date=timestamp, amount=f"-${req.amount:.2f}", description="ACH Transfer to Linked Card"))
-    db.commit()
     
-    return {"status": "success", "newBalance": wallet.balance}
+    return {"status": "success", "newBalance": new_balance}
 
 @app.get("/v1/agent/{agent_id}/wallet")
 @limiter.limit("15/minute")
-async def get_wallet(request: Request, agent_id: str, db: Session = Depends(get_db), auth: str = Depends(verify_agent_token)):
-    wallet = db.query(Wallet).filter(Wallet.agent_id == agent_id).first()
-    agent = db.query(Agent).filter(Agent.agent_id == agent_id).first()
-    transactions = db.query(Transaction).filter(Transaction.agent_id == agent_id).order_by(desc(Transaction.id)).all()
-    
-    history = [{"id": t.id, "date": t.date, "amount": t.amount, "description": t.description} for t in transactions]
-    
-    return {
-        "balance": wallet.balance if wallet else 0.0, 
-        "linkedCard": agent.linked_card if agent else None, 
-        "history": history
-    }
+async def get_wallet(request: Request, agent_id: str, auth: str = Depends(verify_agent_token)):
+    # Header comes from the wallet's running totals; history is only the first page.
+    return await repo.run(repository.wallet_view, agent_id)
+
+@app.get("/v1/agent/{agent_id}/wallet/history")
+@limiter.limit("30/minute")
+async def get_wallet_history(request: Request, agent_id: str, cursor: str = None, limit: int = repository.HISTORY_PAGE_SIZE, auth: str = Depends(verify_agent_token)):
+    try:
+        return await repo.run(repository.transaction_page, agent_id, cursor, limit)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid history cursor.")
 
 # ====================================================================
 # 5. CENTRAL COMMAND DASHBOARD
 # ====================================================================
+@app.get("/v1/agent/{agent_id}/dispatch_stats")
+@limiter.limit("20/minute")
+async def get_dispatch_stats(request: Request, agent_id: str, auth: str = Depends(verify_agent_token)):
+    return manager.ack_stats(agent_id)
+
 @app.get("/v1/agents")
 @limiter.limit("20/minute")
-async def get_active_agents(request: Request, db: Session = Depends(get_db)):
-    agents = db.query(Agent).all()
-    result = {}
-    for a in agents:
-        result[a.agent_id] = {
-            "status": a.status,
-            "lat": a.lat,
-            "lon": a.lon,
-            "radius": a.radius,
-            "loadout": a.loadout if a.loadout else {}
-        }
-    return result
+async def get_active_agents(request: Request):
+    return agent_cache.snapshot()
 
 @app.get("/dashboard")
 @limiter.limit("10/minute")
@@ -474,53 +678,62 @@ async def get_dashboard(request: Request):
             var onlineIcon = L.divIcon({ className: 'custom-div-icon', html: "<div style='background-color:#4CAF50; height:15px; width:15px; border-radius:50%; border:2px solid white;'></div>", iconSize: [15, 15], iconAnchor: [7, 7] });
             var busyIcon = L.divIcon({ className: 'custom-div-icon', html: "<div style='background-color:#00BCD4; height:15px; width:15px; border-radius:50%; border:2px solid white; box-shadow: 0 0 10px #00BCD4;'></div>", iconSize: [15, 15], iconAnchor: [7, 7] });
 
-            setInterval(async () => {
-                const response = await fetch('/v1/agents');
-                const data = await response.json();
+            function renderAgent(agentId, info) {
+                var radiusInMeters = info.radius * 1609.34; 
                 
-                for (const [agentId, info] of Object.entries(data)) {
-                    var radiusInMeters = info.radius * 1609.34; 
+                var loadoutHtml = "";
+                if (info.loadout && Object.keys(info.loadout).length > 0) {
+                    for (const [key, val] of Object.entries(info.loadout)) {
+                        loadoutHtml += `<span style="background:#333;color:#4CAF50;padding:2px 6px;border-radius:4px;font-size:10px;margin-right:4px;display:inline-block;margin-bottom:4px;">${key.toUpperCase()}: $${val}</span>`;
+                    }
+                } else {
+                    loadoutHtml = '<span style="color:red;font-size:10px;">NO GEAR FITTED</span>';
+                }
                     
-                    var loadoutHtml = "";
-                    if (info.loadout && Object.keys(info.loadout).length > 0) {
-                        for (const [key, val] of Object.entries(info.loadout)) {
-                            loadoutHtml += `<span style="background:#333;color:#4CAF50;padding:2px 6px;border-radius:4px;font-size:10px;margin-right:4px;display:inline-block;margin-bottom:4px;">${key.toUpperCase()}: $${val}</span>`;
-                        }
+                var popupContent = `<b>${agentId}</b><br>Status: ${info.status}<br><div style="margin-top:6px;">${loadoutHtml}</div>`;
+
+                if (info.status === 'ONLINE' || info.status === 'BUSY') {
+                    var currentIcon = info.status === 'ONLINE' ? onlineIcon : busyIcon;
+                    
+                    if (markers[agentId]) {
+                        markers[agentId].setLatLng([info.lat, info.lon]);
+                        markers[agentId].setIcon(currentIcon);
+                        markers[agentId].setPopupContent(popupContent);
                     } else {
-                        loadoutHtml = '<span style="color:red;font-size:10px;">NO GEAR FITTED</span>';
+                        markers[agentId] = L.marker([info.lat, info.lon], {icon: currentIcon}).bindPopup(popupContent).addTo(map);
                     }
-                        
-                    var popupContent = `<b>${agentId}</b><br>Status: ${info.status}<br><div style="margin-top:6px;">${loadoutHtml}</div>`;
-
-                    if (info.status === 'ONLINE' || info.status === 'BUSY') {
-                        var currentIcon = info.status === 'ONLINE' ? onlineIcon : busyIcon;
-                        
-                        if (markers[agentId]) {
-                            markers[agentId].setLatLng([info.lat, info.lon]);
-                            markers[agentId].setIcon(currentIcon);
-                            markers[agentId].setPopupContent(popupContent);
-                        } else {
-                            markers[agentId] = L.marker([info.lat, info.lon], {icon: currentIcon}).bindPopup(popupContent).addTo(map);
-                        }
 
-                        if (info.status === 'ONLINE') {
-                            if (circles[agentId]) {
-                                circles[agentId].setLatLng([info.lat, info.lon]);
-                                circles[agentId].setRadius(radiusInMeters);
-                            } else {
-                                circles[agentId] = L.circle([info.lat, info.lon], {pane: 'heatmapPane', color: 'transparent', fillColor: '#F44336', fillOpacity: 0.2, radius: radiusInMeters}).addTo(map);
-                            }
-                        } else if (info.status === 'BUSY' && circles[agentId]) {
-                            map.removeLayer(circles[agentId]);
-                            delete circles[agentId];
+                    if (info.status === 'ONLINE') {
+                        if (circles[agentId]) {
+                            circles[agentId].setLatLng([info.lat, info.lon]);
+                            circles[agentId].setRadius(radiusInMeters);
+                        } else {
+                            circles[agentId] = L.circle([info.lat, info.lon], {pane: 'heatmapPane', color: 'transparent', fillColor: '#F44336', fillOpacity: 0.2, radius: radiusInMeters}).addTo(map);
                         }
-                    } else if (info.status === 'OFFLINE' && markers[agentId]) {
-                        map.removeLayer(markers[agentId]);
-                        if(circles[agentId]) { map.removeLayer(circles[agentId]); delete circles[agentId]; }
-                        delete markers[agentId];
+                    } else if (info.status === 'BUSY' && circles[agentId]) {
+                        map.removeLayer(circles[agentId]);
+                        delete circles[agentId];
                     }
+                } else if (info.status === 'OFFLINE' && markers[agentId]) {
+                    map.removeLayer(markers[agentId]);
+                    if(circles[agentId]) { map.removeLayer(circles[agentId]); delete circles[agentId]; }
+                    delete markers[agentId];
                 }
-            }, 2000);
+            }
+
+            // Full snapshot on connect, then per-tick deltas of changed agents only.
+            function connectFeed() {
+                var scheme = location.protocol === 'https:' ? 'wss://' : 'ws://';
+                var feed = new WebSocket(scheme + location.host + '/ws/v1/agents');
+                feed.onmessage = (event) => {
+                    const frame = JSON.parse(event.data);
+                    for (const [agentId, info] of Object.entries(frame.agents)) {
+                        renderAgent(agentId, info);
+                    }
+                };
+                feed.onclose = () => setTimeout(connectFeed, 2000);
+            }
+            connectFeed();
         </script>
     </body>
     </html>
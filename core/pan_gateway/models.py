@@ -0,0 +1,149 @@
+from datetime import datetime, timezone
+from sqlalchemy import create_engine, event, inspect, text, Column, String, Float, Integer, DateTime, ForeignKey, JSON, Boolean, Index
+from sqlalchemy.orm import declarative_base, sessionmaker
+
+# PAN GATEWAY - DATABASE & ORM MODELS
+# Shared by the gateway, the write-behind agent cache and the benchmarks.
+# ----------------------------------------------------
+
+# 1. Database Configuration (Easily swappable to PostgreSQL)
+SQLALCHEMY_DATABASE_URL = "sqlite:///./pan_command.db"
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+
+def enable_sqlite_wal(engine):
+    """
+    WAL lets the repository's threads read while one of them writes. In the
+    default rollback journal a reader upgrading to a writer can deadlock with
+    a committing writer, and SQLite fails that instantly with "database is locked".
+    """
+    if engine.dialect.name != "sqlite":
+        return
+
+    @event.listens_for(engine, "connect")
+    def _set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.close()
+
+enable_sqlite_wal(engine)
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+Base = declarative_base()
+
+# 2. ORM Models (The Analytics Schema)
+class Agent(Base):
+    __tablename__ = "agents"
+    agent_id = Column(String, primary_key=True, index=True)
+    status = Column(String, default="OFFLINE") # ONLINE, BUSY, OFFLINE
+    lat = Column(Float, nullable=True)
+    lon = Column(Float, nullable=True)
+    radius = Column(Float, default=5.0)
+    loadout = Column(JSON, default={})
+    linked_card = Column(String, nullable=True)
+    reputation_score = Column(Float, default=5.0)
+    onboarding_status = Column(String, default="UNVERIFIED") # UNVERIFIED, PENDING, APPROVED, REJECTED
+    checkr_candidate_id = Column(String, nullable=True) # The ID linking this agent to Checkr's vault
+    bg_check_status = Column(String, nullable=True) # CLEAR, CONSIDER, SUSPENDED
+
+class Wallet(Base):
+    __tablename__ = "wallets"
+    agent_id = Column(String, primary_key=True)
+    balance = Column(Float, default=0.0)
+    # Running summary, bumped in the same UPDATE as the balance so the wallet
+    # header never has to aggregate the transaction history.
+    lifetime_earned = Column(Float, default=0.0, server_default="0")
+    lifetime_withdrawn = Column(Float, default=0.0, server_default="0")
+    transaction_count = Column(Integer, default=0, server_default="0")
+
+class Transaction(Base):
+    __tablename__ = "transactions"
+    id = Column(String, primary_key=True)
+    agent_id = Column(String, index=True)
+    date = Column(String) # Display string, e.g. 03/14/2025 09:30
+    amount = Column(String)
+    description = Column(String)
+    timestamp = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+    # Keyset pagination walks (agent_id, timestamp, id) newest-first straight off this index.
+    __table_args__ = (Index("ix_transactions_agent_timestamp", "agent_id", "timestamp", "id"),)
+
+class AgentSession(Base):
+    __tablename__ = "agent_sessions"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    agent_id = Column(String, index=True)
+    went_online_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    went_offline_at = Column(DateTime, nullable=True)
+
+class Mission(Base):
+    __tablename__ = "missions"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    fleet_id = Column(String, default="VANGUARD-01")
+    category_id = Column(String) # e.g., ERR-DOOR
+    bounty_amount = Column(Float)
+    status = Column(String, default="PENDING") # PENDING, ACTIVE, COMPLETED, ABORTED_AGENT, ABORTED_AV
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    accepted_at = Column(DateTime, nullable=True)
+    resolved_at = Column(DateTime, nullable=True)
+    assigned_agent_id = Column(String, nullable=True)
+
+class DispatchEvent(Base):
+    __tablename__ = "dispatch_events"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    mission_id = Column(Integer, index=True)
+    agent_id = Column(String, index=True)
+    dispatched_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    agent_response = Column(String, default="PENDING") # ACCEPTED, DECLINED, IGNORED
+
+class SyncReceipt(Base):
+    """One row per offline-sync event already applied; the PK is the duplicate check."""
+    __tablename__ = "sync_receipts"
+    agent_id = Column(String, primary_key=True)
+    idempotency_key = Column(String, primary_key=True)
+    event_type = Column(String)
+    received_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+
+# 3. In-place upgrades for databases created before a column existed
+def _parse_amount(amount: str) -> float:
+    try:
+        return float((amount or "0").replace("$", ""))
+    except ValueError:
+        return 0.0
+
+def upgrade_schema(engine):
+    """Adds columns introduced after a database was first created and backfills them. Idempotent."""
+    inspector = inspect(engine)
+    txn_columns = {c["name"] for c in inspector.get_columns("transactions")}
+    wallet_columns = {c["name"] for c in inspector.get_columns("wallets")}
+
+    with engine.begin() as conn:
+        if "timestamp" not in txn_columns:
+            conn.execute(text("ALTER TABLE transactions ADD COLUMN timestamp DATETIME"))
+            rows = conn.execute(text("SELECT id, date FROM transactions")).all()
+            backfill = []
+            for txn_id, date in rows:
+                try:
+                    at = datetime.strptime(date, "%m/%d/%Y %H:%M")
+                except (TypeError, ValueError):
+                    at = datetime(1970, 1, 1)
+                # Same text layout SQLAlchemy's SQLite DateTime type writes, so ordering stays lexical.
+                backfill.append({"id": txn_id, "ts": at.strftime("%Y-%m-%d %H:%M:%S.%f")})
+            if backfill:
+                conn.execute(text("UPDATE transactions SET timestamp = :ts WHERE id = :id"), backfill)
+
+        if "transaction_count" not in wallet_columns:
+            for name, ddl in (("lifetime_earned", "FLOAT"), ("lifetime_withdrawn", "FLOAT"), ("transaction_count", "INTEGER")):
+                conn.execute(text(f"ALTER TABLE wallets ADD COLUMN {name} {ddl} DEFAULT 0"))
+            totals: dict[str, list] = {}
+            for agent_id, amount in conn.execute(text("SELECT agent_id, amount FROM transactions")):
+                value = _parse_amount(amount)
+                earned, withdrawn, count = totals.setdefault(agent_id, [0.0, 0.0, 0])
+                totals[agent_id] = [earned + max(value, 0.0), withdrawn + max(-value, 0.0), count + 1]
+            if totals:
+                conn.execute(
+                    text("UPDATE wallets SET lifetime_earned = :earned, lifetime_withdrawn = :withdrawn, transaction_count = :count WHERE agent_id = :agent_id"),
+                    [{"agent_id": a, "earned": e, "withdrawn": w, "count": c} for a, (e, w, c) in totals.items()],
+                )
+
+    for index in Transaction.__table__.indexes:
+        index.create(bind=engine, checkfirst=True)
@@ -0,0 +1,253 @@
+import uuid
+import base64
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from sqlalchemy import desc, insert, update, tuple_
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from models import Agent, Wallet, Transaction, Mission, DispatchEvent, SyncReceipt
+
+# PAN GATEWAY - THREADPOOL REPOSITORY
+# "The event loop never waits on SQLite."
+# ----------------------------------------------------
+# Every handler-level unit of work is a plain blocking function taking a
+# Session. `Repository.run()` executes it on a dedicated DB thread pool with
+# its own session, so async handlers and WebSockets keep breathing while
+# SQLAlchemy round-trips are in flight. Units of work now run concurrently,
+# so balance changes are single conditional UPDATEs, never read-modify-write.
+
+
+class Repository:
+    def __init__(self, session_factory, max_workers: int = 8):
+        self.session_factory = session_factory
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="pan-db")
+
+    def _unit_of_work(self, fn, args):
+        with self.session_factory() as db:
+            return fn(db, *args)
+
+    async def run(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self._unit_of_work, fn, args)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+
+
+def _txn_id(prefix: str) -> str:
+    # Seconds alone collide as soon as two units of work land in the same second.
+    return f"{prefix}-{int(datetime.now(timezone.utc).timestamp())}-{uuid.uuid4().hex[:8]}"
+
+
+# --- MISSIONS & DISPATCH ---
+def accept_dispatch(db, agent_id: str, mission_id: int) -> bool:
+    accepted = _accept_dispatch(db, agent_id, mission_id)
+    db.commit()
+    return accepted
+
+def _accept_dispatch(db, agent_id: str, mission_id: int) -> bool:
+    # Analytics: Correlate Accept to the Dispatch Event. Only an offer that is
+    # still PENDING can be accepted; an expired or revoked one stays IGNORED.
+    dispatch_event = db.query(DispatchEvent).filter(
+        DispatchEvent.mission_id == mission_id,
+        DispatchEvent.agent_id == agent_id,
+        DispatchEvent.agent_response == "PENDING"
+    ).order_by(desc(DispatchEvent.dispatched_at)).first()
+
+    if dispatch_event is None:
+        return False
+    dispatch_event.agent_response = "ACCEPTED"
+    mission = db.query(Mission).filter(Mission.id == dispatch_event.mission_id).first()
+    if mission:
+        mission.status = "ACTIVE"
+        mission.accepted_at = datetime.now(timezone.utc)
+        mission.assigned_agent_id = agent_id
+    # Sessions here don't autoflush; later accepts in the same batch must see this one.
+    db.flush()
+    return True
+
+def record_dispatch(db, category_id: str, bounty_amount: float, agent_id: str) -> int:
+    # Analytics: Create the Master Mission Ledger entry
+    mission = Mission(category_id=category_id, bounty_amount=bounty_amount)
+    db.add(mission)
+    db.flush()
+
+    # Analytics: Track the Dispatch Event (for acceptance funnels)
+    db.add(DispatchEvent(mission_id=mission.id, agent_id=agent_id))
+    db.commit()
+    return mission.id
+
+def record_redispatch(db, mission_id: int, bounty_amount: float, agent_id: str):
+    # Fallback hop: same mission, re-priced at the next candidate's bid
+    db.query(Mission).filter(Mission.id == mission_id).update({"bounty_amount": bounty_amount})
+    db.add(DispatchEvent(mission_id=mission_id, agent_id=agent_id))
+    db.commit()
+
+def expire_dispatch(db, mission_id: int, agent_id: str, abort_mission: bool = False):
+    # Analytics: the agent never acknowledged the offer
+    db.query(DispatchEvent).filter(
+        DispatchEvent.mission_id == mission_id,
+        DispatchEvent.agent_id == agent_id,
+        DispatchEvent.agent_response == "PENDING"
+    ).update({"agent_response": "IGNORED"})
+    if abort_mission:
+        db.query(Mission).filter(Mission.id == mission_id).update({"status": "ABORTED_AGENT", "resolved_at": datetime.now(timezone.utc)})
+    db.commit()
+
+def complete_mission(db, agent_id: str, net_payout: float) -> float:
+    # The agent cache creates wallets on its next flush (or never, for a row it gave up on),
+    # so make sure one exists: a payout that gets a Transaction must also reach the balance.
+    db.execute(sqlite_insert(Wallet).values(agent_id=agent_id, balance=0.0).on_conflict_do_nothing(index_elements=[Wallet.agent_id]))
+    db.execute(
+        update(Wallet).where(Wallet.agent_id == agent_id).values(
+            balance=Wallet.balance + net_payout,
+            lifetime_earned=Wallet.lifetime_earned + net_payout,
+            transaction_count=Wallet.transaction_count + 1,
+        )
+    )
+
+    # Analytics: Close out the Active Mission Ledger
+    mission = db.query(Mission).filter(Mission.assigned_agent_id == agent_id, Mission.status == "ACTIVE").order_by(desc(Mission.id)).first()
+    if mission:
+        mission.status = "COMPLETED"
+        mission.resolved_at = datetime.now(timezone.utc)
+
+    txn_id = _txn_id("TXN")
+    timestamp = datetime.now().strftime("%m/%d/%Y %H:%M")
+    db.add(Transaction(id=txn_id, agent_id=agent_id, date=timestamp, amount=f"+${net_payout:.2f}", description="L402 Escrow Release - On-Scene Repair", timestamp=datetime.now(timezone.utc)))
+
+    db.commit()
+    return db.query(Wallet.balance).filter(Wallet.agent_id == agent_id).scalar()
+
+
+# --- OFFLINE SYNC ---
+SYNC_KEY_CHUNK = 500  # Stays well under SQLite's bound-parameter limit
+
+def apply_sync_batch(db, agent_id: str, events: list[dict], mission_id: int = None) -> list[dict]:
+    """
+    Applies the DB side of one offline-sync batch in a single transaction.
+    Events whose idempotency key already has a receipt (or repeats inside the
+    batch) are dropped; the rest get a receipt and are returned in order so the
+    caller can replay their telemetry into the agent cache after the commit.
+    Accept events only take the agent's open offer for `mission_id`; each is
+    marked `accepted` so the caller knows which ones to replay.
+    """
+    keys = [e["key"] for e in events]
+    seen = set()
+    for i in range(0, len(keys), SYNC_KEY_CHUNK):
+        chunk = keys[i:i + SYNC_KEY_CHUNK]
+        seen.update(k for (k,) in db.query(SyncReceipt.idempotency_key).filter(
+            SyncReceipt.agent_id == agent_id, SyncReceipt.idempotency_key.in_(chunk)))
+
+    fresh = []
+    for event in events:
+        if event["key"] not in seen:
+            seen.add(event["key"])
+            fresh.append(event)
+    if not fresh:
+        return fresh
+
+    now = datetime.now(timezone.utc)
+    db.execute(insert(SyncReceipt), [
+        {"agent_id": agent_id, "idempotency_key": e["key"], "event_type": e["type"], "received_at": now} for e in fresh
+    ])
+    for event in fresh:
+        if event["type"] == "accept":
+            event["accepted"] = mission_id is not None and _accept_dispatch(db, agent_id, mission_id)
+
+    db.commit()
+    return fresh
+
+
+# --- ONBOARDING ---
+def apply_checkr_report(db, candidate_id: str, status: str):
+    agent = db.query(Agent).filter(Agent.checkr_candidate_id == candidate_id).first()
+    if agent:
+        agent.bg_check_status = status.upper()
+        if status == "clear":
+            agent.onboarding_status = "APPROVED"
+            # Send push notification to agent: "You are approved for the Mesa Sector!"
+        else:
+            agent.onboarding_status = "REJECTED" # Flagged for manual review
+
+        db.commit()
+
+
+# --- ESCROW & BANKING ---
+def link_card(db, agent_id: str, secure_mask: str):
+    agent = db.query(Agent).filter(Agent.agent_id == agent_id).first()
+    if agent:
+        agent.linked_card = secure_mask
+        db.commit()
+
+def withdraw(db, agent_id: str, amount: float):
+    """Returns the new balance, or None when funds are insufficient."""
+    debited = db.execute(
+        update(Wallet).where(Wallet.agent_id == agent_id, Wallet.balance >= amount).values(
+            balance=Wallet.balance - amount,
+            lifetime_withdrawn=Wallet.lifetime_withdrawn + amount,
+            transaction_count=Wallet.transaction_count + 1,
+        )
+    ).rowcount
+    if not debited:
+        return None
+
+    txn_id = _txn_id("WD")
+    timestamp = datetime.now().strftime("%m/%d/%Y %H:%M")
+
+    db.add(Transaction(id=txn_id, agent_id=agent_id, date=timestamp, amount=f"-${amount:.2f}", description="ACH Transfer to Linked Card", timestamp=datetime.now(timezone.utc)))
+    db.commit()
+    return db.query(Wallet.balance).filter(Wallet.agent_id == agent_id).scalar()
+
+HISTORY_PAGE_SIZE = 50
+MAX_HISTORY_PAGE_SIZE = 200
+
+def encode_cursor(timestamp: datetime, txn_id: str) -> str:
+    raw = f"{timestamp.isoformat()}|{txn_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> tuple[datetime, str]:
+    """Raises ValueError on anything that was not produced by `encode_cursor`."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        timestamp, txn_id = raw.split("|", 1)
+        return datetime.fromisoformat(timestamp), txn_id
+    except (UnicodeDecodeError, ValueError, TypeError) as e:
+        raise ValueError("Malformed history cursor") from e
+
+def transaction_page(db, agent_id: str, cursor: str = None, limit: int = HISTORY_PAGE_SIZE) -> dict:
+    """
+    One newest-first page of an agent's history. Keyset pagination on
+    (timestamp, id) seeks straight into ix_transactions_agent_timestamp,
+    so page N costs the same as page 1 however long the history gets.
+    """
+    limit = max(1, min(limit, MAX_HISTORY_PAGE_SIZE))
+    query = db.query(Transaction).filter(Transaction.agent_id == agent_id)
+    if cursor:
+        before_ts, before_id = decode_cursor(cursor)
+        query = query.filter(tuple_(Transaction.timestamp, Transaction.id) < tuple_(before_ts, before_id))
+    rows = query.order_by(desc(Transaction.timestamp), desc(Transaction.id)).limit(limit + 1).all()
+
+    page = rows[:limit]
+    next_cursor = encode_cursor(page[-1].timestamp, page[-1].id) if len(rows) > limit else None
+    return {
+        "history": [{"id": t.id, "date": t.date, "amount": t.amount, "description": t.description} for t in page],
+        "nextCursor": next_cursor,
+    }
+
+def wallet_summary(db, agent_id: str) -> dict:
+    """Wallet header from the running totals on the wallet row; never reads the history."""
+    wallet = db.query(Wallet).filter(Wallet.agent_id == agent_id).first()
+    linked_card = db.query(Agent.linked_card).filter(Agent.agent_id == agent_id).scalar()
+    return {
+        "balance": wallet.balance if wallet else 0.0,
+        "linkedCard": linked_card,
+        "lifetimeEarned": wallet.lifetime_earned if wallet else 0.0,
+        "lifetimeWithdrawn": wallet.lifetime_withdrawn if wallet else 0.0,
+        "transactionCount": wallet.transaction_count if wallet else 0,
+    }
+
+def wallet_view(db, agent_id: str) -> dict:
+    """Wallet header plus the first page of history."""
+    return {**wallet_summary(db, agent_id), **transaction_page(db, agent_id)}